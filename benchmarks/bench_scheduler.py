@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+调度基准测试
+
+    python -m benchmarks.bench_scheduler                              默认1千/1万/10万个任务
+    python -m benchmarks.bench_scheduler --sizes 1000 --minutes 1
+    python -m benchmarks.bench_scheduler --baseline benchmarks/results/上次.json
+
+每一档任务数在单独的子进程里运行，互不影响峰值内存：生成混合重复方式的任务，
+安排在接下来几分钟的整分触发，推送发到本地的SMTP/HTTP桩服务器。统计触发抖动
+（实际触发时间减计划时间）、从计划时间到发送完成的延迟、分发吞吐、空闲时的CPU
+占用和峰值内存，结果写入JSON。指定基线时，抖动、延迟、吞吐等指标变差超过容差
+会列出来并返回非零退出码。
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from timer_core import HTTP_BACKENDS, LogPipeline, TaskStore, TimerEngine, task_push_config
+from timer_core.dispatch import DEFAULT_QUEUE_SIZE, Dispatcher
+from timer_core.recurrence import REPEAT_CRON, REPEAT_DAILY, REPEAT_MONTHLY, REPEAT_ONCE, REPEAT_WEEKLY
+from timer_core.retry import RetryPolicy
+
+from .stubs import PlainSMTPPool, StubHTTPServer, StubSMTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+REPEAT_CYCLE = (REPEAT_ONCE, REPEAT_DAILY, REPEAT_WEEKLY, REPEAT_MONTHLY, REPEAT_CRON)
+PERCENTILES = (50, 90, 99, 99.9)
+
+# 和基线比较的指标：(路径, 越大越好, 忽略的绝对差值)
+COMPARED_METRICS = (
+    (('jitter_ms', 'p99'), False, 5.0),
+    (('latency_ms', 'p99'), False, 50.0),
+    (('throughput_per_sec',), True, 0.0),
+    (('load_seconds',), False, 0.2),
+    (('idle_cpu_percent',), False, 0.5),
+    (('peak_rss_mb',), False, 5.0),
+)
+
+
+class BenchEngine(TimerEngine):
+    """记录每次触发和发送时间的引擎，发送失败不重试"""
+
+    def __init__(self, smtp_port, queue_size=DEFAULT_QUEUE_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.dispatcher = Dispatcher(queue_size=queue_size, on_error=self.on_push_error,
+                                     on_done=self.metrics.job_done)
+        self.smtp_pool.close()
+        self.smtp_pool = PlainSMTPPool(port=smtp_port, timing=self.metrics.smtp_timing)
+        self.retry.policy = RetryPolicy(max_attempts=1)
+        self.lateness = []
+        self.finished = []
+        self.dropped = 0
+
+    def execute_task(self, task, fire_ts=None):
+        self.lateness.append(time.time() - fire_ts)
+        super().execute_task(task, fire_ts)
+
+    def _submit_delivery(self, delivery):
+        submitted = super()._submit_delivery(delivery)
+        if not submitted:
+            self.dropped += 1
+        return submitted
+
+    def _finish_delivery(self, delivery, result):
+        ok = super()._finish_delivery(delivery, result)
+        done = time.time()
+        self.finished.extend((done, fire_ts, ok) for _, fire_ts in delivery.runs())
+        return ok
+
+
+def make_tasks(size, base_ts, minutes, smtp_push, http_push, http_ratio):
+    """生成size个任务，按顺序轮换重复方式，平均分布在base_ts开始的minutes个整分"""
+    tasks = []
+    now = time.time()
+    http_every = round(1 / http_ratio) if http_ratio else 0
+    for i in range(size):
+        target = datetime.fromtimestamp(base_ts + (i % minutes) * 60)
+        repeat = REPEAT_CYCLE[i % len(REPEAT_CYCLE)]
+        task = {
+            'id': f'bench-{i}',
+            'name': f'基准任务{i}',
+            'repeat': repeat,
+            'time': f'{target.minute} {target.hour} * * *' if repeat == REPEAT_CRON else target.strftime('%H:%M'),
+            'push': http_push if http_every and i % http_every == 0 else smtp_push,
+            'created': now,
+        }
+        if repeat in (REPEAT_ONCE, REPEAT_WEEKLY, REPEAT_MONTHLY):
+            task['date'] = target.strftime('%Y-%m-%d')
+        tasks.append(task)
+    return tasks
+
+
+def percentiles(values, scale=1000.0):
+    """返回毫秒为单位的分位数"""
+    if not values:
+        return {}
+    values = sorted(values)
+    result = {}
+    for p in PERCENTILES:
+        index = min(len(values) - 1, int(len(values) * p / 100))
+        result[f'p{p:g}'] = round(values[index] * scale, 3)
+    result['max'] = round(values[-1] * scale, 3)
+    return result
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位是KB，macOS上是字节
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _requests_available():
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_size(size, args):
+    """在当前进程里跑一档任务数，返回结果dict"""
+    notes = []
+    http_ratio = args.http_ratio
+    if http_ratio and args.http_backend == 'thread' and not _requests_available():
+        notes.append('未安装requests，只测试SMTP推送')
+        http_ratio = 0.0
+
+    smtp_server = StubSMTPServer(delay=args.smtp_delay).start()
+    http_server = StubHTTPServer(delay=args.http_delay).start() if http_ratio else None
+    smtp_push = task_push_config({'type': 'smtp', 'smtp': {
+        'server': '127.0.0.1', 'user': 'bench@example.com', 'password': 'bench', 'to': 'to@example.com',
+        'subject': '{task_name}', 'content': '第{count}次提醒 {fire_time}',
+    }})
+    http_push = task_push_config({'type': 'http', 'http': {
+        'url': http_server.url, 'method': 'POST', 'headers': '{"Content-Type": "application/json"}',
+        'body': '{"task": "{task_name}", "time": "{fire_time}"}',
+    }}) if http_server else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TaskStore(os.path.join(tmp, 'bench.db'))
+        engine = BenchEngine(smtp_server.port, queue_size=args.queue_size, log=LogPipeline(view_lines=100),
+                             store=store, http_backend=args.http_backend, coalesce_window=args.coalesce_window)
+        engine.remember_password({'server': '127.0.0.1', 'user': 'bench@example.com', 'password': 'bench'})
+        # 第一次触发前要留出加载任务和测量空闲CPU的时间
+        lead = args.idle + 10 + size / 5000
+        base_ts = (int((time.time() + lead) // 60) + 1) * 60
+        tasks = make_tasks(size, base_ts, args.minutes, smtp_push, http_push, http_ratio)
+        http_tasks = sum(1 for task in tasks if task['push'] is http_push)
+
+        started = time.perf_counter()
+        store.save_tasks(tasks)
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        engine.load_tasks()
+        load_seconds = time.perf_counter() - started
+        del tasks
+        engine.start()
+
+        idle = max(0.0, min(args.idle, base_ts - time.time() - 1))
+        cpu, wall = time.process_time(), time.monotonic()
+        time.sleep(idle)
+        idle_cpu = (time.process_time() - cpu) / max(time.monotonic() - wall, 1e-9) * 100
+
+        deadline = base_ts + (args.minutes - 1) * 60 + args.timeout
+        while len(engine.lateness) < size and time.time() < deadline:
+            time.sleep(0.2)
+        engine.wait_idle(timeout=max(0.0, deadline - time.time()))
+        engine.shutdown()
+
+    smtp_server.stop()
+    if http_server is not None:
+        http_server.stop()
+
+    finished = engine.finished
+    elapsed = max((done for done, _, _ in finished), default=base_ts) - base_ts
+    return {
+        'tasks': size,
+        'http_tasks': http_tasks,
+        'save_seconds': round(save_seconds, 3),
+        'load_seconds': round(load_seconds, 3),
+        'idle_seconds': round(idle, 1),
+        'idle_cpu_percent': round(idle_cpu, 3),
+        'fired': len(engine.lateness),
+        'dropped': engine.dropped,
+        'delivered': sum(1 for _, _, ok in finished if ok),
+        'failed': sum(1 for _, _, ok in finished if not ok),
+        'jitter_ms': percentiles(engine.lateness),
+        'latency_ms': percentiles([done - fire_ts for done, fire_ts, _ in finished]),
+        'throughput_per_sec': round(len(finished) / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'smtp_sessions': smtp_server.sessions,
+        'smtp_messages': smtp_server.messages,
+        'http_requests': http_server.requests if http_server else 0,
+        'notes': notes,
+    }
+
+
+def _worker_args(args, size):
+    return [sys.executable, '-m', 'benchmarks.bench_scheduler', '--worker', str(size),
+            '--minutes', str(args.minutes), '--idle', str(args.idle), '--timeout', str(args.timeout),
+            '--http-ratio', str(args.http_ratio), '--smtp-delay', str(args.smtp_delay),
+            '--http-delay', str(args.http_delay), '--queue-size', str(args.queue_size),
+            '--http-backend', args.http_backend, '--coalesce-window', str(args.coalesce_window)]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _metric(result, path):
+    for key in path:
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def compare(report, baseline, tolerance):
+    """返回和基线相比变差超过容差的指标列表"""
+    old_runs = {run['tasks']: run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in report['runs']:
+        old = old_runs.get(run['tasks'])
+        if old is None:
+            continue
+        for path, higher_better, floor in COMPARED_METRICS:
+            new_value, old_value = _metric(run, path), _metric(old, path)
+            if new_value is None or old_value is None:
+                continue
+            worse = old_value - new_value if higher_better else new_value - old_value
+            if worse > floor and worse > abs(old_value) * tolerance:
+                regressions.append(f'{run["tasks"]}个任务 {".".join(path)}: {old_value} -> {new_value}')
+    return regressions
+
+
+def _summary(run):
+    jitter = run['jitter_ms'].get('p99')
+    return (f'📊 {run["tasks"]}个任务: 加载 {run["load_seconds"]}s, 抖动p99 {jitter}ms, '
+            f'吞吐 {run["throughput_per_sec"]}/s, 丢弃 {run["dropped"]}, '
+            f'空闲CPU {run["idle_cpu_percent"]}%, 峰值内存 {run["peak_rss_mb"]}MB')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_scheduler', description='调度基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='任务数档位')
+    parser.add_argument('--minutes', type=int, default=2, help='任务分布在几个整分触发')
+    parser.add_argument('--idle', type=float, default=5.0, help='测量空闲CPU的秒数')
+    parser.add_argument('--timeout', type=float, default=120.0, help='最后一次触发后最多等待发送完成的秒数')
+    parser.add_argument('--http-ratio', type=float, default=0.5, help='HTTP推送任务的比例')
+    parser.add_argument('--smtp-delay', type=float, default=0.0, help='桩SMTP服务器每封邮件的处理耗时')
+    parser.add_argument('--http-delay', type=float, default=0.0, help='桩HTTP服务器每个请求的处理耗时')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help='每个通道的推送队列长度')
+    parser.add_argument('--http-backend', choices=HTTP_BACKENDS, default='thread', help='HTTP推送的发送方式')
+    parser.add_argument('--coalesce-window', type=float, default=0.0,
+                        help='推送合并窗口（秒），默认0即不合并，测量的是未合并时的发送延迟')
+    parser.add_argument('--output', help='结果JSON文件，默认写到 benchmarks/results/')
+    parser.add_argument('--baseline', help='用于比较的历史结果JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许变差的比例')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_size(args.worker, args), ensure_ascii=False))
+        return 0
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {key: getattr(args, key) for key in
+                   ('minutes', 'idle', 'http_ratio', 'smtp_delay', 'http_delay', 'queue_size', 'http_backend',
+                    'coalesce_window')},
+        'runs': [],
+    }
+    for size in args.sizes:
+        print(f'⏱️ 正在测试 {size} 个任务...', flush=True)
+        proc = subprocess.run(_worker_args(args, size), cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            print(f'❌ {size} 个任务的测试失败', file=sys.stderr)
+            return 1
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        report['runs'].append(run)
+        print(_summary(run), flush=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'bench-{datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'💾 结果已保存: {output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'⚠️ 性能变差: {line}')
+        if regressions:
+            return 1
+        print('✅ 与基线相比没有明显变差')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
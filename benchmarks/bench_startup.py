@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+界面启动基准测试
+
+    python -m benchmarks.bench_startup                     默认启动5次
+    python -m benchmarks.bench_startup --runs 10 --baseline benchmarks/results/startup-上次.json
+
+每次在新的子进程里启动 cool_timer.py 的界面，分别记录导入模块、窗口第一次显示、
+任务恢复完成的耗时（从子进程开始算），以及启动时导入的重量级模块。第一次运行会
+生成缩放图片的缓存，之后的运行代表日常启动，统计时去掉第一次。需要图形界面环境。
+界面使用的是项目目录下 data/ 里的任务库，测量的就是当前任务数下的启动时间。
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# 子进程开始计时的时间点，之后才导入要测量的模块
+STARTED = time.perf_counter()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动时不应该导入的模块，出现在这里说明有模块被提前导入了
+HEAVY_MODULES = ('PIL', 'requests', 'smtplib', 'email.mime', 'asyncio', 'ssl', 'http.server')
+# 参与基线比较的指标：(名称, 变差的最小毫秒数)
+COMPARED_METRICS = (('window_ms', 20.0), ('ready_ms', 20.0), ('import_ms', 10.0))
+
+
+def run_once(started=STARTED):
+    """在当前进程里启动界面，返回各阶段耗时（毫秒）"""
+    sys.path.insert(0, ROOT)
+    import cool_timer
+    imported = time.perf_counter()
+    app = cool_timer.TimerApp()
+    while not app.root.winfo_ismapped():
+        app.root.update()
+    shown = time.perf_counter()
+    while not app.tasks_restored:
+        app.root.update()
+    ready = time.perf_counter()
+    heavy = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+    app.root.destroy()
+    app.engine.shutdown()
+    app.log.close()
+    return {
+        'import_ms': round((imported - started) * 1000, 1),
+        'window_ms': round((shown - started) * 1000, 1),
+        'ready_ms': round((ready - started) * 1000, 1),
+        'tasks': len(app.engine.tasks),
+        'heavy_modules': heavy,
+    }
+
+
+def _summary(stats):
+    return '  '.join(f'{name} p50 {stats[name]["p50"]}ms' for name, _ in COMPARED_METRICS)
+
+
+def compare(report, baseline, tolerance):
+    """返回和基线相比变差超过容差的指标列表"""
+    regressions = []
+    for name, floor in COMPARED_METRICS:
+        new_value = report['stats'].get(name, {}).get('p50')
+        old_value = baseline.get('stats', {}).get(name, {}).get('p50')
+        if new_value is None or old_value is None:
+            continue
+        worse = new_value - old_value
+        if worse > floor and worse > old_value * tolerance:
+            regressions.append(f'{name}: {old_value}ms -> {new_value}ms')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_startup', description='界面启动基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='启动次数（第一次用来生成缓存，不计入统计）')
+    parser.add_argument('--output', help='结果JSON文件，默认写到 benchmarks/results/')
+    parser.add_argument('--baseline', help='用于比较的历史结果JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许变差的比例')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_once(), ensure_ascii=False))
+        return 0
+
+    # 只在主进程里导入，不影响子进程的启动测量
+    from .bench_scheduler import RESULTS_DIR, _git_commit, percentiles
+
+    runs = []
+    for i in range(max(args.runs, 2)):
+        proc = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--worker'], cwd=ROOT,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            print('❌ 启动失败（需要图形界面环境）', file=sys.stderr)
+            return 1
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        runs.append(run)
+        print(f'⏱️ 第{i + 1}次: 导入 {run["import_ms"]}ms, 窗口 {run["window_ms"]}ms, '
+              f'任务恢复 {run["ready_ms"]}ms（{run["tasks"]}个任务）', flush=True)
+        if run['heavy_modules']:
+            print(f'⚠️ 启动时导入了: {", ".join(run["heavy_modules"])}')
+
+    warm = runs[1:]
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'stats': {name: percentiles([run[name] for run in warm], scale=1) for name, _ in COMPARED_METRICS},
+    }
+    print(f'📊 {_summary(report["stats"])}')
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'startup-{datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'💾 结果已保存: {output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'⚠️ 启动变慢: {line}')
+        if regressions:
+            return 1
+        print('✅ 与基线相比没有明显变慢')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
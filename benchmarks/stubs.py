@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试用的本地SMTP和HTTP桩服务器
+
+只实现推送需要的最少协议，收到的邮件和请求只计数不保存，
+可选的 delay 模拟服务器处理耗时。
+"""
+
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from timer_core.smtp_pool import SMTPPool
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.sessions += 1
+        self._reply('220 stub ESMTP')
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b'.\r\n':
+                    in_data = False
+                    if server.delay:
+                        time.sleep(server.delay)
+                    server.messages += 1
+                    self._reply('250 queued')
+                continue
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self._reply('250-stub')
+                self._reply('250 AUTH PLAIN LOGIN')
+            elif command == b'AUTH':
+                self._reply('235 authenticated')
+            elif command == b'DATA':
+                in_data = True
+                self._reply('354 end with .')
+            elif command == b'QUIT':
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('250 ok')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """接受任何账号登录的SMTP服务器，不支持STARTTLS"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0):
+        super().__init__((host, port), _SMTPHandler)
+        self.delay = delay
+        self.sessions = 0
+        self.messages = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='stub-smtp', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    do_GET = do_POST = do_PUT = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    """对所有请求返回200的HTTP服务器，支持keep-alive"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0):
+        _HTTPHandler.protocol_version = 'HTTP/1.1'
+        super().__init__((host, port), _HTTPHandler)
+        self.delay = delay
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/push'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='stub-http', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class PlainSMTPPool(SMTPPool):
+    """连接桩服务器用的连接池：不做STARTTLS，直接登录"""
+
+    def _connect(self, server, user, password, timeout):
+        import smtplib
+
+        started = time.monotonic()
+        conn = smtplib.SMTP(server, self.port, timeout=timeout)
+        started = self.observe('connect', server, started)
+        try:
+            conn.login(user, password)
+        except Exception:
+            self._close(conn)
+            raise
+        self.observe('login', server, started)
+        self.connects += 1
+        return conn
@@ -5,23 +5,44 @@
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox
-import threading
-import time
-import json
-import smtplib
-import requests
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime
+from tkinter import ttk, messagebox, filedialog
 import os
 import subprocess
+from datetime import datetime
 from tkinter import PhotoImage
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+from timer_core import LogPipeline, TaskStore, TaskView, TimerEngine, REPEAT_MODES, task_push_config, export_file, import_file, is_command_task
+
+# 界面刷新日志的间隔（毫秒）和每次最多显示的行数
+LOG_DRAIN_INTERVAL = 100
+LOG_DRAIN_BATCH = 500
+# 任务列表每行的高度（像素）和按触发时间重新排序的间隔（毫秒）
+TASK_ROW_HEIGHT = 22
+TASK_REFRESH_INTERVAL = 1000
+# HTTP推送的默认请求体
+API_BODY_DEFAULT = '{"message": "定时提醒"}'
+
+def load_scaled_image(path, size, cache_dir):
+    """读取缩放到size的图片，缩放结果按源文件的大小和修改时间缓存成PNG"""
+    # 有缓存时由tk直接读取，启动时不需要导入PIL；没有PIL时使用原图
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    prefix = f'{name}-{size[0]}x{size[1]}-'
+    cached = os.path.join(cache_dir, f'{prefix}{stat.st_size}-{stat.st_mtime_ns}.png')
+    if not os.path.exists(cached):
+        try:
+            from PIL import Image
+        except ImportError:
+            return PhotoImage(file=path)
+        os.makedirs(cache_dir, exist_ok=True)
+        # 源文件变了，删掉旧的缓存
+        for old in os.listdir(cache_dir):
+            if old.startswith(prefix):
+                os.remove(os.path.join(cache_dir, old))
+        with Image.open(path) as img:
+            img.resize(size, Image.LANCZOS).save(cached + '.tmp', 'PNG')
+        os.replace(cached + '.tmp', cached)
+    return PhotoImage(file=cached)
+
 
 class TimerApp:
     def __init__(self):
@@ -40,10 +61,39 @@ class TimerApp:
         self.setup_dark_theme()
         
         self.running = False
-        self.tasks = []
+        # 任务列表只创建可见的几十行，滚动时按位置从 task_view 取数据填进去
+        self.task_view = TaskView()
+        self.task_offset = 0
+        self.task_rows = 0
+        self.task_row_ids = []
+        self.selected_task_ids = set()
+        self._rendering_tasks = False
+        log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+        os.makedirs(log_dir, exist_ok=True)
+        self.log = LogPipeline(os.path.join(log_dir, 'cool_timer.log'))
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+        os.makedirs(data_dir, exist_ok=True)
+        # 缩放后的图片缓存
+        self.image_cache_dir = os.path.join(data_dir, 'cache')
+        self.engine = TimerEngine(log=self.log, store=TaskStore(os.path.join(data_dir, 'tasks.db')))
         
         self.create_interface()
         
+        # 窗口先显示出来，再恢复上次保存的任务
+        self.tasks_restored = False
+        self.root.after_idle(self.restore_tasks)
+        
+    def restore_tasks(self):
+        """从任务库恢复上次保存的任务"""
+        self.root.update_idletasks()
+        tasks = self.engine.load_tasks()
+        self.task_view.set_tasks(tasks)
+        if tasks:
+            self.log_message(f'📂 已加载 {len(tasks)} 个任务')
+            self.update_task_list()
+        self.tasks_restored = True
+        self.root.after(TASK_REFRESH_INTERVAL, self.refresh_task_order)
+        
     def setup_dark_theme(self):
         """设置黑色主题"""
         self.root.configure(bg='#1a1a1a')
@@ -145,11 +195,11 @@ class TimerApp:
         self.task_time_var = tk.StringVar(value="12:00")
         time_entry = tk.Entry(time_repeat_frame, textvariable=self.task_time_var, font=("Arial", 9), bg=self.colors['bg'], fg=self.colors['fg'], insertbackground=self.colors['accent'], relief="flat", bd=2, width=8)
         time_entry.pack(side="left", padx=(2, 8))
-        tk.Label(time_repeat_frame, text="(HH:MM)", font=("Arial", 8), bg=self.colors['secondary'], fg=self.colors['fg']).pack(side="left")
+        tk.Label(time_repeat_frame, text="(HH:MM[:SS]/间隔如15s/cron)", font=("Arial", 8), bg=self.colors['secondary'], fg=self.colors['fg']).pack(side="left")
         # 重复设置
         tk.Label(time_repeat_frame, text="  重复设置:", font=("Arial", 9, "bold"), bg=self.colors['secondary'], fg=self.colors['fg']).pack(side="left", padx=(8, 0))
         self.task_repeat_var = tk.StringVar(value="每天")
-        repeat_combo = ttk.Combobox(time_repeat_frame, textvariable=self.task_repeat_var, values=["一次", "每天", "每周", "每月"], font=("Arial", 9), state="readonly", width=10)
+        repeat_combo = ttk.Combobox(time_repeat_frame, textvariable=self.task_repeat_var, values=REPEAT_MODES, font=("Arial", 9), state="readonly", width=10)
         repeat_combo.pack(side="left", padx=(2, 0))
         
         # 按钮区域（优化字体+高亮）
@@ -162,6 +212,8 @@ class TimerApp:
             ("🗑️ 删除", self.delete_task, self.colors['warning'], '#ff3333', 'w'),
             ("▶️ 启动", self.start_timer, self.colors['accent'], '#00cc66'),
             ("⏹️ 停止", self.stop_timer, self.colors['info'], '#1e90ff'),
+            ("📥 导入", self.import_tasks, self.colors['info'], '#1e90ff'),
+            ("📤 导出", self.export_tasks, self.colors['info'], '#1e90ff'),
         ]
         for i, cfg in enumerate(btn_cfgs):
             if len(cfg) == 4:
@@ -186,26 +238,44 @@ class TimerApp:
                 bg=self.colors['secondary'],
                 fg=self.colors['accent']).pack(pady=3)
         
-        # 创建带滚动条的列表框
+        # 搜索和按重复方式过滤
+        filter_frame = tk.Frame(list_frame, bg=self.colors['secondary'])
+        filter_frame.pack(fill="x", padx=8, pady=(0, 3))
+        tk.Label(filter_frame, text="🔍", bg=self.colors['secondary'], fg=self.colors['fg']).pack(side="left")
+        self.task_filter_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=self.task_filter_var, font=("Arial", 9), bg=self.colors['bg'], fg=self.colors['fg'], insertbackground=self.colors['accent'], relief="flat", width=14).pack(side="left", padx=(2, 5))
+        self.task_filter_repeat_var = tk.StringVar(value="全部")
+        ttk.Combobox(filter_frame, textvariable=self.task_filter_repeat_var, values=("全部",) + tuple(REPEAT_MODES), font=("Arial", 9), state="readonly", width=8).pack(side="left")
+        self.task_count_var = tk.StringVar(value="共 0 个任务")
+        tk.Label(filter_frame, textvariable=self.task_count_var, font=("Arial", 9), bg=self.colors['secondary'], fg=self.colors['fg']).pack(side="right")
+        self.task_filter_var.trace_add('write', self.apply_task_filter)
+        self.task_filter_repeat_var.trace_add('write', self.apply_task_filter)
+        
+        # 创建带滚动条的任务表格，按下次触发时间排序
         list_container = tk.Frame(list_frame, bg=self.colors['secondary'])
         list_container.pack(fill="both", expand=True, padx=8, pady=(0, 8))
         
-        self.task_listbox = tk.Listbox(list_container,
-                                      bg=self.colors['bg'],
-                                      fg=self.colors['fg'],
-                                      selectbackground=self.colors['accent'],
-                                      selectforeground='#000000',
-                                      font=("Arial", 9),
-                                      relief="flat",
-                                      bd=0,
-                                      height=8)
-        
-        scrollbar = tk.Scrollbar(list_container)
-        scrollbar.pack(side="right", fill="y")
-        
-        self.task_listbox.pack(side="left", fill="both", expand=True)
-        self.task_listbox.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.task_listbox.yview)
+        style = ttk.Style()
+        style.configure("Tasks.Treeview", background=self.colors['bg'], fieldbackground=self.colors['bg'], foreground=self.colors['fg'], font=("Arial", 9), rowheight=TASK_ROW_HEIGHT, borderwidth=0)
+        style.map("Tasks.Treeview", background=[('selected', self.colors['accent'])], foreground=[('selected', '#000000')])
+        self.task_tree = ttk.Treeview(list_container, columns=("next", "name", "time", "repeat"), show="headings", selectmode="extended", style="Tasks.Treeview", height=8)
+        for column, text, width in (("next", "下次执行", 100), ("name", "任务名称", 160), ("time", "时间", 80), ("repeat", "重复", 60)):
+            self.task_tree.heading(column, text=text)
+            self.task_tree.column(column, width=width, minwidth=40, stretch=(column == "name"))
+        
+        # 滚动条不跟Treeview绑定，按位置换算成 task_view 里的偏移
+        self.task_scrollbar = tk.Scrollbar(list_container, command=self.scroll_task_list)
+        self.task_scrollbar.pack(side="right", fill="y")
+        
+        self.task_tree.pack(side="left", fill="both", expand=True)
+        self.task_tree.bind("<Configure>", self.resize_task_list)
+        self.task_tree.bind("<<TreeviewSelect>>", self.select_tasks)
+        # 不按Ctrl/Shift单击时，滚动到视野外的已选任务也取消选择
+        self.task_tree.bind("<ButtonPress-1>", lambda e: None if e.state & 0x0005 else self.selected_task_ids.clear())
+        self.task_tree.bind("<MouseWheel>", lambda e: self.scroll_task_list('scroll', -1 if e.delta > 0 else 1, 'units'))
+        self.task_tree.bind("<Button-4>", lambda e: self.scroll_task_list('scroll', -1, 'units'))
+        self.task_tree.bind("<Button-5>", lambda e: self.scroll_task_list('scroll', 1, 'units'))
+        self.task_tree.bind("<Delete>", lambda e: self.delete_task())
         
     def create_push_section(self, parent):
         """创建推送配置区域"""
@@ -296,7 +366,7 @@ class TimerApp:
         content_frame = tk.Frame(self.smtp_frame, bg=self.colors['secondary'])
         content_frame.pack(fill="x", padx=8, pady=1)
         
-        tk.Label(content_frame, text="邮件内容:", 
+        tk.Label(content_frame, text="邮件内容: (可用 {task_name} {now} {count})", 
                 font=("Arial", 9),
                 bg=self.colors['secondary'],
                 fg=self.colors['fg']).pack(anchor="w")
@@ -312,8 +382,28 @@ class TimerApp:
         self.email_content_text.pack(fill="x", pady=(1, 0))
         self.email_content_text.insert("1.0", "这是一条定时提醒消息！")
         
-        # HTTP API配置
-        self.http_frame = tk.Frame(parent, bg=self.colors['secondary'], relief="raised", bd=1)
+        # HTTP API配置：变量先建好，设置面板在第一次切换到HTTP时才创建
+        self.push_parent = parent
+        self.http_frame = None
+        self.api_body_text = None
+        self.api_url_var = tk.StringVar(value="")
+        self.api_method_var = tk.StringVar(value="POST")
+        self.api_headers_var = tk.StringVar(value='{"Content-Type": "application/json"}')
+        
+        # 配置修改后同步给引擎
+        for var in (self.push_type_var, self.smtp_server_var, self.smtp_user_var, self.smtp_pass_var,
+                    self.to_email_var, self.email_subject_var, self.api_url_var, self.api_method_var,
+                    self.api_headers_var):
+            var.trace_add('write', self.sync_push_config)
+        self.email_content_text.bind('<KeyRelease>', self.sync_push_config)
+        
+        # 测试按钮
+        test_btn = tk.Button(parent, text="🧪 测试推送", command=self.test_push, font=("Arial", 10, "bold"), bg=self.colors['accent'], fg='#000000', relief="flat", bd=0, padx=18, pady=7)
+        test_btn.pack(pady=5)
+        
+    def create_http_panel(self):
+        """创建HTTP API设置面板（第一次切换到HTTP时调用）"""
+        self.http_frame = tk.Frame(self.push_parent, bg=self.colors['secondary'], relief="raised", bd=1)
         
         tk.Label(self.http_frame, text="HTTP API设置", 
                 font=("Arial", 9, "bold"),
@@ -322,12 +412,12 @@ class TimerApp:
         
         # HTTP API配置项
         http_configs = [
-            ("API地址:", "", "api_url_var"),
-            ("请求方法:", "POST", "api_method_var"),
-            ("请求头:", '{"Content-Type": "application/json"}', "api_headers_var")
+            ("API地址:", "api_url_var"),
+            ("请求方法:", "api_method_var"),
+            ("请求头:", "api_headers_var")
         ]
         
-        for label, default, var_name in http_configs:
+        for label, var_name in http_configs:
             frame = tk.Frame(self.http_frame, bg=self.colors['secondary'])
             frame.pack(fill="x", padx=8, pady=1)
             
@@ -336,8 +426,7 @@ class TimerApp:
                     bg=self.colors['secondary'],
                     fg=self.colors['fg']).pack(anchor="w")
             
-            var = tk.StringVar(value=default)
-            setattr(self, var_name, var)
+            var = getattr(self, var_name)
             
             if var_name == "api_method_var":
                 combo = ttk.Combobox(frame,
@@ -375,11 +464,8 @@ class TimerApp:
                                     relief="flat",
                                     bd=1)
         self.api_body_text.pack(fill="x", pady=(1, 0))
-        self.api_body_text.insert("1.0", '{"message": "定时提醒"}')
-        
-        # 测试按钮
-        test_btn = tk.Button(parent, text="🧪 测试推送", command=self.test_push, font=("Arial", 10, "bold"), bg=self.colors['accent'], fg='#000000', relief="flat", bd=0, padx=18, pady=7)
-        test_btn.pack(pady=5)
+        self.api_body_text.insert("1.0", API_BODY_DEFAULT)
+        self.api_body_text.bind('<KeyRelease>', self.sync_push_config)
         
     def create_logo_qq_section(self, parent):
         base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -391,12 +477,7 @@ class TimerApp:
         logo_img = None
         if os.path.exists(logo_path):
             try:
-                if PIL_AVAILABLE:
-                    img = Image.open(logo_path)
-                    img = img.resize((193, 61), Image.LANCZOS)
-                    logo_img = ImageTk.PhotoImage(img)
-                else:
-                    logo_img = PhotoImage(file=logo_path)
+                logo_img = load_scaled_image(logo_path, (193, 61), self.image_cache_dir)
             except Exception as e:
                 print(f"❌ LOGO加载失败: {e}")
                 logo_img = None
@@ -419,12 +500,7 @@ class TimerApp:
         print(f"尝试加载QQ图标: {qq_icon_path}")
         if os.path.exists(qq_icon_path):
             try:
-                if PIL_AVAILABLE:
-                    img = Image.open(qq_icon_path)
-                    img = img.resize((48, 48), Image.LANCZOS)
-                    qq_icon = ImageTk.PhotoImage(img)
-                else:
-                    qq_icon = PhotoImage(file=qq_icon_path)
+                qq_icon = load_scaled_image(qq_icon_path, (48, 48), self.image_cache_dir)
             except Exception as e:
                 print(f"❌ QQ图标加载失败: {e}")
                 qq_icon = None
@@ -485,6 +561,7 @@ class TimerApp:
                                relief="flat",
                                bd=0)
         self.log_text.pack(fill="both", expand=True, padx=8, pady=(0, 8))
+        self.root.after(LOG_DRAIN_INTERVAL, self.drain_log)
         # 日志组件创建好后输出QQ图标加载信息
         if hasattr(self, 'log_text'):
             try:
@@ -496,115 +573,66 @@ class TimerApp:
         """切换推送方式"""
         if self.push_type_var.get() == "smtp":
             self.smtp_frame.pack(fill="x", pady=(0, 5))
-            self.http_frame.pack_forget()
+            if self.http_frame is not None:
+                self.http_frame.pack_forget()
         else:
+            if self.http_frame is None:
+                self.create_http_panel()
             self.smtp_frame.pack_forget()
             self.http_frame.pack(fill="x", pady=(0, 5))
     
     def log_message(self, message):
-        """添加日志消息"""
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        log_entry = f'[{timestamp}] {message}\n'
-        self.log_text.insert(tk.END, log_entry)
-        self.log_text.see(tk.END)
-        self.root.update()
+        """添加日志消息，可在任意线程调用，由主线程定时批量显示"""
+        self.log.write(message)
     
-    def send_email(self, smtp_server, smtp_user, smtp_pass, to_email, subject, content):
-        """发送邮件"""
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = smtp_user
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(content, 'plain', 'utf-8'))
-            
-            server = smtplib.SMTP(smtp_server, 587)
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-            server.quit()
-            
-            self.log_message(f'✅ 邮件发送成功: {to_email}')
-            return True
-        except Exception as e:
-            self.log_message(f'❌ 邮件发送失败: {str(e)}')
-            return False
+    def drain_log(self):
+        """把日志队列里的新日志批量显示到界面，只保留最近的若干行"""
+        lines = self.log.drain(LOG_DRAIN_BATCH)
+        if lines:
+            self.log_text.insert(tk.END, '\n'.join(lines) + '\n')
+            excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - self.log.view_lines
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.log_text.see(tk.END)
+        # 还有积压时尽快继续，否则按固定间隔轮询
+        self.root.after(10 if lines and len(lines) == LOG_DRAIN_BATCH else LOG_DRAIN_INTERVAL, self.drain_log)
     
-    def send_http_api(self, url, method, headers, body):
-        """发送HTTP API请求"""
-        try:
-            headers_dict = json.loads(headers) if headers else {}
-            body_dict = json.loads(body) if body else {}
-            
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers_dict, params=body_dict)
-            elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers_dict, json=body_dict)
-            elif method.upper() == 'PUT':
-                response = requests.put(url, headers=headers_dict, json=body_dict)
-            
-            if response.status_code in [200, 201]:
-                self.log_message(f'✅ HTTP API请求成功: {url}')
-                return True
-            else:
-                self.log_message(f'❌ HTTP API请求失败: {response.status_code}')
-                return False
-        except Exception as e:
-            self.log_message(f'❌ HTTP API请求失败: {str(e)}')
-            return False
-    
-    def execute_task(self, task):
-        """执行任务"""
-        self.log_message(f'🚀 执行任务: {task["name"]}')
-        
-        if self.push_type_var.get() == "smtp":
-            smtp_server = self.smtp_server_var.get()
-            smtp_user = self.smtp_user_var.get()
-            smtp_pass = self.smtp_pass_var.get()
-            to_email = self.to_email_var.get()
-            subject = self.email_subject_var.get()
-            content = self.email_content_text.get("1.0", tk.END).strip()
-            
-            self.send_email(smtp_server, smtp_user, smtp_pass, to_email, subject, content)
-        else:
-            url = self.api_url_var.get()
-            method = self.api_method_var.get()
-            headers = self.api_headers_var.get()
-            body = self.api_body_text.get("1.0", tk.END).strip()
-            
-            self.send_http_api(url, method, headers, body)
+    def get_push_config(self):
+        """从界面读取推送配置"""
+        return {
+            'type': self.push_type_var.get(),
+            'smtp': {
+                'server': self.smtp_server_var.get(),
+                'user': self.smtp_user_var.get(),
+                'password': self.smtp_pass_var.get(),
+                'to': self.to_email_var.get(),
+                'subject': self.email_subject_var.get(),
+                'content': self.email_content_text.get("1.0", tk.END).strip(),
+            },
+            'http': {
+                'url': self.api_url_var.get(),
+                'method': self.api_method_var.get(),
+                'headers': self.api_headers_var.get(),
+                'body': self.api_body_text.get("1.0", tk.END).strip() if self.api_body_text is not None else API_BODY_DEFAULT,
+            },
+        }
     
-    def timer_thread(self):
-        """定时器线程"""
-        while self.running:
-            current_time = datetime.now().strftime('%H:%M')
-            
-            for task in self.tasks:
-                if task['time'] == current_time and not task.get('executed_today', False):
-                    self.execute_task(task)
-                    task['executed_today'] = True
-            
-            if current_time == '00:00':
-                for task in self.tasks:
-                    task['executed_today'] = False
-            
-            time.sleep(30)
+    def sync_push_config(self, *args):
+        """界面配置变化时同步给引擎，调度线程不直接读取界面控件"""
+        self.engine.set_push_config(self.get_push_config())
     
     def start_timer(self):
         """启动定时器"""
         if not self.running:
             self.running = True
-            self.log_message('🟢 定时器已启动')
+            self.sync_push_config()
+            self.engine.start()
             self.status_var.set('状态: 运行中')
-            
-            timer_thread = threading.Thread(target=self.timer_thread, daemon=True)
-            timer_thread.start()
     
     def stop_timer(self):
         """停止定时器"""
         self.running = False
-        self.log_message('🔴 定时器已停止')
+        self.engine.stop()
         self.status_var.set('状态: 已停止')
     
     def add_task(self):
@@ -617,20 +645,25 @@ class TimerApp:
             messagebox.showwarning("警告", "请填写任务名称和执行时间")
             return
         
+        # 每个任务保存自己的推送配置，之后修改界面不影响已添加的任务
         try:
-            datetime.strptime(task_time, '%H:%M')
-        except ValueError:
-            messagebox.showerror("错误", "时间格式错误，请使用HH:MM格式")
+            push_config = task_push_config(self.get_push_config())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
             return
         
-        task = {
-            'name': task_name,
-            'time': task_time,
-            'repeat': task_repeat,
-            'executed_today': False
-        }
+        try:
+            task = self.engine.add_task({
+                'name': task_name,
+                'time': task_time,
+                'repeat': task_repeat,
+                'push': push_config
+            })
+        except ValueError:
+            messagebox.showerror("错误", "时间格式错误，请使用HH:MM或HH:MM:SS格式，间隔任务如15s、5m@08:00，或5段cron表达式")
+            return
         
-        self.tasks.append(task)
+        self.task_view.upsert(task)
         self.log_message(f'✅ 添加任务成功: {task_name} ({task_time})')
         
         self.task_name_var.set('')
@@ -639,23 +672,127 @@ class TimerApp:
     
     def delete_task(self):
         """删除任务"""
-        selection = self.task_listbox.curselection()
-        if not selection:
+        if not self.selected_task_ids:
             messagebox.showwarning("警告", "请选择要删除的任务")
             return
         
-        for index in reversed(selection):
-            if index < len(self.tasks):
-                deleted_task = self.tasks.pop(index)
+        for task_id in list(self.selected_task_ids):
+            self.task_view.remove(task_id)
+            deleted_task = self.engine.remove_task(task_id)
+            if deleted_task is not None:
                 self.log_message(f'🗑️ 删除任务: {deleted_task["name"]}')
+        self.selected_task_ids.clear()
         
         self.update_task_list()
     
+    def import_tasks(self):
+        """从JSON Lines或CSV文件批量导入任务"""
+        path = filedialog.askopenfilename(title="导入任务", filetypes=[("任务文件", "*.jsonl *.csv"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            result = import_file(self.engine, path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"导入失败: {e}")
+            return
+        
+        self.task_view.set_tasks(list(self.engine.tasks.values()))
+        self.update_task_list()
+        for line_no, error in result.errors[:10]:
+            self.log_message(f'❌ 第{line_no}行: {error}')
+        self.log_message(f'📥 导入 {result.imported} 个任务，失败 {result.failed} 行')
+    
+    def export_tasks(self):
+        """把当前任务导出为JSON Lines或CSV文件"""
+        path = filedialog.asksaveasfilename(title="导出任务", defaultextension=".jsonl", filetypes=[("JSON Lines", "*.jsonl"), ("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            count = export_file(list(self.engine.tasks.values()), path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"导出失败: {e}")
+            return
+        self.log_message(f'📤 已导出 {count} 个任务: {path}')
+    
     def update_task_list(self):
-        """更新任务列表"""
-        self.task_listbox.delete(0, tk.END)
-        for task in self.tasks:
-            self.task_listbox.insert(tk.END, f"{task['name']} - {task['time']} ({task['repeat']})")
+        """重绘任务列表的可见行，已有的行直接改内容，不重建"""
+        total = len(self.task_view)
+        self.task_offset = max(0, min(self.task_offset, total - self.task_rows))
+        rows = self.task_view.rows(self.task_offset, self.task_rows)
+        items = self.task_tree.get_children()
+        self._rendering_tasks = True
+        try:
+            for iid in items[len(rows):]:
+                self.task_tree.delete(iid)
+            self.task_row_ids = []
+            selected = []
+            for i, (task, fire_ts) in enumerate(rows):
+                channel = 'command' if is_command_task(task) else (task.get('push') or {}).get('type')
+                icon = {'smtp': '📧 ', 'http': '🌐 ', 'command': '⚙️ '}.get(channel, '')
+                next_text = datetime.fromtimestamp(fire_ts).strftime('%m-%d %H:%M:%S') if fire_ts is not None else '已结束'
+                values = (next_text, f"{icon}{task['name']}", task['time'], task['repeat'])
+                iid = f'row{i}'
+                if i < len(items):
+                    self.task_tree.item(iid, values=values)
+                else:
+                    self.task_tree.insert('', tk.END, iid=iid, values=values)
+                self.task_row_ids.append(task['id'])
+                if task['id'] in self.selected_task_ids:
+                    selected.append(iid)
+            self.task_tree.selection_set(selected)
+        finally:
+            self._rendering_tasks = False
+        if total:
+            self.task_scrollbar.set(self.task_offset / total, min(1.0, (self.task_offset + self.task_rows) / total))
+        else:
+            self.task_scrollbar.set(0.0, 1.0)
+        if self.task_view.filtered:
+            self.task_count_var.set(f"显示 {total} / 共 {self.task_view.total} 个任务")
+        else:
+            self.task_count_var.set(f"共 {total} 个任务")
+    
+    def scroll_task_list(self, action, amount, unit=None):
+        """滚动条和鼠标滚轮：换算成 task_view 里的偏移后重绘可见行"""
+        if action == 'moveto':
+            offset = int(float(amount) * len(self.task_view))
+        else:
+            step = self.task_rows if unit == 'pages' else 1
+            offset = self.task_offset + int(amount) * max(1, step)
+        if offset != self.task_offset:
+            self.task_offset = offset
+            self.update_task_list()
+        return 'break'
+    
+    def resize_task_list(self, event):
+        """窗口大小变化时按高度重新计算可见的行数"""
+        rows = max(1, (event.height - TASK_ROW_HEIGHT) // TASK_ROW_HEIGHT)
+        if rows != self.task_rows:
+            self.task_rows = rows
+            self.update_task_list()
+    
+    def select_tasks(self, event=None):
+        """记录选中的任务id，滚动后行被复用也不会丢失选择"""
+        if self._rendering_tasks:
+            return
+        selected = set(self.task_tree.selection())
+        for i, task_id in enumerate(self.task_row_ids):
+            if f'row{i}' in selected:
+                self.selected_task_ids.add(task_id)
+            else:
+                self.selected_task_ids.discard(task_id)
+    
+    def apply_task_filter(self, *args):
+        """按搜索框和重复方式过滤任务列表"""
+        repeat = self.task_filter_repeat_var.get()
+        self.task_view.set_filter(self.task_filter_var.get(), None if repeat == "全部" else repeat)
+        self.task_offset = 0
+        self.update_task_list()
+    
+    def refresh_task_order(self):
+        """定时把已经触发过的任务按新的下次执行时间重新排序"""
+        if self.task_view.refresh():
+            self.update_task_list()
+        self.root.after(TASK_REFRESH_INTERVAL, self.refresh_task_order)
     
     def open_qq_group(self):
         """打开QQ群链接"""
@@ -669,35 +806,30 @@ class TimerApp:
     def test_push(self):
         """测试推送"""
         self.log_message('🧪 开始测试推送...')
+        push_config = self.get_push_config()
         
-        if self.push_type_var.get() == "smtp":
-            smtp_server = self.smtp_server_var.get()
-            smtp_user = self.smtp_user_var.get()
-            smtp_pass = self.smtp_pass_var.get()
-            to_email = self.to_email_var.get()
-            subject = self.email_subject_var.get()
-            content = self.email_content_text.get("1.0", tk.END).strip()
-            
-            if not all([smtp_server, smtp_user, smtp_pass, to_email]):
+        if push_config['type'] == "smtp":
+            smtp = push_config['smtp']
+            if not all([smtp['server'], smtp['user'], smtp['password'], smtp['to']]):
                 messagebox.showerror("错误", "请填写完整的SMTP配置")
                 return
-            
-            self.send_email(smtp_server, smtp_user, smtp_pass, to_email, subject, content)
-        else:
-            url = self.api_url_var.get()
-            method = self.api_method_var.get()
-            headers = self.api_headers_var.get()
-            body = self.api_body_text.get("1.0", tk.END).strip()
-            
-            if not url:
-                messagebox.showerror("错误", "请填写API地址")
-                return
-            
-            self.send_http_api(url, method, headers, body)
+        elif not push_config['http']['url']:
+            messagebox.showerror("错误", "请填写API地址")
+            return
+        
+        try:
+            channel, send, args = self.engine.build_push(push_config, {'name': '测试推送'})
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        
+        send(*args)
     
     def run(self):
         """运行程序"""
         self.root.mainloop()
+        self.engine.shutdown()
+        self.log.close()
 
     def open_logo_link(self):
         try:
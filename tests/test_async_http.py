@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""用本机的asyncio假服务器检查异步HTTP客户端的响应解析、连接复用和超时，以及排队上限"""
+
+import asyncio
+import threading
+import unittest
+
+from timer_core.async_http import AsyncHTTPClient, AsyncRunner
+from timer_core.http_client import compile_request
+
+
+async def read_request(reader):
+    """读到一个完整的请求头，连接已关闭时返回False"""
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return False
+    return True
+
+
+class AsyncHTTPClientTest(unittest.IsolatedAsyncioTestCase):
+
+    async def serve(self, handler):
+        """启动假服务器，handler(reader, writer) 处理每个连接"""
+        self.handlers = []
+
+        async def track(reader, writer):
+            self.handlers.append(asyncio.current_task())
+            await handler(reader, writer)
+        self.server = await asyncio.start_server(track, '127.0.0.1', 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.client = AsyncHTTPClient()
+        return compile_request(f'http://127.0.0.1:{port}/hook', 'GET')
+
+    async def asyncTearDown(self):
+        self.client.close()
+        # 客户端断开后假服务器的处理协程都会结束
+        if self.handlers:
+            await asyncio.wait(self.handlers, timeout=5)
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_chunked_body(self):
+        async def handler(reader, writer):
+            while await read_request(reader):
+                writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                             b'5;ext=1\r\nhello\r\n6\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\n')
+                await writer.drain()
+            writer.close()
+        template = await self.serve(handler)
+        for _ in range(2):
+            response = await self.client.request(template, timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'hello world')
+        # 尾部字段读完了，第二个请求复用同一个连接
+        self.assertEqual((self.client.connects, self.client.reuses), (1, 1))
+
+    async def test_stale_connection_reconnects(self):
+        async def handler(reader, writer):
+            served = 0
+            while await read_request(reader):
+                if served:
+                    # 模拟服务器恰好在复用时关闭了空闲连接：收到请求后直接断开
+                    break
+                served += 1
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+                await writer.drain()
+            writer.close()
+
+        template = await self.serve(handler)
+        await self.client.request(template, timeout=5)
+        response = await self.client.request(template, timeout=5)
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual((self.client.connects, self.client.reuses), (2, 1))
+
+    async def test_timeout(self):
+        async def handler(reader, writer):
+            await read_request(reader)
+            # 不回复，直到客户端断开
+            await reader.read()
+            writer.close()
+
+        template = await self.serve(handler)
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.client.request(template, timeout=0.1)
+        self.assertFalse(any(self.client._idle.values()))
+
+    async def test_body_until_eof(self):
+        async def handler(reader, writer):
+            await read_request(reader)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\nfirst ')
+            await writer.drain()
+            writer.write(b'second')
+            await writer.drain()
+            writer.close()
+
+        template = await self.serve(handler)
+        response = await self.client.request(template, timeout=5)
+        self.assertEqual(response.content, b'first second')
+        # 没有长度的响应体读到连接关闭为止，连接不能复用
+        self.assertFalse(any(self.client._idle.values()))
+
+
+class AsyncRunnerTest(unittest.TestCase):
+
+    def test_rejects_over_max_pending(self):
+        runner = AsyncRunner(max_pending=2)
+        release = threading.Event()
+
+        async def blocked():
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+
+        try:
+            self.assertTrue(runner.submit(blocked()))
+            self.assertTrue(runner.submit(blocked()))
+            rejected = blocked()
+            self.assertFalse(runner.submit(rejected))
+            # 被拒绝的协程已经关闭，不会有“从未await”的警告
+            self.assertIsNone(rejected.cr_frame)
+            self.assertEqual(runner.pending, 2)
+            release.set()
+            self.assertTrue(runner.wait_idle(5))
+            self.assertTrue(runner.submit(blocked()))
+        finally:
+            release.set()
+            runner.stop(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""用假的连接池检查批量邮件每个收件人的结果"""
+
+import smtplib
+import socket
+import unittest
+from contextlib import contextmanager
+
+from timer_core.bulk_mail import BulkMessage, send_bulk
+
+
+class FakePool:
+    """按 failures 里第几次 sendmail 抛出对应的异常"""
+
+    def __init__(self, failures=None, connect_error=None):
+        self.failures = failures or {}
+        self.connect_error = connect_error
+        self.calls = 0
+        self.sessions = 0
+        self.delivered = []
+
+    @contextmanager
+    def connection(self, server, user, password, timeout=None, reuse=True):
+        if self.connect_error is not None:
+            raise self.connect_error
+        self.sessions += 1
+        yield self
+
+    def sendmail(self, sender, recipients, body):
+        self.calls += 1
+        error = self.failures.get(self.calls)
+        if error is not None:
+            raise error
+        if recipients[0].startswith('refused'):
+            return {recipients[0]: (550, b'no such user')}
+        self.delivered.append(recipients[0])
+        return {}
+
+    def observe(self, stage, server, started):
+        pass
+
+
+def _send(pool, recipients, batch_size=50, throttle=None):
+    return send_bulk(pool, 'smtp.example.com', 'me@example.com', 'pw', recipients, '主题', '内容',
+                     batch_size=batch_size, throttle=throttle)
+
+
+class SendBulkTest(unittest.TestCase):
+
+    def test_all_delivered(self):
+        pool = FakePool()
+        result = _send(pool, ['a', 'b', 'c'])
+        self.assertEqual(result.succeeded, 3)
+        self.assertEqual(result.failed, [])
+        self.assertEqual(pool.delivered, ['a', 'b', 'c'])
+
+    def test_batches_use_separate_sessions(self):
+        pool = FakePool()
+        result = _send(pool, [str(i) for i in range(5)], batch_size=2)
+        self.assertEqual(result.succeeded, 5)
+        self.assertEqual(pool.sessions, 3)
+
+    def test_refused_and_smtp_errors_are_per_recipient(self):
+        pool = FakePool({2: smtplib.SMTPDataError(554, b'rejected')})
+        result = _send(pool, ['a', 'b', 'refused-c', 'd'])
+        self.assertEqual(result.succeeded, 2)
+        self.assertEqual([recipient for recipient, _ in result.failed], ['b', 'refused-c'])
+        self.assertEqual(pool.delivered, ['a', 'd'])
+
+    def test_disconnect_retries_rest_of_batch(self):
+        pool = FakePool({3: smtplib.SMTPServerDisconnected('gone')})
+        result = _send(pool, ['a', 'b', 'c', 'd'])
+        self.assertEqual(result.failed, [])
+        self.assertEqual(pool.delivered, ['a', 'b', 'c', 'd'])
+        self.assertEqual(pool.sessions, 2)
+
+    def test_network_error_only_fails_unsent(self):
+        pool = FakePool({3: socket.timeout('timed out')})
+        result = _send(pool, ['a', 'b', 'c', 'd'])
+        self.assertEqual(result.succeeded, 2)
+        self.assertEqual([recipient for recipient, _ in result.failed], ['c', 'd'])
+        self.assertEqual(pool.delivered, ['a', 'b'])
+
+    def test_connect_error_fails_whole_batch(self):
+        result = _send(FakePool(connect_error=OSError('connection refused')), ['a', 'b'])
+        self.assertEqual(result.succeeded, 0)
+        self.assertEqual(result.failed, [('a', 'connection refused'), ('b', 'connection refused')])
+
+    def test_message_sets_recipient_header(self):
+        body = BulkMessage('me@example.com', '主题', '内容').for_recipient('a@example.com')
+        self.assertTrue(body.startswith(b'To: a@example.com\r\n'))
+
+    def test_throttle_called_per_batch(self):
+        pool = FakePool()
+        counts = []
+        result = _send(pool, [str(i) for i in range(5)], batch_size=2, throttle=lambda n: counts.append(n) or True)
+        self.assertEqual(counts, [2, 2, 1])
+        self.assertEqual(result.succeeded, 5)
+
+    def test_throttle_refusal_fails_the_rest(self):
+        pool = FakePool()
+        counts = []
+        result = _send(pool, [str(i) for i in range(5)], batch_size=2,
+                       throttle=lambda n: counts.append(n) or len(counts) < 2)
+        self.assertEqual(pool.delivered, ['0', '1'])
+        self.assertEqual([recipient for recipient, _ in result.failed], ['2', '3', '4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""两个实例在临时任务库上分配和接管分片租约"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from timer_core.cluster import Cluster
+
+TTL = 1.5
+RENEW = 0.2
+
+
+class ClusterLeaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tasks.db')
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            if node._conn is not None:
+                node._conn.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def node(self, name):
+        # 不启动续约线程，由测试调用 renew() 控制每次续约的时机
+        node = Cluster(self.path, node_id=name, shards=8, ttl=TTL, renew=RENEW)
+        node._conn = node._connect()
+        self.nodes.append(node)
+        return node
+
+    def test_shards_are_split_and_taken_over(self):
+        a, b = self.node('a'), self.node('b')
+        self.assertEqual(a.renew(), (list(range(8)), []))
+        # b 加入时分片都还在 a 的有效租约里，只能等 a 主动释放多出的分片
+        self.assertEqual(b.renew(), ([], []))
+        acquired, released = a.renew()
+        self.assertEqual((acquired, len(released)), ([], 4))
+        b.renew()
+        self.assertEqual(a.owned | b.owned, frozenset(range(8)))
+        self.assertFalse(a.owned & b.owned)
+        task_id = next(str(i) for i in range(100) if b.shard_of(str(i)) in b.owned)
+        self.assertTrue(b.owns(task_id))
+        self.assertFalse(a.owns(task_id))
+
+        # a 崩溃不再续约：租约过期后 b 接管全部分片
+        a_shards = a.owned
+        time.sleep(TTL + 0.1)
+        self.assertFalse(any(a.owns(str(i)) for i in range(100)))
+        acquired, released = b.renew()
+        self.assertEqual(set(acquired), set(a_shards))
+        self.assertEqual(b.owned, frozenset(range(8)))
+        self.assertEqual(b.nodes, 1)
+
+    def test_stop_releases_leases_immediately(self):
+        a = Cluster(self.path, node_id='a', shards=8, ttl=TTL, renew=RENEW)
+        a.start()
+        self.assertEqual(a.owned, frozenset(range(8)))
+        a.stop()
+        b = self.node('b')
+        acquired, _ = b.renew()
+        self.assertEqual(acquired, list(range(8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
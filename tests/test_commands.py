@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""命令超时只看命令本身，后台进程占着输出管道时不会卡住"""
+
+import os
+import time
+import unittest
+
+from timer_core.commands import OUTPUT_GRACE, CommandRunner
+
+
+@unittest.skipIf(os.name == 'nt', '用到了 sh 和 sleep')
+class CommandRunnerTest(unittest.TestCase):
+
+    def test_background_child_does_not_block_or_time_out(self):
+        started = time.monotonic()
+        result = CommandRunner().run({'command': 'sleep 30 & echo 完成', 'timeout': 10})
+        self.assertLess(time.monotonic() - started, 2 * OUTPUT_GRACE + 2)
+        self.assertFalse(result.timed_out)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.output, ['完成'])
+        self.assertTrue(result.ok)
+
+    def test_timeout_kills_command(self):
+        started = time.monotonic()
+        result = CommandRunner().run({'command': 'echo 开始; sleep 30', 'timeout': 0.5})
+        self.assertLess(time.monotonic() - started, 0.5 + 2 * OUTPUT_GRACE + 2)
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.output, ['开始'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""读取配置文件：同一计划的任务不能悄悄共用一个id"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from timer_core.config import load_config
+
+
+class LoadConfigTest(unittest.TestCase):
+
+    def load(self, config):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'config.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False)
+            return load_config(path)
+
+    def test_duplicate_schedule_rejected(self):
+        tasks = [{'name': '提醒', 'time': '09:00', 'push': {'type': 'smtp', 'smtp': {'to': 'a@example.com'}}},
+                 {'name': '提醒', 'time': '09:00', 'push': {'type': 'smtp', 'smtp': {'to': 'b@example.com'}}}]
+        with self.assertRaises(ValueError):
+            self.load({'tasks': tasks})
+
+    def test_explicit_ids_keep_both(self):
+        tasks = [{'id': 'a', 'name': '提醒', 'time': '09:00'}, {'id': 'b', 'name': '提醒', 'time': '09:00'}]
+        self.assertEqual([task['id'] for task in self.load({'tasks': tasks})['tasks']], ['a', 'b'])
+
+    def test_generated_id_is_stable(self):
+        task = {'name': '提醒', 'time': '09:00'}
+        self.assertEqual(self.load({'tasks': [dict(task)]})['tasks'][0]['id'],
+                         self.load({'tasks': [dict(task)]})['tasks'][0]['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
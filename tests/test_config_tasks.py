@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""配置文件里的任务以配置为准：从配置里删掉的任务也从任务库里删除"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timer_core.engine import TimerEngine
+from timer_core.store import TaskStore
+
+
+def task(task_id, name):
+    return {'id': task_id, 'name': name, 'time': '09:00:00', 'repeat': '每天'}
+
+
+class ConfigTaskSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tasks.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def run_config(self, tasks):
+        engine = TimerEngine(store=TaskStore(self.path))
+        engine.load_tasks()
+        result = engine.sync_config_tasks(tasks)
+        engine.shutdown()
+        return result
+
+    def stored(self):
+        store = TaskStore(self.path)
+        try:
+            return {task['id']: task for task in store.load_tasks()}
+        finally:
+            store.close()
+
+    def test_removed_config_tasks_are_deleted(self):
+        self.run_config([task('a', '任务a'), task('b', '任务b')])
+        store = TaskStore(self.path)
+        store.save_task(task('user', '界面添加'))
+        store.close()
+
+        added, errors, removed = self.run_config([task('a', '任务a')])
+        self.assertEqual([t['id'] for t in added], ['a'])
+        self.assertEqual(errors, [])
+        self.assertEqual([t['id'] for t in removed], ['b'])
+        stored = self.stored()
+        self.assertEqual(sorted(stored), ['a', 'user'])
+        self.assertEqual(stored['a']['source'], 'config')
+        self.assertNotIn('source', stored['user'])
+
+    def test_invalid_config_task_replaces_stored_copy(self):
+        self.run_config([task('a', '任务a')])
+        added, errors, removed = self.run_config([dict(task('a', '任务a'), time='25:00:00')])
+        self.assertEqual(added, [])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual([t['id'] for t in removed], ['a'])
+        self.assertEqual(self.stored(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
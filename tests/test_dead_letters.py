@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""重放死信：成功后才删除，没发送完的保留，再次失败的换成新的死信"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from timer_core.engine import TimerEngine
+from timer_core.retry import RetryPolicy
+from timer_core.store import TaskStore
+
+SERVER = 'smtp.example.com'
+
+
+class DeadLetterReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tasks.db')
+        self.sent = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def engine(self, rate_limits=None, ok=True):
+        store = TaskStore(self.path)
+        for i in range(6):
+            store.add_dead_letter(f't{i}', 1000.0 + i, 'smtp',
+                                  {'args': [SERVER, 'me@example.com', 'pw', f'to{i}@example.com', '主题', '内容'],
+                                   'task_name': f'任务{i}'}, '发送失败', 5)
+        engine = TimerEngine(store=store, rate_limits=rate_limits)
+
+        def send_email(server, user, password, to, subject, content, timeout=None):
+            self.sent.append(to)
+            return ok
+        engine.send_email = send_email
+        return engine
+
+    def remaining(self):
+        store = TaskStore(self.path)
+        try:
+            return store.list_dead_letters()
+        finally:
+            store.close()
+
+    def test_successful_replay_deletes(self):
+        engine = self.engine()
+        self.assertEqual(engine.replay_dead_letters(), 6)
+        self.assertTrue(engine.wait_idle(5))
+        engine.shutdown()
+        self.assertEqual(len(self.sent), 6)
+        self.assertEqual(self.remaining(), [])
+
+    def test_rate_limited_replays_are_kept_until_sent(self):
+        engine = self.engine(rate_limits={f'smtp:{SERVER}': {'rate': 0.1, 'burst': 2}})
+        self.assertEqual(engine.replay_dead_letters(), 6)
+        # 只有2个令牌，其余4条在时间轮里等限速，等不到就退出
+        self.assertFalse(engine.wait_idle(0.5))
+        engine.shutdown()
+        self.assertEqual(len(self.sent), 2)
+        left = self.remaining()
+        self.assertEqual(len(left), 4)
+        self.assertFalse({item['payload']['args'][3] for item in left} & set(self.sent))
+
+    def test_failed_replay_becomes_new_dead_letter(self):
+        engine = self.engine(ok=False)
+        engine.retry.policy = RetryPolicy(max_attempts=1)
+        before = {item['id'] for item in self.remaining()}
+        engine.replay_dead_letters()
+        self.assertTrue(engine.wait_idle(5))
+        engine.shutdown()
+        left = self.remaining()
+        self.assertEqual(len(left), 6)
+        self.assertFalse({item['id'] for item in left} & before)
+
+    def test_replay_in_progress_is_not_replayed_twice(self):
+        engine = self.engine(rate_limits={f'smtp:{SERVER}': {'rate': 0.1, 'burst': 2}})
+        self.assertEqual(engine.replay_dead_letters(), 6)
+        self.assertEqual(engine.replay_dead_letters(), 0)
+        engine.shutdown()
+
+    def test_merged_replay_records_every_task(self):
+        store = TaskStore(self.path)
+        runs = [('a', 1000.0), ('b', 1001.0)]
+        store.claim_runs(runs)
+        for task_id, fire_ts in runs:
+            store.record_result(task_id, fire_ts, False)
+        store.add_dead_letter('a', 1000.0, 'smtp',
+                              {'args': [SERVER, 'me@example.com', 'pw', 'to@example.com', '合并', '内容'],
+                               'task_name': '任务a', 'tasks': [list(run) for run in runs]}, '发送失败', 5)
+        engine = TimerEngine(store=store)
+        engine.send_email = lambda *args, **kwargs: True
+        self.assertEqual(engine.replay_dead_letters(), 1)
+        self.assertTrue(engine.wait_idle(5))
+        engine.shutdown()
+        store = TaskStore(self.path)
+        try:
+            self.assertEqual([store.run_status(*run) for run in runs], ['ok', 'ok'])
+            self.assertEqual(store.list_dead_letters(), [])
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""停止通道时排队的推送先发送完，队列一直是满的时不会卡住"""
+
+import threading
+import time
+import unittest
+
+from timer_core.dispatch import Dispatcher
+
+
+class DispatcherStopTest(unittest.TestCase):
+
+    def test_stop_drains_queue(self):
+        done = []
+        dispatcher = Dispatcher(limits={'smtp': 2}, queue_size=10)
+        for i in range(10):
+            self.assertTrue(dispatcher.submit('smtp', lambda i, timeout=None: done.append(i), i))
+        dispatcher.stop()
+        self.assertEqual(sorted(done), list(range(10)))
+
+    def test_stop_with_full_queue_returns_after_timeout(self):
+        release = threading.Event()
+        done = []
+
+        def job(i, timeout=None):
+            release.wait(5)
+            done.append(i)
+        dispatcher = Dispatcher(limits={'smtp': 1}, queue_size=3)
+        pool = dispatcher.channels['smtp']
+        dispatcher.submit('smtp', job, 0)
+        deadline = time.monotonic() + 2
+        while pool.active == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for i in range(1, 4):
+            self.assertTrue(dispatcher.submit('smtp', job, i))
+        [worker] = pool._threads
+        started = time.monotonic()
+        dispatcher.stop(timeout=0.2)
+        self.assertLess(time.monotonic() - started, 1)
+        # 放弃等待后工作线程发完手上这个就退出，排队的不再发送
+        release.set()
+        worker.join(2)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(done, [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
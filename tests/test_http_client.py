@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""compile_request 编译出的请求和原来每次触发时现场解析发出的请求一致"""
+
+import json
+import unittest
+
+from timer_core.http_client import HTTPClient, compile_request
+
+CASES = [
+    ('https://example.com/hook', 'POST', '{"Authorization": "Bearer x"}', '{"msg": "早报", "n": 1}'),
+    ('https://example.com/hook?a=1', 'get', '', '{"q": "天气"}'),
+    ('http://example.com:8080/put', 'PUT', '{"X-Id": "7"}', ''),
+    ('https://example.com/', 'post', '', ''),
+]
+
+
+def old_request(url, method, headers, body, timeout=10):
+    """原来的做法：每次发送前解析JSON，按方法分别调用 requests.get/post/put"""
+    headers_dict = json.loads(headers) if headers else {}
+    body_dict = json.loads(body) if body else {}
+    if method.upper() == 'GET':
+        return 'GET', url, {'headers': headers_dict, 'params': body_dict, 'timeout': timeout}
+    return method.upper(), url, {'headers': headers_dict, 'json': body_dict, 'timeout': timeout}
+
+
+class FakeSession:
+
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+
+
+class CompileRequestTest(unittest.TestCase):
+
+    def test_matches_old_build(self):
+        client = HTTPClient()
+        client._session = FakeSession()
+        for case in CASES:
+            with self.subTest(case=case):
+                client.send(compile_request(*case), timeout=10)
+                self.assertEqual(client._session.calls[-1], old_request(*case))
+
+    def test_same_config_is_compiled_once(self):
+        self.assertIs(compile_request(*CASES[0]), compile_request(*CASES[0]))
+
+    def test_invalid_config(self):
+        for case in [('ftp://example.com', 'POST'), ('example.com/hook', 'POST'),
+                     ('https://example.com', 'DELETE'), ('https://example.com', 'POST', '{bad'),
+                     ('https://example.com', 'POST', '', '[1, 2]')]:
+            with self.subTest(case=case), self.assertRaises(ValueError):
+                compile_request(*case)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""导入本包（界面启动时）不加载asyncio和ssl，只有异步发送时才加载"""
+
+import subprocess
+import sys
+import unittest
+
+CHECK = '''
+import sys
+import timer_core
+from timer_core.engine import TimerEngine
+print('asyncio' in sys.modules, 'ssl' in sys.modules)
+engine = TimerEngine(http_backend='async')
+engine.shutdown()
+print('asyncio' in sys.modules)
+'''
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def test_async_http_loaded_only_for_async_backend(self):
+        output = subprocess.run([sys.executable, '-c', CHECK], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), ['False', 'False', 'True'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""日志按写入顺序取出，界面端只保留最新的行，日志文件里一行不少"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from timer_core.logpipe import LogPipeline
+
+LINE = re.compile(r'^\[\d\d:\d\d:\d\d\] (.*)$')
+FILE_LINE = re.compile(r'^\d{4}-\d\d-\d\d \[\d\d:\d\d:\d\d\] (.*)$')
+
+
+def messages(lines, pattern=LINE):
+    return [pattern.match(line).group(1) for line in lines]
+
+
+class LogPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_drain_in_order(self):
+        log = LogPipeline()
+        for i in range(5):
+            log.write(f'第{i}行')
+        self.assertEqual(messages(log.drain(limit=2)), ['第0行', '第1行'])
+        log.write('第5行')
+        self.assertEqual(messages(log.drain()), ['第2行', '第3行', '第4行', '第5行'])
+        self.assertEqual(log.drain(), [])
+
+    def test_view_keeps_newest_lines(self):
+        log = LogPipeline(view_lines=3)
+        for i in range(10):
+            log.write(str(i))
+        self.assertEqual(messages(log.drain()), ['7', '8', '9'])
+
+    def test_threads_keep_their_own_order(self):
+        log = LogPipeline(view_lines=10000)
+
+        def worker(name):
+            for i in range(500):
+                log.write(f'{name} {i}')
+        threads = [threading.Thread(target=worker, args=(name,)) for name in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        lines = messages(log.drain())
+        self.assertEqual(len(lines), 2000)
+        for name in 'abcd':
+            self.assertEqual([line for line in lines if line[0] == name], [f'{name} {i}' for i in range(500)])
+
+    def test_file_sink(self):
+        path = os.path.join(self.dir, 'timer.log')
+        log = LogPipeline(path, view_lines=10)
+        for i in range(3000):
+            log.write(f'任务{i}')
+        log.close()
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        # 界面端只留最新的10行，文件里按顺序写入了全部日志
+        self.assertEqual(messages(lines, FILE_LINE), [f'任务{i}' for i in range(3000)])
+        self.assertEqual(len(log.drain()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
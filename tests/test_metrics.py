@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""指标的Prometheus文本输出，以及异步HTTP发送也计入 timer_jobs_total"""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from timer_core.engine import TimerEngine
+from timer_core.metrics import MetricsRegistry
+
+
+class RenderTest(unittest.TestCase):
+
+    def test_prometheus_text(self):
+        r = MetricsRegistry()
+        sent = r.counter('sent_total', '发送数', ('channel',))
+        sent.inc('smtp')
+        sent.inc('smtp', amount=2)
+        sent.inc('http')
+        r.gauge('queue_depth', '排队数', lambda: {(): 4})
+        latency = r.histogram('latency_seconds', '耗时', ('host',), buckets=(0.1, 1.0))
+        latency.observe(0.05, 'a.com')
+        latency.observe(0.5, 'a.com')
+        latency.observe(2.5, 'a.com')
+        self.assertEqual(r.render(), '\n'.join([
+            '# HELP sent_total 发送数',
+            '# TYPE sent_total counter',
+            'sent_total{channel="smtp"} 3',
+            'sent_total{channel="http"} 1',
+            '# HELP queue_depth 排队数',
+            '# TYPE queue_depth gauge',
+            'queue_depth 4',
+            '# HELP latency_seconds 耗时',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{host="a.com",le="0.1"} 1',
+            'latency_seconds_bucket{host="a.com",le="1"} 2',
+            'latency_seconds_bucket{host="a.com",le="+Inf"} 3',
+            'latency_seconds_sum{host="a.com"} 3.05',
+            'latency_seconds_count{host="a.com"} 3',
+        ]) + '\n')
+
+    def test_label_escaping(self):
+        r = MetricsRegistry()
+        r.counter('errors_total', '错误数', ('reason',)).inc('say "hi"\\\n')
+        self.assertIn('errors_total{reason="say \\"hi\\"\\\\\\n"} 1', r.render())
+
+
+class OKHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncJobsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), OKHandler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_async_sends_are_counted(self):
+        engine = TimerEngine(http_backend='async', coalesce_window=0)
+        url = f'http://127.0.0.1:{self.httpd.server_address[1]}/hook'
+        task = {'id': 't', 'name': 'Webhook', 'time': '08:00',
+                'push': {'type': 'http', 'http': {'url': url, 'method': 'POST', 'headers': '', 'body': ''}}}
+        try:
+            for _ in range(3):
+                engine.execute_task(task)
+            self.assertTrue(engine.wait_idle(5))
+            text = engine.metrics.registry.render()
+        finally:
+            engine.shutdown()
+        self.assertIn('timer_jobs_total{channel="http",result="ok"} 3', text)
+        self.assertIn('timer_send_seconds_count{channel="http"} 3', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
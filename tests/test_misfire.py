@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""错过超过 CATCHUP_LIMIT 次时保留最近的几次，once 补执行的是最近一次"""
+
+import unittest
+
+from timer_core.misfire import CATCHUP_LIMIT, missed_runs, resolve_misfire
+
+
+def every_minute(task, ts):
+    return (ts // 60 + 1) * 60
+
+
+class MissedRunsTest(unittest.TestCase):
+
+    def test_keeps_newest_runs(self):
+        now = 60 * 100000
+        calls = []
+
+        def next_fire(task, ts):
+            calls.append(ts)
+            return every_minute(task, ts)
+        runs, next_ts = missed_runs({}, 0, now, next_fire)
+        self.assertEqual(len(runs), CATCHUP_LIMIT)
+        self.assertEqual(runs[-1], now)
+        self.assertEqual(runs, sorted(runs))
+        self.assertEqual(next_ts, now + 60)
+        # 跳过了很久以前的触发，没有逐个计算10万次
+        self.assertLess(len(calls), 4 * CATCHUP_LIMIT)
+
+    def test_once_fires_latest(self):
+        now = 60 * 5000
+        runs, _ = missed_runs({}, 0, now, every_minute)
+        self.assertEqual(resolve_misfire({'misfire': 'once', 'grace': 0}, runs, now + 30)[0], [now])
+
+    def test_uneven_schedule_does_not_lose_latest(self):
+        # 前面每分钟一次，之后一天一次：按前面的间隔跳过去会落在最后一次触发之后
+        switch = 60 * 2000
+
+        def next_fire(task, ts):
+            if ts < switch:
+                return every_minute(task, ts)
+            return switch + ((ts - switch) // 86400 + 1) * 86400
+        now = switch + 86400 * 3
+        runs, _ = missed_runs({}, 0, now, next_fire)
+        self.assertEqual(runs[-1], now)
+        self.assertEqual(len(runs), CATCHUP_LIMIT)
+
+    def test_few_runs_listed_in_full(self):
+        runs, next_ts = missed_runs({}, 0, 600, every_minute)
+        self.assertEqual(runs, [60 * i for i in range(11)])
+        self.assertEqual(next_ts, 660)
+
+
+if __name__ == '__main__':
+    unittest.main()
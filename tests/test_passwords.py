@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""SMTP密码不写进任务库、死信库和导出文件，发送时按服务器和账号取全局配置里的密码"""
+
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from timer_core.engine import TimerEngine
+from timer_core.retry import RetryPolicy
+from timer_core.store import TaskStore
+from timer_core.taskio import FORMAT_CSV, FORMAT_JSONL, write_tasks
+
+SMTP = {'server': 'smtp.example.com', 'user': 'me@example.com', 'password': 'secret',
+        'to': 'to@example.com', 'subject': '主题', 'content': '内容'}
+
+
+def task_with_push(password='secret'):
+    return {'id': 't', 'name': '提醒', 'time': '09:00', 'date': '2026-01-05',
+            'push': {'type': 'smtp', 'smtp': dict(SMTP, password=password)}}
+
+
+class PasswordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tasks.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_task_password_is_not_stored(self):
+        engine = TimerEngine(store=TaskStore(self.path))
+        task = engine.add_task(task_with_push())
+        self.assertNotIn('password', task['push']['smtp'])
+        _, _, args = engine.build_push(task['push'], task)
+        self.assertEqual(args[2], 'secret')
+        engine.shutdown()
+        with open(self.path, 'rb') as f:
+            self.assertNotIn(b'secret', f.read())
+
+    def test_global_password_is_used(self):
+        engine = TimerEngine({'smtp': SMTP})
+        task = engine.add_task(task_with_push(password=''))
+        _, _, args = engine.build_push(task['push'], task)
+        engine.shutdown()
+        self.assertEqual(args[2], 'secret')
+
+    def test_missing_password_is_a_config_error(self):
+        engine = TimerEngine()
+        task = engine.add_task(task_with_push(password=''))
+        with self.assertRaises(ValueError):
+            engine.build_push(task['push'], task)
+        engine.shutdown()
+
+    def test_legacy_stored_password_is_removed(self):
+        store = TaskStore(self.path)
+        store.save_task(task_with_push())
+        engine = TimerEngine(store=store)
+        engine.load_tasks()
+        self.assertEqual(engine.smtp_password(SMTP['server'], SMTP['user']), 'secret')
+        engine.shutdown()
+        store = TaskStore(self.path)
+        try:
+            self.assertNotIn('password', store.load_tasks()[0]['push']['smtp'])
+        finally:
+            store.close()
+
+    def test_readonly_store_is_not_modified(self):
+        store = TaskStore(self.path)
+        store.save_task(task_with_push())
+        store.close()
+        with open(self.path, 'rb') as f:
+            before = f.read()
+        store = TaskStore(self.path, readonly=True)
+        engine = TimerEngine(store=store)
+        engine.load_tasks()
+        self.assertEqual(engine.smtp_password(SMTP['server'], SMTP['user']), 'secret')
+        with self.assertRaises(sqlite3.OperationalError):
+            store.save_task(task_with_push())
+        engine.shutdown()
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), before)
+
+    def test_dead_letter_keeps_no_password(self):
+        engine = TimerEngine({'smtp': SMTP}, store=TaskStore(self.path))
+        engine.retry.policy = RetryPolicy(max_attempts=1)
+        sent = []
+
+        def send_email(server, user, password, to, subject, content, timeout=None):
+            sent.append(password)
+            return False
+        engine.send_email = send_email
+        task = engine.add_task(task_with_push(password=''))
+        channel, send, args = engine.build_push(task['push'], task)
+        engine._submit_delivery(engine._delivery(task, None, channel, engine.send_email, args))
+        self.assertTrue(engine.wait_idle(5))
+        [item] = engine.retry.dead_letters.list_dead_letters()
+        self.assertEqual(item['payload']['args'][2], '')
+        engine.replay_dead_letters()
+        self.assertTrue(engine.wait_idle(5))
+        engine.shutdown()
+        self.assertEqual(sent, ['secret', 'secret'])
+
+    def test_export_strips_password(self):
+        for fmt in (FORMAT_JSONL, FORMAT_CSV):
+            f = io.StringIO()
+            write_tasks([task_with_push()], f, fmt)
+            self.assertNotIn('secret', f.getvalue())
+        f = io.StringIO()
+        write_tasks([task_with_push()], f, FORMAT_JSONL)
+        self.assertEqual(json.loads(f.getvalue())['push']['smtp']['server'], SMTP['server'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""限速按实际发出的邮件数占用令牌，批量邮件每批发送前等待令牌"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from timer_core.config import load_config
+from timer_core.engine import TimerEngine
+from timer_core.ratelimit import RateLimiter
+
+from .test_bulk_mail import FakePool
+
+SERVER = 'smtp.example.com'
+
+
+class RateLimitCostTest(unittest.TestCase):
+
+    def test_cost_takes_several_tokens(self):
+        limiter = RateLimiter({f'smtp:{SERVER}': {'rate': 1.0, 'burst': 5}})
+        keys = (f'smtp:{SERVER}',)
+        now = time.monotonic() + 1
+        self.assertEqual(limiter.reserve(keys, 5, now=now), 0.0)
+        # 桶已经用完，再发3封要等3秒
+        self.assertAlmostEqual(limiter.reserve(keys, 3, now=now), 3.0)
+        self.assertEqual(limiter.delayed, 1)
+
+    def test_bulk_mail_waits_for_tokens_per_batch(self):
+        engine = TimerEngine(rate_limits={f'smtp:{SERVER}': {'rate': 200, 'burst': 10}})
+        pool, engine.smtp_pool = engine.smtp_pool, FakePool()
+        recipients = [f'to{i}@example.com' for i in range(110)]
+        started = time.monotonic()
+        try:
+            ok = engine.send_bulk_email(SERVER, 'me@example.com', 'pw', recipients, '主题', '内容')
+        finally:
+            delivered, engine.smtp_pool = engine.smtp_pool.delivered, pool
+            engine.shutdown()
+        self.assertTrue(ok)
+        self.assertEqual(len(delivered), 110)
+        # 投递时已经占用1个，桶里10个，剩下99封按每秒200封发出
+        self.assertGreater(time.monotonic() - started, 99 / 200 - 0.05)
+
+    def test_invalid_rules_rejected(self):
+        for rule in ({'rate': 0}, {'rate': -1}, {'rate': '1'}, {'rate': 1, 'burst': 0}, {'burst': 5}):
+            with self.subTest(rule=rule):
+                with self.assertRaises(ValueError):
+                    RateLimiter({'http:*': rule})
+
+    def test_invalid_rules_rejected_by_config(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'config.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'rate_limits': {f'smtp:{SERVER}': {'rate': 0}}}, f)
+            with self.assertRaises(ValueError):
+                load_config(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""cron表达式、每月规则的月末取值，以及夏令时跳过和重复的时刻"""
+
+import itertools
+import os
+import time
+import unittest
+from datetime import datetime
+
+from timer_core.recurrence import (REPEAT_MONTHLY, CronRule, DailyRule, IntervalRule, MonthlyRule,
+                                   parse_rule)
+
+# 美国东部时间的POSIX写法，不依赖系统的时区数据库：
+# 2026-03-08 02:00 拨快到 03:00，2026-11-01 02:00 拨回到 01:00
+DST_ZONE = 'EST5EDT,M3.2.0,M11.1.0'
+
+
+def fires(rule, after, count):
+    return [datetime.fromtimestamp(ts) for ts in itertools.islice(rule.iter_ts(after.timestamp()), count)]
+
+
+class CronRuleTest(unittest.TestCase):
+
+    def test_ranges_and_steps(self):
+        rule = CronRule('*/15 9-17 * * 1-5')
+        # 周五下班之后，下一次是周一早上
+        self.assertEqual(rule.next_after(datetime(2026, 1, 9, 17, 50)), datetime(2026, 1, 12, 9, 0))
+        self.assertEqual(rule.next_after(datetime(2026, 1, 12, 9, 0)), datetime(2026, 1, 12, 9, 15))
+        self.assertEqual(rule.next_after(datetime(2026, 1, 12, 9, 7, 30)), datetime(2026, 1, 12, 9, 15))
+
+    def test_day_or_weekday(self):
+        # 日和星期都限定时满足任意一个即可：每月1号或者每个周日
+        rule = CronRule('0 8 1 * 0')
+        self.assertEqual(rule.next_after(datetime(2026, 1, 1, 8, 0)), datetime(2026, 1, 4, 8, 0))
+        self.assertEqual(rule.next_after(datetime(2026, 3, 29, 8, 0)), datetime(2026, 4, 1, 8, 0))
+
+    def test_seven_is_sunday(self):
+        self.assertEqual(CronRule('0 12 * * 7').next_after(datetime(2026, 1, 1)), datetime(2026, 1, 4, 12, 0))
+
+    def test_never_fires(self):
+        self.assertIsNone(CronRule('0 0 30 2 *').next_after(datetime(2026, 1, 1)))
+
+    def test_invalid_expressions(self):
+        for expr in ('* * * *', '60 * * * *', '* 24 * * *', '*/0 * * * *', '5-1 * * * *'):
+            with self.subTest(expr=expr), self.assertRaises(ValueError):
+                CronRule(expr)
+
+
+class MonthlyRuleTest(unittest.TestCase):
+
+    def test_clamps_to_month_end(self):
+        rule = MonthlyRule(31, 9, 0)
+        self.assertEqual(fires(rule, datetime(2026, 1, 31, 9, 0), 4),
+                         [datetime(2026, 2, 28, 9, 0), datetime(2026, 3, 31, 9, 0),
+                          datetime(2026, 4, 30, 9, 0), datetime(2026, 5, 31, 9, 0)])
+
+    def test_leap_february(self):
+        rule = MonthlyRule(30, 9, 0)
+        self.assertEqual(rule.next_after(datetime(2028, 1, 30, 9, 0)), datetime(2028, 2, 29, 9, 0))
+        self.assertEqual(rule.next_after(datetime(2028, 2, 29, 9, 0)), datetime(2028, 3, 30, 9, 0))
+
+    def test_does_not_fire_before_start(self):
+        rule = parse_rule(REPEAT_MONTHLY, '09:00', '2026-01-31')
+        self.assertEqual(fires(rule, datetime(2025, 12, 1), 2),
+                         [datetime(2026, 1, 31, 9, 0), datetime(2026, 2, 28, 9, 0)])
+
+
+@unittest.skipUnless(hasattr(time, 'tzset'), '需要 time.tzset 切换时区')
+class DaylightSavingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old_zone = os.environ.get('TZ')
+        os.environ['TZ'] = DST_ZONE
+        time.tzset()
+
+    def tearDown(self):
+        if self.old_zone is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = self.old_zone
+        time.tzset()
+
+    def test_skipped_time_moves_forward(self):
+        # 2026-03-08 没有 02:30，顺延到跳变之后的 03:30，第二天照常
+        self.assertEqual(fires(DailyRule(2, 30), datetime(2026, 3, 7, 3, 0), 2),
+                         [datetime(2026, 3, 8, 3, 30), datetime(2026, 3, 9, 2, 30)])
+
+    def test_repeated_time_fires_once(self):
+        rule = DailyRule(1, 30)
+        first = rule.next_ts(datetime(2026, 11, 1).timestamp())
+        self.assertEqual(first, datetime(2026, 11, 1, 1, 30, fold=0).timestamp())
+        # 拨回之后的第二个 01:30 不再触发，下一次是第二天
+        self.assertEqual(rule.next_ts(first), datetime(2026, 11, 2, 1, 30).timestamp())
+        self.assertEqual(rule.next_ts(first) - first, 25 * 3600)
+
+    def test_cron_over_repeated_hour(self):
+        rule = CronRule('*/30 * * * *')
+        start = datetime(2026, 11, 1, 0, 45).timestamp()
+        stamps = list(itertools.islice(rule.iter_ts(start), 4))
+        self.assertEqual([datetime.fromtimestamp(ts) for ts in stamps],
+                         [datetime(2026, 11, 1, 1, 0), datetime(2026, 11, 1, 1, 30),
+                          datetime(2026, 11, 1, 2, 0), datetime(2026, 11, 1, 2, 30)])
+        self.assertEqual([b - a for a, b in zip(stamps, stamps[1:])], [1800, 5400, 1800])
+
+    def test_cron_skipped_time_moves_forward(self):
+        self.assertEqual(fires(CronRule('30 2 * * *'), datetime(2026, 3, 7, 3, 0), 2),
+                         [datetime(2026, 3, 8, 3, 30), datetime(2026, 3, 9, 2, 30)])
+
+    def test_interval_counts_elapsed_time(self):
+        rule = IntervalRule(3600, datetime(2026, 11, 1))
+        stamps = list(itertools.islice(rule.iter_ts(datetime(2026, 11, 1).timestamp()), 3))
+        self.assertEqual([b - a for a, b in zip(stamps, stamps[1:])], [3600, 3600])
+        # 按经过的时间计算，01:00 在拨回前后各触发一次
+        self.assertEqual([datetime.fromtimestamp(ts).hour for ts in stamps], [1, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
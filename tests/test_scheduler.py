@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""用虚拟时钟驱动调度器，检查错过策略和分批补执行"""
+
+import unittest
+from datetime import datetime
+
+from timer_core.recurrence import REPEAT_DAILY, REPEAT_INTERVAL
+from timer_core.scheduler import CATCHUP_BATCH, Scheduler
+from timer_core.simulate import VirtualClock
+from timer_core.taskmodel import Task
+
+
+def _ts(*args):
+    return datetime(*args).timestamp()
+
+
+class SchedulerClockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(_ts(2026, 1, 5, 7, 0))
+        self.fired = []
+        self.misfired = []
+        self.scheduler = Scheduler(lambda task, fire_ts: self.fired.append((task['id'], fire_ts)),
+                                   on_misfire=lambda task, late, count: self.misfired.append((late, count)),
+                                   clock=self.clock)
+
+    def add(self, **fields):
+        task = Task(dict({'id': 't1', 'name': '测试', 'time': '08:00', 'repeat': REPEAT_DAILY}, **fields))
+        self.scheduler.add(task)
+        return task
+
+    def run_until(self, ts):
+        """像 Simulation.run() 一样逐个醒来，直到把时钟拨到ts"""
+        while True:
+            wakeup = self.scheduler.next_wakeup()
+            if wakeup is None or wakeup > ts:
+                break
+            self.clock.set(wakeup)
+            self.scheduler.step()
+        self.clock.set(ts)
+        self.scheduler.step()
+
+    def test_fires_on_time(self):
+        self.add()
+        self.run_until(_ts(2026, 1, 5, 7, 59, 59))
+        self.assertEqual(self.fired, [])
+        self.run_until(_ts(2026, 1, 5, 8, 0))
+        self.assertEqual(self.fired, [('t1', _ts(2026, 1, 5, 8, 0))])
+        self.assertEqual(self.misfired, [])
+        self.assertEqual(self.scheduler.next_fire_time('t1'), _ts(2026, 1, 6, 8, 0))
+
+    def check_policy(self, policy, expected_runs):
+        self.add(misfire=policy)
+        # 休眠了三天多，错过了5日到8日的四次触发
+        self.clock.set(_ts(2026, 1, 8, 9, 0))
+        while self.scheduler.next_wakeup() <= self.clock.time():
+            self.scheduler.step()
+        self.assertEqual([fire_ts for _, fire_ts in self.fired], expected_runs)
+        self.assertEqual(self.misfired, [(4, len(expected_runs))])
+        # 错过的触发处理完后从现在之后继续，不会重复触发
+        self.assertEqual(self.scheduler.next_fire_time('t1'), _ts(2026, 1, 9, 8, 0))
+
+    def test_misfire_once_runs_latest(self):
+        self.check_policy('once', [_ts(2026, 1, 8, 8, 0)])
+
+    def test_misfire_all_runs_every_missed(self):
+        self.check_policy('all', [_ts(2026, 1, day, 8, 0) for day in (5, 6, 7, 8)])
+
+    def test_misfire_skip_runs_none(self):
+        self.check_policy('skip', [])
+
+    def test_runs_within_grace_are_not_misfires(self):
+        self.add(grace=3600)
+        self.clock.set(_ts(2026, 1, 5, 8, 30))
+        self.scheduler.step()
+        self.assertEqual(self.fired, [('t1', _ts(2026, 1, 5, 8, 0))])
+        self.assertEqual(self.misfired, [])
+
+    def test_catchup_in_batches(self):
+        self.add(time='1m', repeat=REPEAT_INTERVAL, date='2026-01-05', misfire='all')
+        self.clock.set(_ts(2026, 1, 5, 12, 0))
+        # 一次最多补执行 CATCHUP_BATCH 次，剩下的留到之后的 step()
+        self.scheduler.step()
+        self.assertEqual(len(self.fired), CATCHUP_BATCH)
+        self.assertTrue(self.scheduler.catchup_pending)
+        self.assertEqual(self.scheduler.next_wakeup(), self.clock.time())
+        while self.scheduler.catchup_pending:
+            self.scheduler.step()
+        fires = [fire_ts for _, fire_ts in self.fired]
+        self.assertEqual(fires, sorted(set(fires)))
+        self.assertEqual(len(fires), 300)
+        self.assertEqual(fires[-1], _ts(2026, 1, 5, 12, 0))
+        self.assertEqual(self.scheduler.next_fire_time('t1'), _ts(2026, 1, 5, 12, 1))
+
+    def test_removed_task_does_not_fire(self):
+        self.add()
+        self.scheduler.remove('t1')
+        self.clock.set(_ts(2026, 1, 5, 8, 0))
+        self.assertEqual(self.scheduler.step(), 0)
+        self.assertEqual(self.fired, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
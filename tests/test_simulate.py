@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""用虚拟时钟回放两天的触发，检查触发次数、每天分布、撞车和不会触发的任务"""
+
+import csv
+import io
+import unittest
+from datetime import datetime
+
+from timer_core.simulate import Simulation, VirtualClock
+
+
+def http_task(task_id, time_text, repeat='每天', date=None, host='example.com'):
+    task = {'id': task_id, 'name': task_id, 'time': time_text, 'repeat': repeat,
+            'push': {'type': 'http', 'http': {'url': f'https://{host}/hook', 'method': 'POST',
+                                              'headers': '', 'body': ''}}}
+    if date is not None:
+        task['date'] = date
+    return task
+
+
+class SimulationTest(unittest.TestCase):
+
+    def test_two_days(self):
+        tasks = [
+            http_task('早报', '09:00'),
+            http_task('晨会', '09:00'),
+            http_task('心跳', '30m', repeat='间隔', date='2026-01-05', host='other.example.com'),
+            http_task('周报', '08:00', repeat='每周', date='2026-01-05'),
+            http_task('年会', '18:00', repeat='一次', date='2026-02-01'),
+        ]
+        timeline = io.StringIO()
+        simulation = Simulation(tasks, start=datetime(2026, 1, 5).timestamp(), days=2, timeline=timeline).run()
+        report = simulation.to_dict()
+        # 每天2个09:00、48次心跳，第一天还有一次周报；从零点开始的心跳也算在窗口内
+        self.assertEqual(report['fires'], 101)
+        self.assertEqual(report['daily'], {'2026-01-05': 51, '2026-01-06': 50})
+        # 早报和晨会每天同一秒发往同一个目标
+        self.assertEqual(report['collisions']['count'], 2)
+        self.assertEqual(report['collisions']['worst'][0]['endpoint'], 'http:example.com')
+        self.assertEqual(sorted(report['collisions']['worst'][0]['names']), ['早报', '晨会'])
+        self.assertEqual(report['never_fired'], {'count': 1, 'names': ['年会']})
+        self.assertEqual((report['late']['count'], report['dropped']['count'], report['misfired']), (0, 0, 0))
+        self.assertEqual(report['channels']['http']['fires'], 101)
+        rows = list(csv.reader(io.StringIO(timeline.getvalue())))
+        self.assertEqual(len(rows), 102)
+        self.assertEqual(rows[1][:2], ['2026-01-05 00:00:00', '心跳'])
+
+    def test_queue_wait(self):
+        # 3个SMTP并发、每封1秒：同一秒触发的8封邮件最后一封要等2秒
+        smtp = {'type': 'smtp', 'smtp': {'server': 'smtp.example.com', 'user': 'me@example.com'}}
+        tasks = [{'id': str(i), 'name': str(i), 'time': '09:00', 'push': smtp} for i in range(8)]
+        simulation = Simulation(tasks, start=datetime(2026, 1, 5).timestamp(), days=1,
+                                dispatch_limits={'smtp': 3}).run()
+        stats = simulation.to_dict()['channels']['smtp']
+        self.assertEqual(stats['fires'], 8)
+        self.assertEqual(stats['max_wait'], 2.0)
+
+    def test_virtual_clock_only_moves_forward(self):
+        clock = VirtualClock(100)
+        clock.set(50)
+        self.assertEqual(clock.time(), 100)
+        clock.set(150)
+        self.assertEqual((clock.time(), clock.monotonic()), (150, 150))
+
+
+if __name__ == '__main__':
+    unittest.main()
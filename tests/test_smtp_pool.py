@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""用假的smtplib.SMTP检查连接池复用已登录的连接，出错的连接不再放回连接池"""
+
+import smtplib
+import unittest
+from email.message import EmailMessage
+from unittest import mock
+
+from timer_core.smtp_pool import SMTPPool
+
+
+class FakeSMTP:
+    """记录收到的邮件；fail 里放着下一次 send_message 要抛出的异常"""
+
+    instances = []
+
+    def __init__(self, server, port, timeout=None):
+        self.sock = None
+        self.sent = []
+        self.fail = None
+        self.alive = True
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected('gone')
+        return 250, b'OK'
+
+    def send_message(self, msg):
+        error, self.fail = self.fail, None
+        if error is not None:
+            raise error
+        self.sent.append(msg['Subject'])
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+def message(subject):
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    return msg
+
+
+class SMTPPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        FakeSMTP.instances = []
+        patcher = mock.patch('smtplib.SMTP', FakeSMTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = SMTPPool()
+        self.addCleanup(self.pool.close)
+
+    def send(self, subject):
+        self.pool.send('smtp.example.com', 'me@example.com', 'pw', message(subject))
+
+    def test_connection_is_reused(self):
+        self.send('1')
+        self.send('2')
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertEqual(FakeSMTP.instances[0].sent, ['1', '2'])
+        self.assertEqual((self.pool.connects, self.pool.reuses), (1, 1))
+
+    def test_accounts_use_separate_connections(self):
+        self.send('1')
+        self.pool.send('smtp.example.com', 'other@example.com', 'pw', message('2'))
+        self.assertEqual(len(FakeSMTP.instances), 2)
+
+    def test_failed_connection_is_evicted(self):
+        self.send('1')
+        first = FakeSMTP.instances[0]
+        first.fail = smtplib.SMTPDataError(554, b'rejected')
+        with self.assertRaises(smtplib.SMTPDataError):
+            self.send('2')
+        self.assertTrue(first.closed)
+        self.send('3')
+        self.assertEqual(len(FakeSMTP.instances), 2)
+        self.assertEqual(FakeSMTP.instances[1].sent, ['3'])
+
+    def test_disconnect_retries_on_new_connection(self):
+        self.send('1')
+        first = FakeSMTP.instances[0]
+        first.fail = smtplib.SMTPServerDisconnected('closed by server')
+        self.send('2')
+        self.assertTrue(first.closed)
+        self.assertEqual(FakeSMTP.instances[1].sent, ['2'])
+
+    def test_dead_idle_connection_is_replaced(self):
+        self.send('1')
+        first = FakeSMTP.instances[0]
+        first.alive = False
+        self.send('2')
+        self.assertTrue(first.closed)
+        self.assertEqual(first.sent, ['1'])
+        self.assertEqual((self.pool.connects, self.pool.reuses), (2, 0))
+
+    def test_close_idle(self):
+        self.send('1')
+        self.assertEqual(self.pool.close_idle(0), 1)
+        self.assertTrue(FakeSMTP.instances[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
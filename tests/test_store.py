@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""清理执行记录后触发次数和最近一次触发时间保持不变，写入失败的推送结果不会丢"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from timer_core.store import TaskStore
+
+
+class RunRetentionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tasks.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_prune_keeps_counts_and_last_fire(self):
+        store = TaskStore(self.path, run_retention=None)
+        store.claim_runs([('a', 100.0), ('a', 200.0), ('b', 150.0)])
+        self.assertEqual(store.prune_runs(300.0), 3)
+        store.claim_runs([('a', 400.0)])
+        self.assertEqual(store.prune_runs(180.0), 0)
+        self.assertEqual(store.run_counts(), {'a': 3, 'b': 1})
+        self.assertEqual(store.last_runs(), {'a': 400.0, 'b': 150.0})
+        self.assertEqual(store.prune_runs(500.0), 1)
+        self.assertEqual(store.run_counts(), {'a': 3, 'b': 1})
+        self.assertEqual(store.last_runs(), {'a': 400.0, 'b': 150.0})
+        store.close()
+
+    def test_flush_thread_prunes_old_runs(self):
+        store = TaskStore(self.path, flush_interval=0.02, run_retention=3600, prune_interval=0)
+        now = time.time()
+        store.claim_runs([('a', now - 7200), ('a', now)])
+        deadline = time.monotonic() + 2
+        while store.run_status('a', now - 7200) is not None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertIsNone(store.run_status('a', now - 7200))
+        self.assertEqual(store.run_status('a', now), 'claimed')
+        self.assertEqual(store.run_counts(), {'a': 2})
+        store.close()
+
+    def test_failed_flush_keeps_results(self):
+        store = TaskStore(self.path, run_retention=None)
+        store.claim_runs([('a', 100.0), ('a', 200.0)])
+        store.record_result('a', 100.0, True)
+        store.record_result('a', 200.0, False)
+        write = store._transaction
+        with mock.patch.object(store, '_transaction', side_effect=sqlite3.OperationalError('database is locked')):
+            with self.assertRaises(sqlite3.OperationalError):
+                store.flush()
+        store._transaction = write
+        store.flush()
+        self.assertEqual(store.run_status('a', 100.0), 'ok')
+        self.assertEqual(store.run_status('a', 200.0), 'failed')
+        store.close()
+
+    def test_flush_thread_logs_errors(self):
+        logged = []
+        store = TaskStore(self.path, flush_interval=0.02, run_retention=None, log=logged.append)
+        store.claim_runs([('a', 100.0)])
+        store.record_result('a', 100.0, True)
+        with mock.patch.object(store, '_transaction', side_effect=sqlite3.OperationalError('database is locked')):
+            deadline = time.monotonic() + 2
+            while not logged and time.monotonic() < deadline:
+                time.sleep(0.02)
+        self.assertIn('database is locked', logged[0])
+        store.close()
+        store = TaskStore(self.path, run_retention=None)
+        self.assertEqual(store.run_status('a', 100.0), 'ok')
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""导入运行命令的任务需要调用方明确允许，同一文件里id相同的行报告为错误"""
+
+import json
+import unittest
+
+from timer_core.engine import TimerEngine
+from timer_core.taskio import import_tasks, iter_jsonl
+
+LINES = [
+    json.dumps({'id': 'push', 'name': '提醒', 'time': '09:00'}, ensure_ascii=False),
+    json.dumps({'id': 'cmd', 'name': '备份', 'time': '02:00', 'command': 'backup.bat'}, ensure_ascii=False),
+    json.dumps({'id': 'call', 'name': '报表', 'time': '03:00', 'callable': 'report:main'}, ensure_ascii=False),
+]
+
+
+class ImportCommandTest(unittest.TestCase):
+
+    def test_command_tasks_rejected_by_default(self):
+        engine = TimerEngine()
+        result = import_tasks(engine, iter_jsonl(LINES))
+        engine.shutdown()
+        self.assertEqual(result.imported, 1)
+        self.assertEqual([line_no for line_no, _ in result.errors], [2, 3])
+        self.assertEqual(list(engine.tasks), ['push'])
+
+    def test_command_tasks_allowed(self):
+        engine = TimerEngine()
+        result = import_tasks(engine, iter_jsonl(LINES), allow_commands=True)
+        engine.shutdown()
+        self.assertEqual(result.imported, 3)
+        self.assertEqual(result.failed, 0)
+
+    def test_duplicate_rows_reported(self):
+        rows = [json.dumps({'name': '提醒', 'time': '09:00', 'push': {'type': 'smtp', 'smtp': {'to': to}}},
+                           ensure_ascii=False) for to in ('a@example.com', 'b@example.com')]
+        engine = TimerEngine()
+        result = import_tasks(engine, iter_jsonl(rows))
+        engine.shutdown()
+        self.assertEqual(result.imported, 1)
+        self.assertEqual([line_no for line_no, _ in result.errors], [2])
+        self.assertEqual(len(engine.tasks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
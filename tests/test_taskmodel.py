@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Task 和dict互相转换不丢字段，重复方式按编码保存，相同的推送配置只保留一份"""
+
+import json
+import unittest
+
+from timer_core import taskmodel
+from timer_core.recurrence import REPEAT_CRON, REPEAT_DAILY, REPEAT_MODES
+from timer_core.taskmodel import REPEAT_CODES, Task, shared_push
+
+PUSH = {'type': 'http', 'http': {'url': 'https://example.com/hook', 'method': 'POST', 'headers': '', 'body': ''}}
+
+
+def sample(**fields):
+    task = {'id': 't1', 'name': '早报', 'time': '08:00', 'repeat': REPEAT_DAILY, 'date': '2026-01-05',
+            'misfire': 'all', 'grace': 30.0, 'created': 1767571200, 'push': json.loads(json.dumps(PUSH)),
+            'command': 'backup.bat', 'timeout': 600}
+    task.update(fields)
+    return task
+
+
+class TaskTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = sample()
+        task = Task.from_mapping(data)
+        self.assertEqual(dict(task), data)
+        self.assertEqual(task, data)
+        self.assertEqual(Task.from_mapping(dict(task)), task)
+        self.assertEqual(json.loads(json.dumps(dict(task))), data)
+        # 固定字段在前，其他字段保留原来的顺序
+        self.assertEqual(list(task), ['id', 'name', 'time', 'repeat', 'date', 'misfire', 'grace', 'created',
+                                      'push', 'command', 'timeout'])
+
+    def test_from_mapping_keeps_task(self):
+        task = Task(sample())
+        self.assertIs(Task.from_mapping(task), task)
+
+    def test_missing_fields(self):
+        task = Task(id='t1', name='早报', time='08:00')
+        self.assertNotIn('repeat', task)
+        self.assertNotIn('command', task)
+        self.assertIsNone(task.get('push'))
+        self.assertEqual(task.get('command', 'x'), 'x')
+        with self.assertRaises(KeyError):
+            task['date']
+        self.assertEqual(dict(task), {'id': 't1', 'name': '早报', 'time': '08:00'})
+
+    def test_repeat_codes(self):
+        for mode in REPEAT_MODES:
+            with self.subTest(mode=mode):
+                task = Task(sample(repeat=mode))
+                self.assertEqual(task.code, REPEAT_CODES[mode])
+                self.assertEqual(task['repeat'], mode)
+        task = Task(sample())
+        task['repeat'] = REPEAT_CRON
+        self.assertEqual(task['repeat'], REPEAT_CRON)
+        with self.assertRaises(ValueError):
+            Task(sample(repeat='每年'))
+
+    def test_created_is_whole_seconds(self):
+        self.assertEqual(Task(sample(created=1767571200.75))['created'], 1767571200)
+
+    def test_push_is_shared(self):
+        first, second = Task(sample()), Task(sample(id='t2'))
+        self.assertIs(first['push'], second['push'])
+        other = Task(sample(id='t3', push=dict(PUSH, type='smtp')))
+        self.assertIsNot(other['push'], first['push'])
+        # 键的顺序不同也算相同的配置
+        reordered = dict(reversed(list(PUSH.items())))
+        self.assertIs(shared_push(reordered), first['push'])
+
+    def test_push_cache_is_bounded(self):
+        taskmodel._pushes.clear()
+        for i in range(taskmodel.PUSH_CACHE_SIZE + 10):
+            shared_push({'type': 'http', 'n': i})
+        self.assertLessEqual(len(taskmodel._pushes), taskmodel.PUSH_CACHE_SIZE)
+        self.assertEqual(shared_push({}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
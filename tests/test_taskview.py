@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""分块有序列表在分块拆分、删空之后的顺序和位置"""
+
+import random
+import unittest
+from unittest import mock
+
+from timer_core import taskview
+from timer_core.taskview import SortedKeys
+
+
+class SortedKeysTest(unittest.TestCase):
+
+    def setUp(self):
+        # 用很小的分块，少量key就能跨越多个分块
+        patcher = mock.patch.object(taskview, 'CHUNK_SIZE', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, keys, expected):
+        expected = sorted(expected)
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(keys.slice(0, len(expected) + 1), expected)
+        for position, key in enumerate(expected):
+            self.assertEqual(keys.index(key), position)
+        self.assertEqual(keys.first(), expected[0] if expected else None)
+
+    def test_initial_chunks(self):
+        keys = SortedKeys(range(10, 0, -1))
+        self.assertEqual([len(chunk) for chunk in keys._chunks], [4, 4, 2])
+        self.check(keys, range(1, 11))
+        self.assertEqual(keys.slice(3, 3), [4, 5, 6])
+
+    def test_split_when_chunk_overflows(self):
+        keys = SortedKeys(range(0, 40, 10))
+        for key in range(1, 6):
+            keys.add(key)
+        # 超过 2*CHUNK_SIZE 时拆成两半
+        self.assertEqual([len(chunk) for chunk in keys._chunks], [4, 5])
+        self.assertEqual(keys._maxes, [chunk[-1] for chunk in keys._chunks])
+        self.check(keys, [0, 10, 20, 30, 1, 2, 3, 4, 5])
+
+    def test_emptied_chunk_is_removed(self):
+        keys = SortedKeys(range(12))
+        for key in (4, 5, 6, 7):
+            self.assertTrue(keys.discard(key))
+        self.assertEqual(len(keys._chunks), 2)
+        self.assertFalse(keys.discard(5))
+        self.assertIsNone(keys.index(5))
+        self.check(keys, [0, 1, 2, 3, 8, 9, 10, 11])
+
+    def test_delete_and_reinsert(self):
+        keys = SortedKeys(range(12))
+        self.assertTrue(keys.discard(11))
+        keys.add(11)
+        self.assertTrue(keys.discard(0))
+        keys.add(0)
+        self.check(keys, range(12))
+        for key in range(12):
+            keys.discard(key)
+        self.check(keys, [])
+        keys.add(7)
+        self.check(keys, [7])
+
+    def test_random_operations(self):
+        rng = random.Random(1)
+        keys, expected = SortedKeys(), set()
+        for _ in range(2000):
+            key = (rng.randrange(50), f'task-{rng.randrange(10)}')
+            if key in expected and rng.random() < 0.5:
+                self.assertTrue(keys.discard(key))
+                expected.discard(key)
+            elif key not in expected:
+                keys.add(key)
+                expected.add(key)
+        self.check(keys, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""多层时间轮和按到期时间排序的参照实现对比"""
+
+import math
+import random
+import unittest
+
+from timer_core.timewheel import REWIND_THRESHOLD, HierarchicalWheel
+
+
+def _expiry(fire_ts):
+    # 和时间轮一样按毫秒向上取整
+    return math.ceil(fire_ts * 1000)
+
+
+class HierarchicalWheelTest(unittest.TestCase):
+
+    def check_random(self, seed):
+        rnd = random.Random(seed)
+        now = 1.7e9 + rnd.random() * 1000
+        wheel = HierarchicalWheel(now)
+        processed = int(now * 1000)
+        pending = {}   # 元素 -> 毫秒到期时间
+        for item in range(400):
+            if rnd.random() < 0.6:
+                fire_ts = now + rnd.choice([rnd.random() * 0.3, rnd.random() * 70, rnd.random() * 1e5,
+                                            rnd.random() * 1e8, -rnd.random()])
+                wheel.add(fire_ts, item)
+                pending[item] = _expiry(fire_ts)
+            next_time = wheel.next_time()
+            if pending:
+                # 醒来的时间不能晚于最早到期的元素（放入时已经到期的元素在当前时间醒来）
+                self.assertIsNotNone(next_time)
+                self.assertLessEqual(int(next_time * 1000), max(min(pending.values()), processed))
+            else:
+                self.assertIsNone(next_time)
+            if rnd.random() < 0.4:
+                if next_time is not None and rnd.random() < 0.6:
+                    now = max(now, next_time)
+                else:
+                    now += rnd.random() * rnd.choice([1, 100, 1e6])
+                target = processed = int(now * 1000)
+                due = wheel.advance(now)
+                expected = sorted((expiry, item) for item, expiry in pending.items() if expiry <= target)
+                self.assertEqual(sorted(due), sorted(item for _, item in expected))
+                self.assertEqual([pending[item] for item in due], [expiry for expiry, _ in expected])
+                for item in due:
+                    del pending[item]
+            self.assertEqual(len(wheel), len(pending))
+
+    def test_matches_sorted_reference(self):
+        for seed in range(100):
+            with self.subTest(seed=seed):
+                self.check_random(seed)
+
+    def test_compact_keeps_live_items(self):
+        wheel = HierarchicalWheel(1000.0)
+        for i in range(300):
+            wheel.add(1000.0 + i * 7.5, i)
+        wheel.compact(lambda item: item % 3 == 0)
+        self.assertEqual(len(wheel), 100)
+        self.assertEqual(wheel.advance(1000.0 + 300 * 7.5), list(range(0, 300, 3)))
+        self.assertIsNone(wheel.next_time())
+
+    def test_clock_rewind_does_not_fire_early(self):
+        wheel = HierarchicalWheel(10000.0)
+        wheel.add(10005.0, 'a')
+        rewound = 10000.0 - (REWIND_THRESHOLD / 1000) * 3
+        self.assertEqual(wheel.advance(rewound), [])
+        self.assertEqual(wheel.advance(10004.9), [])
+        self.assertEqual(wheel.advance(10005.0), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+定时推送核心模块
+
+AsyncHTTPClient 和 AsyncRunner 在第一次使用时才导入 async_http，导入本包不会加载asyncio。
+"""
+
+from .bulk_mail import BulkMessage, BulkResult, load_recipients, parse_recipients, send_bulk
+from .cluster import SHARD_COUNT, Cluster, shard_of
+from .coalesce import COALESCE_WINDOW, Coalescer
+from .commands import NOTIFY_MODES, CommandResult, CommandRunner, is_command_task
+from .config import load_config
+from .dispatch import Dispatcher
+from .engine import DEFAULT_PUSH_CONFIG, HTTP_BACKENDS, TimerEngine, merge_push_config, strip_password, task_push_config
+from .http_client import HTTPClient, RequestTemplate, compile_request
+from .logpipe import LogPipeline
+from .metrics import MetricsRegistry, MetricsServer, PipelineMetrics
+from .misfire import MISFIRE_POLICIES, misfire_policy
+from .ratelimit import DEFAULT_RATE_LIMITS, RateLimiter, TokenBucket
+from .recurrence import (
+    REPEAT_MODES, CronRule, DailyRule, IntervalRule, MonthlyRule, OnceRule, WeeklyRule,
+    next_fire_time, parse_rule, rule_for_task, upcoming,
+)
+from .retry import CircuitBreaker, Delivery, MemoryDeadLetters, Partial, RetryPolicy, RetryQueue
+from .scheduler import Scheduler
+from .simulate import SERVICE_TIMES, Simulation, VirtualClock, push_route
+from .smtp_pool import SMTPPool
+from .store import TaskStore
+from .taskio import ImportResult, export_file, import_file, import_tasks
+from .taskmodel import REPEAT_CODES, Task
+from .taskview import TaskView
+from .templates import PLACEHOLDERS, Template, compile_template, render_context
+from .timewheel import HierarchicalWheel, TimingWheel
+
+__all__ = [
+    'AsyncHTTPClient', 'AsyncRunner',
+    'BulkMessage', 'BulkResult', 'load_recipients', 'parse_recipients', 'send_bulk',
+    'SHARD_COUNT', 'Cluster', 'shard_of',
+    'COALESCE_WINDOW', 'Coalescer',
+    'NOTIFY_MODES', 'CommandResult', 'CommandRunner', 'is_command_task',
+    'load_config',
+    'Dispatcher',
+    'DEFAULT_PUSH_CONFIG', 'HTTP_BACKENDS', 'TimerEngine', 'merge_push_config', 'strip_password', 'task_push_config',
+    'HTTPClient', 'RequestTemplate', 'compile_request',
+    'LogPipeline',
+    'MetricsRegistry', 'MetricsServer', 'PipelineMetrics',
+    'MISFIRE_POLICIES', 'misfire_policy',
+    'DEFAULT_RATE_LIMITS', 'RateLimiter', 'TokenBucket',
+    'REPEAT_MODES', 'CronRule', 'DailyRule', 'IntervalRule', 'MonthlyRule', 'OnceRule', 'WeeklyRule',
+    'next_fire_time', 'parse_rule', 'rule_for_task', 'upcoming',
+    'CircuitBreaker', 'Delivery', 'MemoryDeadLetters', 'Partial', 'RetryPolicy', 'RetryQueue',
+    'Scheduler',
+    'SERVICE_TIMES', 'Simulation', 'VirtualClock', 'push_route',
+    'SMTPPool',
+    'TaskStore',
+    'ImportResult', 'export_file', 'import_file', 'import_tasks',
+    'REPEAT_CODES', 'Task',
+    'TaskView',
+    'PLACEHOLDERS', 'Template', 'compile_template', 'render_context',
+    'HierarchicalWheel', 'TimingWheel',
+]
+
+
+def __getattr__(name):
+    if name in ('AsyncHTTPClient', 'AsyncRunner'):
+        from . import async_http
+        return getattr(async_http, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
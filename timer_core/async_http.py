@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+异步HTTP推送
+
+大量Webhook推送时，线程池里每个请求都要占住一个线程等待响应。这里用一个线程
+运行asyncio事件循环，推送作为协程提交进来，同时在途的请求可以有几千个。
+HTTP客户端基于asyncio的流实现（HTTP/1.1，支持keep-alive和https），不需要额外依赖，
+总连接数和每个主机的连接数都有上限，超出的请求排队等待空闲连接。
+引擎只在 http_backend='async' 时才导入这个模块，不使用异步发送时不会加载asyncio和ssl。
+"""
+
+import asyncio
+import json
+import ssl
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+# 同时打开的连接总数和每个主机的连接数上限
+CONNECTION_LIMIT = 1000
+PER_HOST_LIMIT = 100
+# 最多排队和在途的推送数，超过时 submit 返回False
+MAX_PENDING = 20000
+# 空闲连接保留时间（秒）
+IDLE_TIMEOUT = 30
+USER_AGENT = 'Timing-Assistant'
+
+
+class HTTPResponse:
+    """异步请求的响应"""
+
+    __slots__ = ('status_code', 'headers', 'content')
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class _StaleConnection(Exception):
+    """复用的空闲连接已被服务器关闭，还没有收到任何响应"""
+
+
+class AsyncHTTPClient:
+    """在事件循环里使用的HTTP客户端，按(协议, 主机, 端口)复用连接"""
+
+    def __init__(self, limit=CONNECTION_LIMIT, per_host=PER_HOST_LIMIT, idle_timeout=IDLE_TIMEOUT):
+        self.limit = limit
+        self.per_host = per_host
+        self.idle_timeout = idle_timeout
+        self._total = None
+        self._hosts = {}    # key -> Semaphore
+        self._idle = {}     # key -> [(reader, writer, last_used)]
+        self._ssl = None
+        self.connects = 0
+        self.reuses = 0
+
+    def _semaphores(self, key):
+        if self._total is None:
+            self._total = asyncio.Semaphore(self.limit)
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = asyncio.Semaphore(self.per_host)
+        return self._total, host
+
+    async def _open(self, key):
+        scheme, host, port = key
+        if scheme == 'https' and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self._ssl if scheme == 'https' else None)
+        self.connects += 1
+        return reader, writer
+
+    def _take_idle(self, key):
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if now - last_used < self.idle_timeout and not reader.at_eof() and not writer.is_closing():
+                self.reuses += 1
+                return reader, writer
+            writer.close()
+        return None
+
+    async def request(self, template, timeout=None):
+        """按 RequestTemplate 发送请求，返回 HTTPResponse"""
+        parts = urlsplit(template.url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        payload = _encode_request(template, parts)
+        total, host = self._semaphores(key)
+        async with total, host:
+            return await asyncio.wait_for(self._exchange(key, payload), timeout)
+
+    async def _exchange(self, key, payload):
+        conn = self._take_idle(key)
+        if conn is not None:
+            try:
+                return await self._roundtrip(key, conn, payload)
+            except _StaleConnection:
+                pass
+        return await self._roundtrip(key, await self._open(key), payload, fresh=True)
+
+    async def _roundtrip(self, key, conn, payload, fresh=False):
+        reader, writer = conn
+        try:
+            writer.write(payload)
+            await writer.drain()
+            try:
+                status_line = await reader.readline()
+            except ConnectionError:
+                status_line = b''
+            if not status_line:
+                if fresh:
+                    raise ConnectionError('服务器关闭了连接')
+                raise _StaleConnection()
+            response, keep_alive = await _read_response(status_line, reader)
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._idle.setdefault(key, []).append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        return response
+
+    def close(self):
+        for idle in self._idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self._idle.clear()
+
+
+def _encode_request(template, parts):
+    path = parts.path or '/'
+    query = parts.query
+    headers = {'Host': parts.netloc, 'User-Agent': USER_AGENT, 'Accept': '*/*', 'Connection': 'keep-alive'}
+    headers.update(template.headers)
+    body = b''
+    if template.method == 'GET':
+        if template.body:
+            query = '&'.join(filter(None, [query, urlencode(template.body, doseq=True)]))
+    else:
+        body = json.dumps(template.body).encode('utf-8')
+        if not any(name.lower() == 'content-type' for name in headers):
+            headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+    target = path + ('?' + query if query else '')
+    lines = [f'{template.method} {target} HTTP/1.1']
+    lines.extend(f'{name}: {value}' for name, value in headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8') + body
+
+
+async def _read_response(status_line, reader):
+    """读取状态行之后的响应头和响应体，返回(响应, 连接能否复用)"""
+    version, status = status_line.decode('latin-1').split(None, 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    status = int(status)
+    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    if status in (204, 304) or 100 <= status < 200:
+        content = b''
+    elif 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                # 跳过可能存在的尾部字段
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        content = b''.join(chunks)
+    elif 'content-length' in headers:
+        content = await reader.readexactly(int(headers['content-length']))
+    else:
+        content = await reader.read()
+        keep_alive = False
+    return HTTPResponse(status, headers, content), keep_alive
+
+
+class AsyncRunner:
+    """在单独线程里运行事件循环，其他线程通过 submit(协程) 提交任务"""
+
+    def __init__(self, max_pending=MAX_PENDING, on_error=None):
+        self.max_pending = max_pending
+        self.on_error = on_error
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._idle = threading.Condition(self._lock)
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name='async-http', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def submit(self, coro):
+        """提交一个协程，排队数已满时关闭协程并返回False"""
+        self.start()
+        with self._lock:
+            if self.pending >= self.max_pending:
+                coro.close()
+                return False
+            self.pending += 1
+        asyncio.run_coroutine_threadsafe(self._wrap(coro), self._loop)
+        return True
+
+    async def _wrap(self, coro):
+        try:
+            await coro
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error('http', e)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                if not self.pending:
+                    self._idle.notify_all()
+
+    def call(self, func, *args):
+        """在事件循环线程里执行func(*args)并等待结果"""
+        if self._loop is None:
+            return func(*args)
+
+        async def _call():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(_call(), self._loop).result()
+
+    def wait_idle(self, timeout=None):
+        """等待所有提交的协程执行完，超时返回False"""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self.pending, timeout)
+
+    def stop(self, timeout=None):
+        """等待在途的请求完成（最多timeout秒）后停止事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        self.wait_idle(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+        with self._lock:
+            self._loop = self._thread = None
+        loop.close()
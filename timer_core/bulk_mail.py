@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+批量邮件
+
+邮件正文只构建和序列化一次，每个收件人只替换To头，按批次在同一个已登录
+会话里连续发送，并返回每个收件人的发送结果。传入 throttle 时每批发送前按本批的
+收件人数等待限速令牌，大批量邮件按服务商能接受的速率分批发出。
+"""
+
+import re
+import time
+
+# 每个会话发送的邮件数，发完一批重新登录，避免超过服务器单会话上限
+BATCH_SIZE = 50
+
+_SPLIT_RE = re.compile(r'[\s,;，；]+')
+
+
+def parse_recipients(text):
+    """把逗号、分号或换行分隔的收件人拆成列表，以@开头表示从文件读取"""
+    text = text.strip()
+    if text.startswith('@'):
+        return list(load_recipients(text[1:]))
+    return [addr for addr in _SPLIT_RE.split(text) if addr]
+
+
+def load_recipients(path):
+    """逐行读取收件人文件，忽略空行和#注释"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            addr = line.split('#', 1)[0].strip()
+            if addr:
+                yield addr
+
+
+class BulkMessage:
+    """只序列化一次的邮件，按收件人拼接To头"""
+
+    def __init__(self, sender, subject, content):
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        msg = MIMEMultipart()
+        msg['From'] = sender
+        msg['Subject'] = subject
+        msg.attach(MIMEText(content, 'plain', 'utf-8'))
+        self.sender = sender
+        self._body = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+    def for_recipient(self, recipient):
+        return b'To: ' + recipient.encode('utf-8') + b'\r\n' + self._body
+
+
+class BulkResult:
+    """批量发送结果：results 为 [(收件人, 是否成功, 错误信息)]"""
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, recipient, ok, error=None):
+        self.results.append((recipient, ok, error))
+
+    @property
+    def succeeded(self):
+        return sum(1 for _, ok, _ in self.results if ok)
+
+    @property
+    def failed(self):
+        return [(recipient, error) for recipient, ok, error in self.results if not ok]
+
+
+def send_bulk(pool, server, user, password, recipients, subject, content,
+              batch_size=BATCH_SIZE, timeout=None, throttle=None):
+    """通过连接池批量发送同一封邮件，返回 BulkResult
+
+    会话中途断开时，本批剩下的收件人换新会话重试一次；其他错误（连接失败、超时）
+    只把还没有结果的收件人记为失败，已经发出的不会被重复发送。
+    throttle(本批人数) 在每批发送前调用，等到可以发送时返回True，返回False时不再发送剩下的收件人。
+    """
+    message = BulkMessage(user, subject, content)
+    result = BulkResult()
+    recipients = list(recipients)
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        if throttle is not None and not throttle(len(batch)):
+            for recipient in recipients[start:]:
+                result.add(recipient, False, '定时器已停止')
+            break
+        for attempt in range(2):
+            batch, error, retry = _send_batch(pool, server, user, password, message, batch, result, timeout)
+            if not batch or not retry:
+                break
+        for recipient in batch:
+            result.add(recipient, False, error)
+    return result
+
+
+def _send_batch(pool, server, user, password, message, batch, result, timeout):
+    """在一个会话里发送一批，返回(还没有结果的收件人, 错误信息, 是否换新会话重试)"""
+    import smtplib
+
+    remaining = batch
+    try:
+        with pool.connection(server, user, password, timeout, reuse=False) as conn:
+            for i, recipient in enumerate(batch):
+                remaining = batch[i:]
+                started = time.monotonic()
+                try:
+                    refused = conn.sendmail(message.sender, [recipient], message.for_recipient(recipient))
+                    pool.observe('send', server, started)
+                except smtplib.SMTPServerDisconnected:
+                    return remaining, '连接已断开', True
+                except smtplib.SMTPException as e:
+                    result.add(recipient, False, str(e))
+                    continue
+                if refused:
+                    result.add(recipient, False, str(refused.get(recipient)))
+                else:
+                    result.add(recipient, True)
+            remaining = []
+    except Exception as e:
+        return remaining, str(e), False
+    return [], None, False
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+命令行入口
+
+    python -m timer_core run -c config.json        无界面运行定时推送
+    python -m timer_core upcoming -c config.json   列出未来的触发计划
+    python -m timer_core dead-letters -c config.json [--replay]   查看或重放死信
+    python -m timer_core import -c config.json tasks.jsonl         批量导入任务（.jsonl/.csv）
+    python -m timer_core export -c config.json tasks.csv           导出任务库里的全部任务
+    python -m timer_core simulate -c config.json --days 30         用虚拟时钟模拟运行，检查拥挤和错过的任务
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from .cluster import LEASE_TTL, SHARD_COUNT, Cluster
+from .config import load_config
+from .engine import TimerEngine
+from .logpipe import LogPipeline
+from .metrics import METRICS_HOST
+from .recurrence import rule_for_task, upcoming
+from .simulate import REPORT_TOP, SERVICE_TIMES, SIMULATE_DAYS, Simulation
+from .store import TaskStore
+from .taskio import FORMATS, detect_format, export_file, import_file
+
+# 主线程把日志输出到终端的间隔（秒）
+ECHO_INTERVAL = 0.2
+
+
+def _load(path):
+    try:
+        return load_config(path)
+    except (OSError, ValueError) as e:
+        sys.exit(f'❌ 读取配置失败: {e}')
+
+
+def _echo(log):
+    for line in log.drain():
+        print(line, flush=True)
+
+
+def cmd_run(args):
+    config = _load(args.config)
+    log_file = args.log_file or config.get('log_file')
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    log = LogPipeline(log_file)
+    store = None
+    if config.get('store'):
+        os.makedirs(os.path.dirname(config['store']), exist_ok=True)
+        store = TaskStore(config['store'])
+    cluster = None
+    options = config.get('cluster') or args.node_id
+    if options:
+        if store is None:
+            sys.exit('❌ 多实例运行需要在配置中设置共用的store')
+        options = options if isinstance(options, dict) else {}
+        cluster = Cluster(config['store'], node_id=args.node_id or options.get('node_id'),
+                          shards=options.get('shards', SHARD_COUNT), ttl=options.get('lease_ttl', LEASE_TTL),
+                          log=log.write)
+        log.write(f'🤝 多实例运行，实例id: {cluster.node_id}')
+    engine = TimerEngine(config['push'], log=log, dispatch_limits=config['dispatch'], store=store,
+                         rate_limits=config.get('rate_limits'), http_backend=config['http_backend'],
+                         coalesce_window=config['coalesce_window'], cluster=cluster)
+    engine.load_tasks()
+    _, errors, removed = engine.sync_config_tasks(config['tasks'])
+    for task, e in errors:
+        log.write(f'❌ 任务配置错误: {task.get("name")} - {e}')
+    if removed:
+        log.write(f'🗑️ 已删除配置里不再有的 {len(removed)} 个任务')
+    log.write(f'✅ 已加载 {len(engine.tasks)} 个任务')
+    metrics = config.get('metrics') or {}
+    metrics_port = args.metrics_port or metrics.get('port')
+    if metrics_port:
+        try:
+            engine.serve_metrics(metrics.get('host', METRICS_HOST), metrics_port)
+        except OSError as e:
+            log.write(f'❌ 运行指标端口监听失败: {e}')
+
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+    engine.start()
+    try:
+        while not stopped.wait(ECHO_INTERVAL):
+            _echo(log)
+    finally:
+        engine.stop()
+        engine.shutdown()
+        _echo(log)
+        log.close()
+    return 0
+
+
+def cmd_upcoming(args):
+    config = _load(args.config)
+    tasks = []
+    for task in config['tasks']:
+        task = dict(task, repeat=task.get('repeat', '每天'))
+        try:
+            rule_for_task(task)
+        except (KeyError, ValueError) as e:
+            print(f'❌ 任务配置错误: {task.get("name")} - {e}', file=sys.stderr)
+            continue
+        tasks.append(task)
+    for ts, task in upcoming(tasks, args.hours):
+        print(f'{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M:%S}  {task["name"]}')
+    return 0
+
+
+def cmd_dead_letters(args):
+    config = _load(args.config)
+    if not config.get('store'):
+        sys.exit('❌ 配置中没有store，死信只保存在任务库里')
+    store = TaskStore(config['store'])
+    items = store.list_dead_letters()
+    for item in items:
+        print(f'#{item["id"]}  {datetime.fromtimestamp(item["created"]):%Y-%m-%d %H:%M}  '
+              f'{item["channel"]}  {item["payload"].get("task_name")}  {item["error"]}')
+    if not args.replay or not items:
+        store.close()
+        return 0
+    log = LogPipeline()
+    engine = TimerEngine(config['push'], log=log, dispatch_limits=config['dispatch'], store=store,
+                         rate_limits=config.get('rate_limits'), http_backend=config['http_backend'],
+                         coalesce_window=config['coalesce_window'])
+    engine.load_tasks()
+    engine.replay_dead_letters()
+    finished = engine.wait_idle(args.timeout)
+    engine.shutdown()
+    _echo(log)
+    if not finished:
+        store = TaskStore(config['store'])
+        left = len(store.list_dead_letters())
+        store.close()
+        print(f'⚠️ {args.timeout:g}秒内没有重放完（还在重试或限速排队），死信库里还有 {left} 条，可以稍后再重放')
+        return 1
+    return 0
+
+
+def _open_store(config):
+    if not config.get('store'):
+        sys.exit('❌ 配置中没有store，任务只能导入到任务库')
+    os.makedirs(os.path.dirname(config['store']), exist_ok=True)
+    return TaskStore(config['store'])
+
+
+def cmd_import(args):
+    config = _load(args.config)
+    store = _open_store(config)
+    engine = TimerEngine(config['push'], store=store)
+    engine.load_tasks()
+    started = time.perf_counter()
+    try:
+        result = import_file(engine, args.file, args.format, allow_commands=True)
+    except (OSError, ValueError) as e:
+        engine.shutdown()
+        sys.exit(f'❌ 导入失败: {e}')
+    engine.shutdown()
+    for line_no, error in result.errors:
+        print(f'❌ 第{line_no}行: {error}', file=sys.stderr)
+    if result.failed > len(result.errors):
+        print(f'... 另有 {result.failed - len(result.errors)} 行出错', file=sys.stderr)
+    print(f'✅ 导入 {result.imported} 个任务，失败 {result.failed} 行，用时 {time.perf_counter() - started:.1f}秒')
+    return 1 if result.failed else 0
+
+
+def cmd_export(args):
+    config = _load(args.config)
+    store = _open_store(config)
+    try:
+        count = export_file(store.iter_tasks(), args.file, args.format or detect_format(args.file))
+    except (OSError, ValueError) as e:
+        sys.exit(f'❌ 导出失败: {e}')
+    finally:
+        store.close()
+    print(f'✅ 已导出 {count} 个任务: {args.file}')
+    return 0
+
+
+def cmd_simulate(args):
+    config = _load(args.config)
+    # 只读取已有的任务库，模拟不会创建或修改任务库
+    store = TaskStore(config['store'], readonly=True) if config.get('store') and os.path.exists(config['store']) else None
+    engine = TimerEngine(config['push'], store=store)
+    engine.load_tasks()
+    # 和 run 一样以配置文件为准，任务库里配置已经没有的配置任务不参与模拟
+    for task_id in [task_id for task_id, task in engine.tasks.items() if task.get('source') == 'config']:
+        del engine.tasks[task_id]
+    for task in config['tasks']:
+        try:
+            task = engine.prepare_task(dict(task, source='config'))
+        except ValueError as e:
+            print(f'❌ 任务配置错误: {task.get("name")} - {e}', file=sys.stderr)
+            continue
+        engine.tasks[task['id']] = task
+    engine.shutdown()
+    try:
+        start = datetime.strptime(args.start, '%Y-%m-%d').timestamp() if args.start else None
+        timeline_format = detect_format(args.timeline) if args.timeline else None
+    except ValueError as e:
+        sys.exit(f'❌ {e}')
+    timeline = open(args.timeline, 'w', encoding='utf-8', newline='') if args.timeline else None
+    service_times = {'smtp': args.smtp_time, 'http': args.http_time, 'command': args.command_time}
+    try:
+        simulation = Simulation(engine.tasks.values(), engine.push_config, start, args.days,
+                                dispatch_limits=config['dispatch'], rate_limits=config.get('rate_limits'),
+                                http_backend=config['http_backend'], service_times=service_times,
+                                timeline=timeline, timeline_format=timeline_format, top=args.top).run()
+    finally:
+        if timeline is not None:
+            timeline.close()
+    for line in simulation.format():
+        print(line)
+    if args.timeline:
+        print(f'💾 触发时间线已保存: {args.timeline}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(simulation.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f'💾 模拟结果已保存: {args.json}')
+    # 有触发超过宽限期或被丢弃时返回1，方便在发布前自动检查
+    return 1 if simulation.late or simulation.dropped else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m timer_core', description='定时推送助手（命令行模式）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='无界面运行定时推送')
+    run.add_argument('-c', '--config', required=True, help='JSON配置文件')
+    run.add_argument('--log-file', help='日志文件，默认使用配置中的log_file')
+    run.add_argument('--metrics-port', type=int, help='在本地端口提供Prometheus格式的运行指标')
+    run.add_argument('--node-id', help='多实例运行时本实例的id（同时启用多实例协调）')
+    run.set_defaults(func=cmd_run)
+
+    plan = sub.add_parser('upcoming', help='列出未来的触发计划')
+    plan.add_argument('-c', '--config', required=True, help='JSON配置文件')
+    plan.add_argument('--hours', type=float, default=24, help='向后查看的小时数')
+    plan.set_defaults(func=cmd_upcoming)
+
+    dead = sub.add_parser('dead-letters', help='查看或重放重试用完仍失败的推送')
+    dead.add_argument('-c', '--config', required=True, help='JSON配置文件')
+    dead.add_argument('--replay', action='store_true', help='全部重新投递')
+    dead.add_argument('--timeout', type=float, default=60, help='重放时最多等待的秒数')
+    dead.set_defaults(func=cmd_dead_letters)
+
+    imp = sub.add_parser('import', help='从JSON Lines或CSV文件批量导入任务')
+    imp.add_argument('-c', '--config', required=True, help='JSON配置文件')
+    imp.add_argument('file', help='任务文件')
+    imp.add_argument('--format', choices=FORMATS, help='文件格式，默认按扩展名判断')
+    imp.set_defaults(func=cmd_import)
+
+    exp = sub.add_parser('export', help='把任务库里的任务导出为JSON Lines或CSV文件')
+    exp.add_argument('-c', '--config', required=True, help='JSON配置文件')
+    exp.add_argument('file', help='导出的文件')
+    exp.add_argument('--format', choices=FORMATS, help='文件格式，默认按扩展名判断')
+    exp.set_defaults(func=cmd_export)
+
+    sim = sub.add_parser('simulate', help='用虚拟时钟模拟运行一段时间，不发送推送')
+    sim.add_argument('-c', '--config', required=True, help='JSON配置文件')
+    sim.add_argument('--days', type=float, default=SIMULATE_DAYS, help='模拟的天数')
+    sim.add_argument('--start', help='开始日期 YYYY-MM-DD，默认从现在开始')
+    sim.add_argument('--timeline', help='把每次触发写到文件（.csv 或 .jsonl）')
+    sim.add_argument('--json', help='把模拟结果写到JSON文件')
+    sim.add_argument('--top', type=int, default=REPORT_TOP, help='每类问题最多列出的条数')
+    sim.add_argument('--smtp-time', type=float, default=SERVICE_TIMES['smtp'], help='每封邮件的发送秒数')
+    sim.add_argument('--http-time', type=float, default=SERVICE_TIMES['http'], help='每次HTTP推送的秒数')
+    sim.add_argument('--command-time', type=float, default=SERVICE_TIMES['command'], help='每个命令的运行秒数')
+    sim.set_defaults(func=cmd_simulate)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
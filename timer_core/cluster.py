@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+多实例协调
+
+多个实例共用同一个任务库（本机SQLite文件）时，任务按id哈希分成固定数量的分片，
+每个实例通过租约持有一部分分片，只执行自己分片里的任务：
+- 每个实例定时续约并登记心跳，按存活实例数平均分配分片，多出的分片主动释放
+- 实例退出时释放全部租约；实例崩溃时租约在 LEASE_TTL 秒后过期，由其他实例接管
+- 接管分片的实例从任务上次触发之后补算，交接期间错过的触发按错过策略处理
+租约只决定由谁执行，同一触发是否已经执行仍以任务库的 runs 表为准（最多执行一次）。
+"""
+
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+# 分片数：实例数远小于分片数时分配比较均匀
+SHARD_COUNT = 64
+# 租约有效期和续约间隔（秒），实例崩溃后最多约 LEASE_TTL + LEASE_RENEW 秒被接管
+LEASE_TTL = 6.0
+LEASE_RENEW = 2.0
+# 本地认为租约有效的时间比实际有效期提前这么多秒结束，避免和接管的实例重叠
+LEASE_MARGIN = 1.0
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS leases (
+    shard INTEGER PRIMARY KEY,
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    node TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+'''
+
+
+def default_node_id():
+    return f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+
+
+def shard_of(task_id, shards=SHARD_COUNT):
+    """任务所在的分片，各实例算出的结果相同"""
+    return zlib.crc32(str(task_id).encode('utf-8')) % shards
+
+
+class Cluster:
+    """分片租约：start() 后在后台线程里定时续约，owns(task_id) 判断任务是否归本实例执行
+
+    on_acquire(新增的分片) 在取得新分片后回调，on_release(分片) 在释放后回调，
+    on_change() 在任务库里的任务被（任意实例）修改后回调。
+    """
+
+    def __init__(self, path, node_id=None, shards=SHARD_COUNT, ttl=LEASE_TTL, renew=LEASE_RENEW, log=None):
+        if renew >= ttl - LEASE_MARGIN:
+            raise ValueError('续约间隔必须小于租约有效期')
+        self.path = path
+        self.node_id = node_id or default_node_id()
+        self.shards = shards
+        self.ttl = ttl
+        self.renew_interval = renew
+        self.log = log
+        self.owned = frozenset()
+        self.nodes = 0
+        self.on_acquire = self.on_release = self.on_change = None
+        self._valid_until = 0.0
+        self._version = None
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self.ttl)
+        conn.executescript(_SCHEMA)
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('INSERT OR IGNORE INTO leases (shard) VALUES (?)', ((i,) for i in range(self.shards)))
+        conn.execute('COMMIT')
+        return conn
+
+    def shard_of(self, task_id):
+        return shard_of(task_id, self.shards)
+
+    def owns(self, task_id):
+        """本实例当前是否持有任务所在分片的有效租约"""
+        return time.time() < self._valid_until and shard_of(task_id, self.shards) in self.owned
+
+    def start(self, on_acquire=None, on_release=None, on_change=None):
+        """先同步续约一次（取得分片后再开始调度），然后在后台线程里定时续约"""
+        if self._thread is not None:
+            return
+        self.on_acquire, self.on_release, self.on_change = on_acquire, on_release, on_change
+        self._conn = self._connect()
+        self._stop.clear()
+        self._tick()
+        self._thread = threading.Thread(target=self._run, name='cluster-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止续约并释放本实例的全部租约，其他实例可以立即接管"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute('UPDATE leases SET owner = NULL, expires = 0 WHERE owner = ?', (self.node_id,))
+            self._conn.execute('DELETE FROM nodes WHERE node = ?', (self.node_id,))
+            self._conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            self._log(f'❌ 释放租约失败: {e}')
+        self._conn.close()
+        self._conn = None
+        self.owned = frozenset()
+        self._valid_until = 0.0
+
+    def _run(self):
+        while not self._stop.wait(self.renew_interval):
+            self._tick()
+
+    def _tick(self):
+        try:
+            acquired, released = self.renew()
+        except sqlite3.Error as e:
+            self._log(f'❌ 续约失败: {e}')
+            return
+        if released:
+            self._log(f'🤝 释放 {len(released)} 个分片，共持有 {len(self.owned)}/{self.shards}（{self.nodes}个实例）')
+            if self.on_release is not None:
+                self.on_release(released)
+        if acquired:
+            self._log(f'🤝 取得 {len(acquired)} 个分片，共持有 {len(self.owned)}/{self.shards}（{self.nodes}个实例）')
+            if self.on_acquire is not None:
+                self.on_acquire(acquired)
+        version = self._tasks_version()
+        if self._version is not None and version != self._version and self.on_change is not None:
+            self.on_change()
+        self._version = version
+
+    def renew(self):
+        """续约、按存活实例数重新分配分片，返回(新取得的分片, 释放的分片)"""
+        started = time.time()
+        expires = started + self.ttl
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR REPLACE INTO nodes (node, heartbeat) VALUES (?, ?)', (self.node_id, started))
+            conn.execute('DELETE FROM nodes WHERE heartbeat < ?', (started - self.ttl,))
+            self.nodes = conn.execute('SELECT COUNT(*) FROM nodes').fetchone()[0]
+            target = math.ceil(self.shards / self.nodes)
+            conn.execute('UPDATE leases SET expires = ? WHERE owner = ?', (expires, self.node_id))
+            owned = [row[0] for row in conn.execute(
+                'SELECT shard FROM leases WHERE owner = ? ORDER BY shard', (self.node_id,))]
+            if len(owned) > target:
+                conn.executemany('UPDATE leases SET owner = NULL, expires = 0 WHERE shard = ?',
+                                 ((shard,) for shard in owned[target:]))
+                owned = owned[:target]
+            acquired = []
+            if len(owned) < target:
+                acquired = [row[0] for row in conn.execute(
+                    'SELECT shard FROM leases WHERE owner IS NULL OR expires < ? ORDER BY shard LIMIT ?',
+                    (started, target - len(owned)))]
+                conn.executemany('UPDATE leases SET owner = ?, expires = ? WHERE shard = ?',
+                                 ((self.node_id, expires, shard) for shard in acquired))
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        # 和上次比较：租约过期后被别的实例接管的分片也算释放
+        previous, self.owned = self.owned, frozenset(owned + acquired)
+        self._valid_until = expires - LEASE_MARGIN
+        return sorted(self.owned - previous), sorted(previous - self.owned)
+
+    def _tasks_version(self):
+        try:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'tasks_version'").fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else 0
+
+    def _log(self, message):
+        if self.log is not None:
+            self.log(message)
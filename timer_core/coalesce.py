@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+合并推送
+
+同一分钟触发的任务经常推送完全相同的内容（例如都用全局推送配置），逐个发送会
+产生N封一样的邮件或N次一样的Webhook调用。触发后的推送先在短暂的窗口里按
+“目标 + 渲染后的内容”分组，每组只发送一次；任务设置了 "digest": true 时，
+发往同一目标的不同内容合并成一条汇总推送。每个任务这次触发的结果仍然单独记录。
+"""
+
+import json
+import threading
+
+from .http_client import RequestTemplate
+from .retry import Delivery
+
+# 合并窗口（秒）：第一条推送到达后等这么久再发送整组
+COALESCE_WINDOW = 0.5
+# 汇总推送里各条内容之间的分隔
+DIGEST_SEPARATOR = '\n\n'
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def coalesce_key(delivery):
+    """分组键：内容完全相同的推送一组；digest任务按目标分组，GET请求不做汇总"""
+    if delivery.channel == 'smtp':
+        server, user, _, to, subject, content = delivery.args
+        if delivery.task.get('digest'):
+            return ('digest', 'smtp', server, user, to)
+        return ('same', 'smtp') + tuple(delivery.args)
+    template = delivery.args[0]
+    target = ('http', template.url, template.method, _dumps(template.headers))
+    if delivery.task.get('digest') and template.method != 'GET':
+        return ('digest',) + target
+    return ('same',) + target + (_dumps(template.body),)
+
+
+def merge_deliveries(deliveries):
+    """把一组推送合并成一个，合并后的推送记录组里每个任务的触发"""
+    first = deliveries[0]
+    runs = [run for delivery in deliveries for run in delivery.runs()]
+    if len(deliveries) == 1:
+        return first
+    args = first.args
+    if coalesce_key(first)[0] == 'digest':
+        if first.channel == 'smtp':
+            args = _merge_smtp(deliveries)
+        else:
+            args = (_merge_http(deliveries),)
+    merged = Delivery(first.task, first.fire_ts, first.channel, first.endpoint, first.send, args,
+                      limit_keys=first.limit_keys)
+    merged.group = runs
+    return merged
+
+
+def _unique(items):
+    seen = set()
+    return [item for item in items if not (item in seen or seen.add(item))]
+
+
+def _merge_smtp(deliveries):
+    server, user, password, to, subject, _ = deliveries[0].args
+    subjects = _unique(delivery.args[4] for delivery in deliveries)
+    contents = _unique(delivery.args[5] for delivery in deliveries)
+    if len(subjects) > 1:
+        subject = f'{subjects[0]} 等{len(contents)}条提醒'
+    return (server, user, password, to, subject, DIGEST_SEPARATOR.join(contents))
+
+
+def _merge_http(deliveries):
+    template = deliveries[0].args[0]
+    bodies = {}
+    for delivery in deliveries:
+        body = delivery.args[0].body
+        bodies.setdefault(_dumps(body), body)
+    return RequestTemplate(template.url, template.method, template.headers, {'digest': list(bodies.values())})
+
+
+class Coalescer:
+    """按分组键收集推送，窗口结束时由时间轮回调 flush(合并后的推送)"""
+
+    def __init__(self, wheel, flush, window=COALESCE_WINDOW, on_merged=None):
+        self.wheel = wheel
+        self.flush_func = flush
+        self.window = window
+        self.on_merged = on_merged
+        self._groups = {}   # 分组键 -> [推送]
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return sum(len(group) for group in self._groups.values())
+
+    def add(self, delivery):
+        """加入一个推送；窗口为0时直接发送，返回 flush 的结果或True"""
+        if self.window <= 0:
+            return self.flush_func(delivery)
+        key = coalesce_key(delivery)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is not None:
+                group.append(delivery)
+                return True
+            self._groups[key] = [delivery]
+        self.wheel.schedule(self.window, self._flush_key, key)
+        return True
+
+    def _flush_key(self, key):
+        with self._lock:
+            group = self._groups.pop(key, None)
+        if group:
+            self._send(group)
+
+    def _send(self, group):
+        if len(group) > 1 and self.on_merged is not None:
+            self.on_merged(group)
+        self.flush_func(merge_deliveries(group))
+
+    def flush(self):
+        """立即发送所有还在窗口里的推送（停止或等待发送完时调用）"""
+        with self._lock:
+            groups = list(self._groups.values())
+            self._groups.clear()
+        for group in groups:
+            self._send(group)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+命令任务
+
+任务设置了 "command"（命令行，字符串交给系统shell执行，列表按参数直接执行）或
+"callable"（"模块:函数"，在新的Python进程里调用）时，触发后不直接推送，而是运行
+这个命令。命令在子进程里运行，不占用调度线程和推送线程的GIL；分发线程池里的
+command 通道限制同时运行的命令数（dispatch 配置里的 "command"，默认2）。
+
+    {"name": "备份", "time": "02:00", "command": "backup.bat", "timeout": 600, "notify": "failure"}
+    {"name": "日报", "time": "08:00", "callable": "reports.daily:main", "cwd": "D:/reports",
+     "cpu_limit": 60, "memory_limit": 512, "notify": "always"}
+
+- timeout: 最长运行秒数（默认600），超时结束整个进程组
+- cpu_limit / memory_limit: CPU秒数和内存上限（MB），只在支持resource模块的系统上生效
+- 标准输出和标准错误逐行写入日志，最后 OUTPUT_TAIL 行保留给后续推送
+- notify: 运行结束后按任务（或全局）推送配置发一次推送，always 总是发送、failure 失败时、
+  success 成功时、never 不发送（默认）；推送内容可以用 {exit_code} 和 {output} 占位符
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 命令默认最长运行时间（秒）
+COMMAND_TIMEOUT = 600
+# 保留给后续推送的最后几行输出
+OUTPUT_TAIL = 20
+# 每次运行最多写入日志的输出行数，超过后只保留最后 OUTPUT_TAIL 行
+MAX_LOG_LINES = 1000
+# 命令退出后等它启动的后台进程关闭输出管道的时间（秒），超过后结束整个进程组
+OUTPUT_GRACE = 1.0
+NOTIFY_MODES = ('never', 'failure', 'success', 'always')
+DEFAULT_NOTIFY = 'never'
+
+# 先设置资源限制再执行命令，不在多线程的父进程里用preexec_fn
+_LIMITED = (
+    'import os, resource, sys\n'
+    'cpu, memory = int(sys.argv[1]), int(sys.argv[2])\n'
+    'if cpu:\n'
+    '    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))\n'
+    'if memory:\n'
+    '    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n'
+    'os.execvp(sys.argv[3], sys.argv[3:])\n'
+)
+# 调用"模块:函数"，函数返回整数时作为退出码
+_CALLABLE = (
+    'import importlib, sys\n'
+    'module, _, name = sys.argv[1].partition(":")\n'
+    'result = getattr(importlib.import_module(module), name)()\n'
+    'sys.exit(result if isinstance(result, int) and not isinstance(result, bool) else 0)\n'
+)
+
+
+def is_command_task(task):
+    return bool(task.get('command') or task.get('callable'))
+
+
+def _positive(task, key, default=None):
+    value = task.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError(f'{key}必须是大于0的数字: {value}')
+    return value
+
+
+def command_options(task):
+    """校验命令任务，返回(参数列表或命令行, 是否用shell, 超时秒数, CPU秒数, 内存MB)；无效时抛出ValueError"""
+    command, target = task.get('command'), task.get('callable')
+    if command and target:
+        raise ValueError('command和callable只能设置一个')
+    if target:
+        module, _, name = str(target).partition(':')
+        if not (module and name and all(part.isidentifier() for part in module.split('.'))
+                and name.isidentifier()):
+            raise ValueError(f'callable必须写成"模块:函数": {target}')
+        args, shell = [sys.executable, '-c', _CALLABLE, target], False
+    elif isinstance(command, str):
+        args, shell = command, True
+    elif isinstance(command, list) and command and all(isinstance(arg, str) for arg in command):
+        args, shell = command, False
+    else:
+        raise ValueError('command必须是命令行字符串或参数列表')
+    if (task.get('notify') or DEFAULT_NOTIFY) not in NOTIFY_MODES:
+        raise ValueError(f'未知的通知方式: {task.get("notify")}')
+    return (args, shell, _positive(task, 'timeout', COMMAND_TIMEOUT),
+            _positive(task, 'cpu_limit'), _positive(task, 'memory_limit'))
+
+
+def should_notify(task, ok):
+    mode = task.get('notify') or DEFAULT_NOTIFY
+    return mode == 'always' or mode == ('success' if ok else 'failure')
+
+
+class CommandResult:
+    """一次命令运行的结果"""
+
+    __slots__ = ('returncode', 'output', 'duration', 'timed_out', 'error')
+
+    def __init__(self, returncode=None, output=(), duration=0.0, timed_out=False, error=None):
+        self.returncode = returncode
+        self.output = list(output)
+        self.duration = duration
+        self.timed_out = timed_out
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out
+
+    def describe(self):
+        if self.error:
+            return self.error
+        if self.timed_out:
+            return f'运行超过{self.duration:.0f}秒，已结束'
+        return f'退出码 {self.returncode}'
+
+
+class CommandRunner:
+    """运行命令任务：每次一个子进程，stop() 时结束所有还在运行的命令"""
+
+    def __init__(self):
+        self._procs = set()
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    @property
+    def running(self):
+        with self._lock:
+            return len(self._procs)
+
+    def run(self, task, on_output=None):
+        """运行任务的命令直到结束或超时，输出逐行回调 on_output(行)，返回 CommandResult"""
+        args, shell, timeout, cpu, memory = command_options(task)
+        if cpu or memory:
+            if resource is None:
+                if on_output is not None:
+                    on_output('⚠️ 当前系统不支持CPU和内存限制，只限制运行时间')
+            else:
+                if shell:
+                    args, shell = ['/bin/sh', '-c', args], False
+                args = [sys.executable, '-c', _LIMITED, str(int(cpu or 0)),
+                        str(int((memory or 0) * 1024 * 1024)), *args]
+        started = time.monotonic()
+        with self._lock:
+            if self._stopped:
+                return CommandResult(error='定时器已停止')
+            try:
+                proc = subprocess.Popen(args, shell=shell, cwd=task.get('cwd') or None, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                        errors='replace', **_group_options())
+            except OSError as e:
+                return CommandResult(error=f'无法启动命令: {e}')
+            self._procs.add(proc)
+        tail = deque(maxlen=OUTPUT_TAIL)
+        tail_lock = threading.Lock()
+        lines = 0
+
+        def read():
+            nonlocal lines
+            try:
+                for line in proc.stdout:
+                    line = line.rstrip()
+                    with tail_lock:
+                        tail.append(line)
+                    lines += 1
+                    if on_output is not None and lines <= MAX_LOG_LINES:
+                        on_output(line)
+            except (OSError, ValueError):
+                pass
+            finally:
+                proc.stdout.close()
+
+        reader = threading.Thread(target=read, name='command-output', daemon=True)
+        reader.start()
+        timed_out = False
+        try:
+            # 只按命令本身是否还在运行判断超时，输出管道被后台进程占着不算
+            try:
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                _kill(proc)
+                proc.wait()
+            reader.join(OUTPUT_GRACE)
+            if reader.is_alive():
+                # 命令已经退出，它启动的后台进程还占着输出管道
+                _kill(proc)
+                reader.join(OUTPUT_GRACE)
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+        if on_output is not None and lines > MAX_LOG_LINES:
+            on_output(f'... 共输出 {lines} 行，日志里省略了 {lines - MAX_LOG_LINES} 行')
+        with tail_lock:
+            output = list(tail)
+        result = CommandResult(proc.returncode, output, time.monotonic() - started, timed_out)
+        if self._stopped and not result.ok:
+            result.error = '定时器已停止，命令被结束'
+        return result
+
+    def stop(self):
+        """结束正在运行的命令，之后不再启动新命令"""
+        with self._lock:
+            self._stopped = True
+            procs = list(self._procs)
+        for proc in procs:
+            _kill(proc)
+
+
+def _group_options():
+    # 命令在单独的进程组里运行，超时时连同它启动的子进程一起结束
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def _kill(proc):
+    # 命令本身退出后，它启动的子进程可能还占着输出管道，所以整个进程组都要结束
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if proc.poll() is None:
+        proc.kill()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+配置文件
+
+命令行模式使用的JSON配置：
+
+    {
+        "push": {"type": "smtp", "smtp": {...}, "http": {...}},
+        "tasks": [{"name": "早报", "time": "08:00", "repeat": "每天"},
+                  {"name": "备份", "time": "02:00", "command": "backup.bat", "timeout": 600, "notify": "failure"}],
+        "log_file": "logs/timer.log",
+        "store": "data/tasks.db",
+        "dispatch": {"smtp": 4, "http": 16, "command": 2},
+        "rate_limits": {"smtp:smtp.qq.com": {"rate": 1, "burst": 10}, "http:*": {"rate": 20, "burst": 40}},
+        "metrics": {"host": "127.0.0.1", "port": 9108},
+        "http_backend": "thread",
+        "coalesce_window": 0.5,
+        "cluster": {"node_id": "node-1", "shards": 64, "lease_ttl": 6}
+    }
+
+http_backend 为 "async" 时HTTP推送由asyncio事件循环并发发送，适合大量Webhook推送。
+coalesce_window 是合并相同推送的窗口（秒），为0时不合并。
+设置了 command 或 callable 的任务触发时运行命令（见 commands），dispatch 里的 command 是同时运行的命令数上限。
+配置了 cluster 时多个实例可以共用同一个 store 运行，每个触发只由一个实例执行。
+
+相对路径按配置文件所在目录解析。配置里的任务没有id时按名称、时间、重复方式和日期
+生成固定id，重复启动不会在任务库里产生重复任务；这几项都相同的任务需要各自设置id。
+"""
+
+import hashlib
+import json
+import os
+
+from .coalesce import COALESCE_WINDOW
+from .engine import HTTP_BACKENDS
+from .ratelimit import check_rate_limits
+
+
+def load_config(path):
+    """读取配置文件，缺省项补默认值；格式错误时抛出ValueError"""
+    with open(path, encoding='utf-8') as f:
+        try:
+            config = json.load(f)
+        except ValueError as e:
+            raise ValueError(f'配置文件不是合法的JSON: {e}')
+    if not isinstance(config, dict):
+        raise ValueError('配置文件顶层必须是JSON对象')
+    if not isinstance(config.get('tasks', []), list):
+        raise ValueError('tasks必须是任务列表')
+    base_dir = os.path.dirname(os.path.abspath(path))
+    config.setdefault('push', {})
+    config.setdefault('tasks', [])
+    config.setdefault('dispatch', {})
+    if config.setdefault('http_backend', 'thread') not in HTTP_BACKENDS:
+        raise ValueError(f'http_backend只能是 {"、".join(HTTP_BACKENDS)}')
+    window = config.setdefault('coalesce_window', COALESCE_WINDOW)
+    if isinstance(window, bool) or not isinstance(window, (int, float)) or window < 0:
+        raise ValueError('coalesce_window必须是不小于0的秒数')
+    check_rate_limits(config.get('rate_limits') or {})
+    if config.get('cluster') and not config.get('store'):
+        raise ValueError('cluster需要配置共用的store')
+    for key in ('log_file', 'store'):
+        if config.get(key):
+            config[key] = os.path.join(base_dir, config[key])
+    names = {}
+    for task in config['tasks']:
+        if isinstance(task, dict):
+            task.setdefault('id', stable_task_id(task))
+            if task['id'] in names:
+                raise ValueError(f'任务id重复: {task["id"]}（{names[task["id"]]}、{task.get("name")}），'
+                                 f'名称、时间、重复方式和日期都相同的任务需要各自设置id')
+            names[task['id']] = task.get('name')
+    return config
+
+
+def stable_task_id(task):
+    """按任务内容生成的固定id"""
+    key = '|'.join(str(task.get(field, '')) for field in ('name', 'time', 'repeat', 'date'))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
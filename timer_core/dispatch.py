@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+推送分发线程池
+
+调度线程只负责把到期的推送投递到对应通道的队列，每个通道有独立的工作线程
+和并发上限，慢的SMTP握手或HTTP接口不会拖住其他任务。命令任务走 command 通道，
+工作线程只等待子进程结束，通道的并发数就是同时运行的命令数上限。
+"""
+
+import queue
+import threading
+import time
+
+# 各通道默认并发数
+DEFAULT_LIMITS = {'smtp': 4, 'http': 16, 'command': 2}
+# 各通道单次调用的超时（秒），作为timeout参数传给发送函数；命令任务的超时按任务设置
+DEFAULT_TIMEOUTS = {'smtp': 30, 'http': 10}
+# 每个通道的最大排队数
+DEFAULT_QUEUE_SIZE = 10000
+
+_STOP = object()
+
+
+class ChannelPool:
+    """单个通道的有界队列和工作线程"""
+
+    def __init__(self, name, workers, timeout, queue_size, on_error=None, on_done=None):
+        self.name = name
+        self.workers = workers
+        self.timeout = timeout
+        self.on_error = on_error
+        self.on_done = on_done
+        self.queue = queue.Queue(queue_size)
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._abandon = threading.Event()
+
+    def start(self):
+        # 每次启动用新的事件，上次放弃等待的线程不会被重新启动唤回
+        self._abandon = threading.Event()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(self._abandon,), name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """排队的推送发送完后结束工作线程；timeout秒内队列一直是满的时不再等待，工作线程发完手上这个就退出"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            try:
+                self.queue.put(_STOP, timeout=remaining())
+            except queue.Full:
+                self._abandon.set()
+                break
+        for thread in threads:
+            thread.join(remaining())
+
+    def _work(self, abandon):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                self.queue.task_done()
+                return
+            func, args, kwargs, queued_at = job
+            if self.timeout is not None:
+                kwargs.setdefault('timeout', self.timeout)
+            with self._lock:
+                self.active += 1
+            started = time.monotonic()
+            ok = False
+            try:
+                # 发送函数返回False表示发送失败
+                ok = func(*args, **kwargs) is not False
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(self.name, e)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                if self.on_done is not None:
+                    self.on_done(self.name, started - queued_at, time.monotonic() - started, ok)
+                self.queue.task_done()
+            if abandon.is_set():
+                return
+
+
+class Dispatcher:
+    """按通道划分的推送线程池"""
+
+    def __init__(self, limits=None, timeouts=None, queue_size=DEFAULT_QUEUE_SIZE, on_error=None, on_done=None):
+        """on_done(通道, 排队秒数, 执行秒数, 是否成功) 在每次推送结束后调用"""
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.channels = {
+            name: ChannelPool(name, workers, timeout=timeouts.get(name), queue_size=queue_size,
+                              on_error=on_error, on_done=on_done)
+            for name, workers in limits.items()
+        }
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for pool in self.channels.values():
+                pool.start()
+
+    def stop(self, timeout=None):
+        """停止所有工作线程，已排队的推送会先发送完；设置了timeout时每个通道最多等这么久"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            for pool in self.channels.values():
+                pool.stop(timeout)
+
+    def submit(self, channel, func, *args, **kwargs):
+        """把一次推送放入通道队列，队列已满时返回False"""
+        self.start()
+        try:
+            self.channels[channel].queue.put_nowait((func, args, kwargs, time.monotonic()))
+        except queue.Full:
+            return False
+        return True
+
+    def wait_idle(self, timeout=None, interval=0.05):
+        """等待所有已投递的推送处理完，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+    def pending(self):
+        """已投递还没有处理完（排队中和执行中）的推送数量"""
+        return sum(pool.queue.unfinished_tasks for pool in self.channels.values())
+
+    def queue_depth(self, channel=None):
+        """排队中的推送数量，不指定通道时返回总数"""
+        if channel is not None:
+            return self.channels[channel].queue.qsize()
+        return sum(pool.queue.qsize() for pool in self.channels.values())
+
+    def stats(self):
+        """各通道的排队、执行中、成功、失败数量"""
+        return {
+            name: {
+                'queued': pool.queue.qsize(),
+                'active': pool.active,
+                'completed': pool.completed,
+                'failed': pool.failed,
+            }
+            for name, pool in self.channels.items()
+        }
@@ -0,0 +1,729 @@
+# -*- coding: utf-8 -*-
+"""
+定时推送引擎
+
+调度、分发和发送的核心，不依赖tkinter，可以被图形界面或命令行共用。
+推送配置是普通的dict：
+
+    {
+        'type': 'smtp' 或 'http',
+        'smtp': {'server', 'user', 'password', 'to', 'subject', 'content'},
+        'http': {'url', 'method', 'headers', 'body'},
+    }
+
+任务可以在 task['push'] 里带自己的推送配置（只含所选通道），没有时使用引擎的
+全局配置。配置中的文本可以使用 templates 里的占位符，例如 {task_name}、{now}。
+任务的SMTP配置不保存密码，只按服务器和账号引用全局配置（或添加任务时）登记的密码，
+任务库、死信库和导出的文件里都不会出现明文密码。
+
+同一时刻触发、目标和内容都相同的推送在 coalesce_window 秒内合并成一次发送，
+任务设置 "digest": true 时发往同一目标的不同内容合并成一条汇总（见 coalesce）。
+
+多个实例共用一个任务库时传入 cluster（见 cluster），每个实例只执行自己持有租约的
+分片里的任务，其他实例增删的任务会被同步过来。
+
+任务设置了 command 或 callable 时触发后运行命令（见 commands），命令在子进程里运行，
+由分发线程池的 command 通道限制并发，结束后可以按 notify 设置再发一次推送。
+
+HTTP推送默认在线程池里发送（http_backend='thread'），大量Webhook推送时可以用
+http_backend='async'，由一个线程上的asyncio事件循环并发发送（见 async_http）。
+"""
+
+import threading
+import time
+import uuid
+
+from .bulk_mail import parse_recipients, send_bulk
+from .coalesce import COALESCE_WINDOW, Coalescer
+from .commands import CommandRunner, command_options, is_command_task, should_notify
+from .dispatch import Dispatcher
+from .http_client import HTTPClient, RequestTemplate, compile_request
+from .logpipe import LogPipeline
+from .metrics import METRICS_HOST, METRICS_PORT, MetricsServer, PipelineMetrics
+from .misfire import misfire_policy
+from .ratelimit import RateLimiter
+from .recurrence import rule_for_task
+from .retry import Delivery, MemoryDeadLetters, Partial, RetryQueue
+from .scheduler import Scheduler
+from .smtp_pool import SMTPPool
+from .taskmodel import Task
+from .templates import compile_template, render_context
+from .timewheel import TimingWheel
+
+DEFAULT_PUSH_CONFIG = {
+    'type': 'smtp',
+    'smtp': {
+        'server': 'smtp.qq.com',
+        'user': '',
+        'password': '',
+        'to': '',
+        'subject': '定时提醒',
+        'content': '这是一条定时提醒消息！',
+    },
+    'http': {
+        'url': '',
+        'method': 'POST',
+        'headers': '{"Content-Type": "application/json"}',
+        'body': '{"message": "定时提醒"}',
+    },
+}
+
+
+HTTP_BACKENDS = ('thread', 'async')
+
+
+def task_push_config(push):
+    """规范化任务自己的推送配置，只保留所选通道并补齐默认值；无效时抛出ValueError"""
+    merged = merge_push_config(push)
+    channel = merged['type']
+    if channel not in ('smtp', 'http'):
+        raise ValueError(f'未知的推送方式: {channel}')
+    config = {'type': channel, channel: merged[channel]}
+    if channel == 'http':
+        TimerEngine.http_template(config['http'])
+    else:
+        for text in config['smtp'].values():
+            compile_template(text)
+    return strip_password(config)
+
+
+def strip_password(push):
+    """去掉推送配置里的SMTP密码，没有密码时原样返回"""
+    smtp = (push or {}).get('smtp')
+    if not smtp or 'password' not in smtp:
+        return push
+    return dict(push, smtp={key: value for key, value in smtp.items() if key != 'password'})
+
+
+def merge_push_config(config=None):
+    """在默认推送配置上覆盖给定的配置项"""
+    config = config or {}
+    return {
+        'type': config.get('type', DEFAULT_PUSH_CONFIG['type']),
+        'smtp': dict(DEFAULT_PUSH_CONFIG['smtp'], **config.get('smtp', {})),
+        'http': dict(DEFAULT_PUSH_CONFIG['http'], **config.get('http', {})),
+    }
+
+
+class TimerEngine:
+    """定时推送引擎：任务管理、调度和推送发送"""
+
+    def __init__(self, push_config=None, log=None, dispatch_limits=None, store=None, rate_limits=None,
+                 http_backend='thread', coalesce_window=COALESCE_WINDOW, cluster=None):
+        if http_backend not in HTTP_BACKENDS:
+            raise ValueError(f'未知的HTTP发送方式: {http_backend}')
+        if cluster is not None and store is None:
+            raise ValueError('多实例运行需要共用的任务库')
+        self.log = log or LogPipeline()
+        self._passwords = {}   # (SMTP服务器, 账号) -> 密码
+        self.set_push_config(push_config)
+        self.store = store
+        if store is not None and store.log is None:
+            store.log = self.log_message
+        self.cluster = cluster
+        if cluster is not None and cluster.log is None:
+            cluster.log = self.log_message
+        self.tasks = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self.metrics = PipelineMetrics()
+        self.metrics_server = None
+        self.dispatcher = Dispatcher(limits=dispatch_limits, on_error=self.on_push_error,
+                                     on_done=self.metrics.job_done)
+        self.smtp_pool = SMTPPool(timing=self.metrics.smtp_timing)
+        self.http_client = HTTPClient()
+        self.commands = CommandRunner()
+        self.async_runner = self.async_http = None
+        if http_backend == 'async':
+            # 只在使用异步发送时导入，避免启动时加载asyncio和ssl
+            from .async_http import AsyncHTTPClient, AsyncRunner
+            self.async_runner = AsyncRunner(on_error=self.on_push_error)
+            self.async_http = AsyncHTTPClient()
+        self.scheduler = Scheduler(self.execute_task, on_error=self.on_task_error,
+                                   on_retire=self.on_task_retired,
+                                   claim=self._claim_runs if store is not None else None,
+                                   on_misfire=self.on_task_misfire, on_drift=self.on_clock_drift)
+        self.wheel = TimingWheel(on_error=lambda e: self.on_push_error('retry', e))
+        self.limiter = RateLimiter(rate_limits)
+        self.coalescer = Coalescer(self.wheel, self._submit_coalesced, coalesce_window, on_merged=self.on_merged)
+        self.retry = RetryQueue(self.wheel, self._submit_delivery,
+                                store if store is not None else MemoryDeadLetters(),
+                                self._serialize_delivery, log=self.log_message)
+        self.metrics.watch(self)
+
+    @property
+    def running(self):
+        return self.scheduler.running
+
+    def log_message(self, message):
+        self.log.write(message)
+
+    def set_push_config(self, config):
+        """替换推送配置，下一次触发开始生效"""
+        self.push_config = merge_push_config(config)
+        self.remember_password(self.push_config['smtp'])
+
+    def remember_password(self, smtp):
+        """登记SMTP账号的密码，任务只保存服务器和账号，发送时按它们取密码"""
+        if smtp.get('password'):
+            self._passwords[(smtp.get('server'), smtp.get('user'))] = smtp['password']
+
+    def smtp_password(self, server, user):
+        return self._passwords.get((server, user), '')
+
+    def _strip_stored_password(self, task):
+        """旧版本把SMTP密码随任务保存，读取时登记密码并从任务里去掉，返回是否去掉了"""
+        push = task.get('push')
+        stripped = strip_password(push)
+        if stripped is push:
+            return False
+        self.remember_password(push['smtp'])
+        task['push'] = stripped
+        return True
+
+    def load_tasks(self):
+        """从任务库加载全部任务并一次性放入调度器，返回任务列表
+
+        启动调度时从每个任务上次触发之后补算，进程停止期间错过的触发按错过策略处理。
+        """
+        if self.store is None:
+            return []
+        tasks = self.store.load_tasks()
+        legacy = [task for task in tasks if self._strip_stored_password(task)]
+        if legacy and not self.store.readonly:
+            self.store.save_tasks(legacy)
+            self.log_message(f'🔒 已从 {len(legacy)} 个任务里去掉保存的邮箱密码')
+        tasks = [Task(task) for task in tasks]
+        self._counts.update(self.store.run_counts())
+        self.scheduler.resume_from(self.store.last_runs())
+        with self._lock:
+            for task in tasks:
+                self.tasks[task['id']] = task
+        self.scheduler.add_many(tasks)
+        return tasks
+
+    def prepare_task(self, task):
+        """校验任务并补齐默认值，返回新的 Task；时间或重复设置无效时抛出ValueError"""
+        task = dict(task)
+        task.setdefault('id', uuid.uuid4().hex)
+        task.setdefault('repeat', '每天')
+        if not task.get('name') or not task.get('time'):
+            raise ValueError('任务名称和执行时间不能为空')
+        rule_for_task(task)
+        misfire_policy(task)
+        if is_command_task(task):
+            command_options(task)
+        if task.get('push'):
+            self.remember_password(merge_push_config(task['push'])['smtp'])
+            task['push'] = task_push_config(task['push'])
+        if 'created' not in task:
+            # 更新已有任务时保留创建时间，停止期间错过的触发从这之后补算
+            old = self.tasks.get(task['id'])
+            task['created'] = old.get('created', time.time()) if old else time.time()
+        return Task(task)
+
+    def add_task(self, task):
+        """校验并添加任务，返回带id的任务；时间或重复设置无效时抛出ValueError"""
+        task = self.prepare_task(task)
+        if self.store is not None:
+            self.store.save_task(task)
+        with self._lock:
+            self.tasks[task['id']] = task
+        self.scheduler.add(task)
+        return task
+
+    def add_tasks(self, tasks, batch_size=1000):
+        """批量添加已经 prepare_task 校验过的任务（可以是生成器），返回添加的数量
+
+        任务分批写入任务库，全部写完后一次性放入调度器。
+        """
+        added = []
+        batch = []
+        for task in tasks:
+            batch.append(task)
+            if len(batch) >= batch_size:
+                self._add_batch(batch)
+                added.extend(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+            added.extend(batch)
+        self.scheduler.add_many(added)
+        return len(added)
+
+    def _add_batch(self, batch):
+        if self.store is not None:
+            self.store.save_tasks(batch)
+        with self._lock:
+            for task in batch:
+                self.tasks[task['id']] = task
+
+    def remove_task(self, task_id):
+        """删除任务，返回被删除的任务，不存在时返回None"""
+        with self._lock:
+            task = self.tasks.pop(task_id, None)
+        if task is not None:
+            self.scheduler.remove(task_id)
+            if self.store is not None:
+                self.store.delete_task(task_id)
+        return task
+
+    def sync_config_tasks(self, tasks):
+        """以配置文件为准同步配置里的任务，返回(添加的任务, [(出错的任务, 错误)], 删除的任务)
+
+        配置里的任务标记为 source='config'；任务库里之前从配置加载、现在配置里已经没有
+        （或者配置有误）的任务会被删除，界面或导入添加的任务不受影响。
+        """
+        added, errors = [], []
+        for task in tasks:
+            try:
+                added.append(self.add_task(dict(task, source='config')))
+            except ValueError as e:
+                errors.append((task, e))
+        current = {task['id'] for task in added}
+        with self._lock:
+            stale = [task_id for task_id, task in self.tasks.items()
+                     if task.get('source') == 'config' and task_id not in current]
+        removed = [self.remove_task(task_id) for task_id in stale]
+        return added, errors, removed
+
+    def _claim_runs(self, due):
+        """触发前把整批触发写入任务库，已经执行过的触发被过滤掉；多实例时只登记本实例分片里的任务"""
+        if self.cluster is not None:
+            due = [(task, fire_ts) for task, fire_ts in due if self.cluster.owns(task['id'])]
+            if not due:
+                return set()
+        claimed = self.store.claim_runs([(task['id'], fire_ts) for task, fire_ts in due])
+        for task, fire_ts in due:
+            if (task['id'], fire_ts) not in claimed:
+                self.log_message(f'⏭️ 已执行过，跳过: {task["name"]}')
+        return claimed
+
+    def start(self):
+        if self.cluster is not None:
+            self.cluster.start(on_acquire=self.on_shards_acquired, on_change=self.sync_tasks)
+        self.scheduler.start()
+        self.log_message('🟢 定时器已启动')
+
+    def stop(self):
+        self.scheduler.stop()
+        if self.cluster is not None:
+            self.cluster.stop()
+        self.log_message('🔴 定时器已停止')
+
+    def on_shards_acquired(self, shards):
+        """接管分片：其中的任务从上次触发之后重新计算，交接期间错过的触发按错过策略处理"""
+        if not self.scheduler.running:
+            return
+        shards = set(shards)
+        last_runs = self.store.last_runs()
+        with self._lock:
+            tasks = [task for task in self.tasks.values() if self.cluster.shard_of(task['id']) in shards]
+        for task in tasks:
+            after = max(last_runs.get(task['id']) or 0, task.get('created') or 0)
+            self.scheduler.add(task, after or None)
+
+    def sync_tasks(self):
+        """重新读取任务库，同步其他实例增删改的任务，返回(新增或修改的数量, 删除的数量)"""
+        tasks = self.store.load_tasks()
+        for task in tasks:
+            self._strip_stored_password(task)
+        tasks = {task['id']: Task(task) for task in tasks}
+        with self._lock:
+            removed = [task_id for task_id in self.tasks if task_id not in tasks]
+            changed = [task for task_id, task in tasks.items() if self.tasks.get(task_id) != task]
+            for task_id in removed:
+                del self.tasks[task_id]
+            for task in changed:
+                self.tasks[task['id']] = task
+        for task_id in removed:
+            self.scheduler.remove(task_id)
+        if changed:
+            self.scheduler.add_many(changed)
+        if changed or removed:
+            self.log_message(f'🔄 同步任务库: 新增或修改 {len(changed)} 个，删除 {len(removed)} 个')
+        return len(changed), len(removed)
+
+    def serve_metrics(self, host=METRICS_HOST, port=METRICS_PORT):
+        """在本地HTTP端口提供Prometheus格式的运行指标，返回监听地址"""
+        if self.metrics_server is None:
+            self.metrics_server = MetricsServer(self.metrics.registry, host, port).start()
+            self.log_message(f'📈 运行指标: {self.metrics_server.url}')
+        return self.metrics_server.url
+
+    def wait_idle(self, timeout=None, interval=0.05):
+        """等待所有已投递的推送发送完，包括限速延后和等待重试的，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        while True:
+            self.coalescer.flush()
+            if not self.dispatcher.wait_idle(remaining()):
+                return False
+            if self.async_runner is not None and not self.async_runner.wait_idle(remaining()):
+                return False
+            # 时间轮里的重试和延后发送到点后又会投递到分发队列，全部为空才算发送完
+            if not len(self.wheel) and not self.dispatcher.pending() and not (
+                    self.async_runner is not None and self.async_runner.pending):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def shutdown(self):
+        """停止调度并关闭所有连接"""
+        self._closing.set()
+        self.scheduler.stop()
+        if self.cluster is not None:
+            self.cluster.stop()
+        self.commands.stop()
+        self.coalescer.flush()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self.wheel.stop()
+        self.dispatcher.stop()
+        if self.async_runner is not None:
+            self.async_runner.wait_idle()
+            self.async_runner.call(self.async_http.close)
+            self.async_runner.stop()
+        self.smtp_pool.close()
+        self.http_client.close()
+        if self.store is not None:
+            self.store.close()
+
+    def execute_task(self, task, fire_ts=None):
+        """执行任务：按任务（或全局）推送配置渲染内容，投递到对应通道"""
+        self.log_message(f'🚀 执行任务: {task["name"]}')
+        if fire_ts is not None:
+            self.metrics.fire_lag.observe(time.time() - fire_ts)
+        count = self._counts.get(task['id'], 0) + 1
+        self._counts[task['id']] = count
+        if is_command_task(task):
+            self.metrics.fired.inc('command')
+            if not self.dispatcher.submit('command', self._run_command, task, fire_ts, count):
+                self.metrics.dropped.inc('command')
+                self.log_message(f'❌ 命令队列已满，任务被丢弃: {task["name"]}')
+            return
+        try:
+            channel, send, args = self.build_push(task.get('push') or self.push_config, task, fire_ts, count)
+        except ValueError as e:
+            self.log_message(f'❌ 推送配置错误: {task["name"]} - {e}')
+            return
+        self.metrics.fired.inc(channel)
+        self.coalescer.add(self._delivery(task, fire_ts, channel, send, args))
+
+    def _submit_coalesced(self, delivery):
+        """合并窗口结束后投递（合并后的）推送"""
+        submitted = self._submit_delivery(delivery)
+        if not submitted:
+            runs = delivery.runs()
+            self.metrics.dropped.inc(delivery.channel, amount=len(runs))
+            for task, _ in runs:
+                self.log_message(f'❌ 推送队列已满，任务被丢弃: {task["name"]}')
+        return submitted
+
+    def _run_command(self, task, fire_ts, count):
+        """在命令通道的线程里运行命令任务，输出逐行写入日志，按 notify 设置发送后续推送"""
+        name = task['name']
+        try:
+            result = self.commands.run(task, on_output=lambda line: self.log_message(f'📜 {name}: {line}'))
+        except ValueError as e:
+            self.log_message(f'❌ 命令配置错误: {name} - {e}')
+            return False
+        if result.ok:
+            self.log_message(f'✅ 命令完成: {name}（{result.duration:.1f}秒）')
+        else:
+            self.metrics.failures.inc('command')
+            self.log_message(f'❌ 命令失败: {name} - {result.describe()}')
+        if self.store is not None and fire_ts is not None:
+            self.store.record_result(task['id'], fire_ts, result.ok)
+        if should_notify(task, result.ok) and not self.commands.stopped:
+            extra = {'exit_code': result.describe() if result.returncode is None else result.returncode,
+                     'output': '\n'.join(result.output)}
+            try:
+                channel, send, args = self.build_push(task.get('push') or self.push_config, task, fire_ts, count,
+                                                      extra)
+            except ValueError as e:
+                self.log_message(f'❌ 推送配置错误: {name} - {e}')
+            else:
+                # 触发结果已经按命令记录，后续推送不再记录到这次触发上
+                self.coalescer.add(self._delivery(task, None, channel, send, args))
+        return result.ok
+
+    def build_push(self, config, task, fire_ts=None, count=0, extra=None):
+        """按推送配置渲染这次推送，返回(通道, 发送函数, 参数)"""
+        context = render_context(task, fire_ts, count, extra=extra)
+        if config['type'] == 'smtp':
+            smtp = config['smtp']
+            password = smtp.get('password') or self.smtp_password(smtp['server'], smtp['user'])
+            if not password:
+                raise ValueError(f'没有邮箱账号 {smtp["user"]} 的密码，请在全局推送配置里填写')
+            return 'smtp', self.send_email, (
+                smtp['server'], smtp['user'], password,
+                compile_template(smtp['to']).render(context),
+                compile_template(smtp['subject']).render(context),
+                compile_template(smtp['content']).render(context),
+            )
+        return 'http', self.send_http_api, (self.http_template(config['http']).render(context),)
+
+    @staticmethod
+    def _delivery(task, fire_ts, channel, send, args):
+        """熔断器按推送目标（SMTP服务器或HTTP主机）区分，限速还要加上邮箱账号"""
+        if channel == 'smtp':
+            endpoint = f'smtp:{args[0]}'
+            limit_keys = (endpoint, f'account:{args[1]}')
+        else:
+            endpoint = f'http:{args[0].host}'
+            limit_keys = (endpoint,)
+        return Delivery(task, fire_ts, channel, endpoint, send, args, limit_keys=limit_keys)
+
+    def _submit_delivery(self, delivery):
+        """投递到分发队列；超过限速时先在时间轮里排队，到点再投递"""
+        delay = self.limiter.reserve(delivery.limit_keys)
+        if delay > 0:
+            self.wheel.schedule(delay, self._enqueue_delayed, delivery)
+            return True
+        return self._enqueue(delivery)
+
+    def _enqueue(self, delivery):
+        if delivery.channel == 'http' and self.async_runner is not None:
+            return self.async_runner.submit(self._deliver_async(delivery, time.monotonic()))
+        return self.dispatcher.submit(delivery.channel, self._deliver, delivery)
+
+    def _enqueue_delayed(self, delivery):
+        if not self._enqueue(delivery):
+            delivery.error = '推送队列已满'
+            self.retry.failed(delivery)
+
+    def _deliver(self, delivery, timeout=None):
+        """在推送线程里执行发送"""
+        breaker = self.retry.breaker(delivery.endpoint)
+        if not breaker.allow():
+            delivery.error = '推送目标熔断中'
+            return self._finish_delivery(delivery, False)
+        try:
+            result = delivery.send(*delivery.args, timeout=timeout)
+        except Exception as e:
+            delivery.error = str(e)
+            result = False
+        if isinstance(result, Partial):
+            # 目标可达，只有部分收件人失败，只重试失败的部分
+            breaker.record_success()
+            delivery.args = result.args
+            delivery.error = '部分收件人发送失败'
+            result = False
+        elif result is False:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return self._finish_delivery(delivery, result)
+
+    async def _deliver_async(self, delivery, queued_at):
+        """在事件循环里发送HTTP推送，请求等待响应时不占用线程"""
+        started = time.monotonic()
+        breaker = self.retry.breaker(delivery.endpoint)
+        if not breaker.allow():
+            delivery.error = '推送目标熔断中'
+            ok = self._finish_delivery(delivery, False)
+        else:
+            template = delivery.args[0]
+            try:
+                response = await self.async_http.request(template, self.dispatcher.channels['http'].timeout)
+            except Exception as e:
+                response = e
+            result = self._http_result(template, response, started)
+            if result:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            ok = self._finish_delivery(delivery, result)
+        self.metrics.async_job_done('http', started - queued_at, time.monotonic() - started, ok)
+
+    def _finish_delivery(self, delivery, result):
+        """失败的推送交给重试队列，最终结果写入任务库，返回是否成功"""
+        if result is False:
+            delivery.error = delivery.error or '发送失败'
+            self.metrics.failures.inc(delivery.channel)
+            if self.retry.failed(delivery):
+                return False
+        else:
+            self.retry.end_replay(delivery)
+        if self.store is not None:
+            for task, fire_ts in delivery.runs():
+                if fire_ts is not None:
+                    self.store.record_result(task['id'], fire_ts, result is not False)
+        return result is not False
+
+    @staticmethod
+    def _serialize_delivery(delivery):
+        """把推送转换成可存入死信库的数据"""
+        if delivery.channel == 'http':
+            template = delivery.args[0]
+            payload = {'url': template.url, 'method': template.method,
+                       'headers': template.headers, 'body': template.body}
+        else:
+            # 密码不写进死信库，重放时按服务器和账号重新取
+            payload = {'args': list(delivery.args)}
+            payload['args'][2] = ''
+        payload['task_name'] = delivery.task['name']
+        if delivery.group:
+            payload['tasks'] = [[task['id'], fire_ts] for task, fire_ts in delivery.group]
+        return payload
+
+    def replay_dead_letters(self, ids=None):
+        """把死信库里的推送（默认全部）重新投递，返回开始重放的数量
+
+        死信在重放成功后才删除；重放又用完重试次数时换成一条新的死信，没发送完就退出时保留原来的。
+        """
+        replayed = 0
+        for item in self.retry.dead_letters.list_dead_letters():
+            if ids is not None and item['id'] not in ids:
+                continue
+            payload = item['payload']
+            task = self._dead_letter_task(item['task_id'], payload['task_name'])
+            if item['channel'] == 'http':
+                args = (RequestTemplate(payload['url'], payload['method'], payload['headers'], payload['body']),)
+                send = self.send_http_api
+            else:
+                args = payload['args']
+                args[2] = args[2] or self.smtp_password(args[0], args[1])
+                args = tuple(args)
+                send = self.send_email
+            delivery = self._delivery(task, item['fire_ts'], item['channel'], send, args)
+            if payload.get('tasks'):
+                # 合并发送的推送恢复整组触发，重放的结果记到组里每个任务上
+                delivery.group = []
+                for run in payload['tasks']:
+                    # 旧版本只保存了任务id
+                    task_id, fire_ts = (run, item['fire_ts']) if isinstance(run, str) else run
+                    delivery.group.append((self._dead_letter_task(task_id, payload['task_name']), fire_ts))
+            if not self.retry.start_replay(delivery, item['id']):
+                continue
+            if not self._submit_delivery(delivery):
+                self.retry.end_replay(delivery, delete=False)
+                break
+            replayed += 1
+        if replayed:
+            self.log_message(f'🔁 已重新投递 {replayed} 条死信')
+        return replayed
+
+    def _dead_letter_task(self, task_id, name):
+        """死信对应的任务，任务已被删除时用死信里保存的名称"""
+        return self.tasks.get(task_id) or {'id': task_id, 'name': name}
+
+    @staticmethod
+    def http_template(http):
+        """把HTTP配置编译成请求模板，相同配置直接命中缓存"""
+        return compile_request(http['url'], http['method'], http['headers'], http['body'])
+
+    def send_email(self, smtp_server, smtp_user, smtp_pass, to_email, subject, content, timeout=30):
+        """发送邮件，收件人为多个地址或@文件时批量发送"""
+        try:
+            recipients = parse_recipients(to_email)
+        except OSError as e:
+            self.log_message(f'❌ 读取收件人文件失败: {e}')
+            return False
+        if len(recipients) > 1:
+            return self.send_bulk_email(smtp_server, smtp_user, smtp_pass, recipients, subject, content, timeout)
+
+        try:
+            from email.mime.multipart import MIMEMultipart
+            from email.mime.text import MIMEText
+
+            msg = MIMEMultipart()
+            msg['From'] = smtp_user
+            msg['To'] = to_email
+            msg['Subject'] = subject
+
+            msg.attach(MIMEText(content, 'plain', 'utf-8'))
+
+            self.smtp_pool.send(smtp_server, smtp_user, smtp_pass, msg, timeout=timeout)
+
+            self.log_message(f'✅ 邮件发送成功: {to_email}')
+            return True
+        except Exception as e:
+            self.log_message(f'❌ 邮件发送失败: {str(e)}')
+            return False
+
+    def send_bulk_email(self, smtp_server, smtp_user, smtp_pass, recipients, subject, content, timeout=30):
+        """批量发送邮件并记录每个收件人的结果，每批按收件人数等待限速"""
+        keys = (f'smtp:{smtp_server}', f'account:{smtp_user}')
+        # 投递时已经按一封邮件预定过令牌
+        reserved = 1
+
+        def throttle(count):
+            nonlocal reserved
+            cost, reserved = count - reserved, 0
+            delay = self.limiter.reserve(keys, cost) if cost > 0 else 0.0
+            return delay <= 0 or not self._closing.wait(delay)
+
+        result = send_bulk(self.smtp_pool, smtp_server, smtp_user, smtp_pass, recipients, subject, content,
+                           timeout=timeout, throttle=throttle)
+        for recipient, error in result.failed:
+            self.log_message(f'❌ 邮件发送失败: {recipient} - {error}')
+        self.log_message(f'📨 批量邮件发送完成: 成功 {result.succeeded}/{len(recipients)}')
+        if result.failed and result.succeeded:
+            failed = ','.join(recipient for recipient, _ in result.failed)
+            return Partial((smtp_server, smtp_user, smtp_pass, failed, subject, content))
+        return not result.failed
+
+    def send_http_api(self, template, timeout=10):
+        """发送HTTP API请求"""
+        started = time.monotonic()
+        try:
+            response = self.http_client.send(template, timeout=timeout)
+        except Exception as e:
+            response = e
+        return self._http_result(template, response, started)
+
+    def _http_result(self, template, response, started):
+        """记录HTTP请求的结果并返回是否成功，response为异常表示请求没有完成"""
+        if isinstance(response, Exception):
+            self.metrics.http_responses.inc(template.host, 'error')
+            self.log_message(f'❌ HTTP API请求失败: {str(response) or type(response).__name__}')
+            return False
+        self.metrics.http_time.observe(time.monotonic() - started, template.host)
+        self.metrics.http_responses.inc(template.host, str(response.status_code))
+
+        if response.status_code in [200, 201]:
+            self.log_message(f'✅ HTTP API请求成功: {template.url}')
+            return True
+        else:
+            self.log_message(f'❌ HTTP API请求失败: {response.status_code}')
+            return False
+
+    def on_push_error(self, channel, error):
+        """推送线程异常"""
+        self.log_message(f'❌ {channel}推送异常: {error}')
+
+    def on_task_error(self, task, error):
+        """任务执行异常"""
+        self.log_message(f'❌ 任务执行异常: {task["name"]} - {error}')
+
+    def on_merged(self, group):
+        """一组推送合并成一次发送"""
+        self.metrics.coalesced.inc(group[0].channel, amount=len(group) - 1)
+        self.log_message(f'🧩 {len(group)} 个推送合并发送: {group[0].task["name"]} 等')
+
+    def on_task_misfire(self, task, missed, count):
+        """任务的触发超过宽限期"""
+        self.metrics.misfired.inc(amount=missed)
+        if count:
+            self.log_message(f'⏰ 任务错过 {missed} 次，补执行 {count} 次: {task["name"]}')
+        else:
+            self.log_message(f'⏰ 任务错过 {missed} 次，按策略跳过: {task["name"]}')
+
+    def on_clock_drift(self, drift):
+        """系统休眠或时间被调整"""
+        if drift > 0:
+            self.log_message(f'💤 检测到系统休眠或时间前跳 {drift:.0f} 秒，检查错过的任务')
+        else:
+            self.log_message(f'🕒 检测到系统时间回拨 {-drift:.0f} 秒')
+
+    def on_task_retired(self, task):
+        """一次性任务执行完毕"""
+        self.log_message(f'🏁 任务已完成，不再执行: {task["name"]}')
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP推送客户端
+
+所有推送共用一个带连接池的 requests.Session，同一主机的推送复用已建立的
+连接。请求的地址、方法、请求头和请求体在保存时解析校验成 RequestTemplate，
+触发时不再重复解析JSON；其中的占位符（见 templates）在触发时渲染。
+"""
+
+import json
+import threading
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from .templates import compile_template
+
+HTTP_METHODS = ('GET', 'POST', 'PUT')
+# 连接池缓存的主机数
+POOL_HOSTS = 32
+# 每个主机最多同时保持的连接数
+POOL_PER_HOST = 8
+
+
+class RequestTemplate:
+    """已校验的HTTP请求模板"""
+
+    __slots__ = ('url', 'method', 'headers', 'body', 'host', 'dynamic')
+
+    def __init__(self, url, method, headers, body):
+        self.url = url
+        self.method = method
+        self.headers = headers
+        self.body = body
+        self.host = urlsplit(url).netloc
+        self.dynamic = _has_placeholders([url, headers, body])
+
+    def render(self, context):
+        """返回替换了占位符的请求，没有占位符时直接返回自身"""
+        if not self.dynamic:
+            return self
+        rendered = RequestTemplate.__new__(RequestTemplate)
+        rendered.url = compile_template(self.url).render(context)
+        rendered.method = self.method
+        rendered.headers = _render_value(self.headers, context)
+        rendered.body = _render_value(self.body, context)
+        rendered.host = self.host
+        rendered.dynamic = False
+        return rendered
+
+    def request_kwargs(self):
+        """转换成 Session.request 的参数，GET请求体作为查询参数"""
+        if self.method == 'GET':
+            return {'headers': self.headers, 'params': self.body}
+        return {'headers': self.headers, 'json': self.body}
+
+
+def _has_placeholders(value):
+    if isinstance(value, str):
+        return not compile_template(value).static
+    if isinstance(value, dict):
+        return any(_has_placeholders(k) or _has_placeholders(v) for k, v in value.items())
+    if isinstance(value, list):
+        return any(_has_placeholders(v) for v in value)
+    return False
+
+
+def _render_value(value, context):
+    if isinstance(value, str):
+        return compile_template(value).render(context)
+    if isinstance(value, dict):
+        return {_render_value(k, context): _render_value(v, context) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_render_value(v, context) for v in value]
+    return value
+
+
+def _parse_json_object(text, label):
+    if not text:
+        return {}
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f'{label}不是合法的JSON: {e}')
+    if not isinstance(value, dict):
+        raise ValueError(f'{label}必须是JSON对象')
+    return value
+
+
+@lru_cache(maxsize=1024)
+def compile_request(url, method, headers='', body=''):
+    """解析并校验请求配置，相同配置只解析一次"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        raise ValueError(f'API地址无效: {url}')
+    method = method.upper()
+    if method not in HTTP_METHODS:
+        raise ValueError(f'不支持的请求方法: {method}')
+    return RequestTemplate(url, method,
+                           _parse_json_object(headers, '请求头'),
+                           _parse_json_object(body, '请求体'))
+
+
+class HTTPClient:
+    """共享连接池的HTTP客户端，首次使用时才导入requests"""
+
+    def __init__(self, pool_hosts=POOL_HOSTS, per_host=POOL_PER_HOST):
+        self.pool_hosts = pool_hosts
+        self.per_host = per_host
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        # pool_block=True：同一主机的并发超过上限时排队等待空闲连接，而不是另开连接
+        adapter = HTTPAdapter(pool_connections=self.pool_hosts,
+                              pool_maxsize=self.per_host,
+                              pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def send(self, template, timeout=None):
+        """按模板发送请求，返回响应对象"""
+        return self.session.request(template.method, template.url, timeout=timeout,
+                                    **template.request_kwargs())
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+日志管道
+
+任意线程调用 write() 只是把一行日志追加到队列里，不碰界面也不等磁盘。
+界面定时调用 drain() 批量取走新日志；完整日志由后台线程批量写入滚动日志文件。
+"""
+
+import logging
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# 界面端最多保留的未取走日志行数，超出时丢弃最旧的
+VIEW_LINES = 2000
+# 单个日志文件大小上限和保留的历史文件数
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 后台线程每次最多合并写入的行数
+FILE_BATCH = 1000
+
+_STOP = object()
+
+
+class LogPipeline:
+    """线程安全的日志队列，附带滚动文件输出"""
+
+    def __init__(self, path=None, view_lines=VIEW_LINES,
+                 max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        # deque的append/popleft是原子操作，写日志不需要加锁
+        self._pending = deque(maxlen=view_lines)
+        self.view_lines = view_lines
+        self.path = path
+        self._file_queue = None
+        self._writer = None
+        if path:
+            self._handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                                backupCount=backup_count, encoding='utf-8')
+            self._handler.setFormatter(logging.Formatter('%(message)s'))
+            self._file_queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._write_file, name='log-writer', daemon=True)
+            self._writer.start()
+
+    def write(self, message):
+        """记录一行日志，可在任意线程调用"""
+        now = datetime.now()
+        line = f'[{now.strftime("%H:%M:%S")}] {message}'
+        self._pending.append(line)
+        if self._file_queue is not None:
+            self._file_queue.put(f'{now.strftime("%Y-%m-%d")} {line}')
+
+    def drain(self, limit=None):
+        """取走尚未显示的日志行，最多limit行"""
+        lines = []
+        pending = self._pending
+        while pending and (limit is None or len(lines) < limit):
+            try:
+                lines.append(pending.popleft())
+            except IndexError:
+                break
+        return lines
+
+    def close(self):
+        """写完剩余日志并关闭文件"""
+        if self._writer is not None:
+            self._file_queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+            self._handler.close()
+
+    def _write_file(self):
+        while True:
+            line = self._file_queue.get()
+            batch = []
+            while line is not _STOP:
+                batch.append(line)
+                if len(batch) >= FILE_BATCH:
+                    break
+                try:
+                    line = self._file_queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._emit('\n'.join(batch))
+            if line is _STOP:
+                return
+
+    def _emit(self, text):
+        record = logging.LogRecord('timer', logging.INFO, __file__, 0, text, None, None)
+        self._handler.handle(record)
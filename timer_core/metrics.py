@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标
+
+计数器和直方图在推送各环节记录，已有的统计数（重试、死信、连接复用、排队数等）
+不重复计数，而是在抓取时用回调读取，热路径上只多一次加锁累加。
+指标按Prometheus文本格式输出，可以由本地HTTP监听提供给Prometheus抓取：
+
+    curl http://127.0.0.1:9108/metrics
+"""
+
+import bisect
+import threading
+from functools import lru_cache
+
+from .retry import BREAKER_CLOSED
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 触发延迟的分桶（秒），正常情况在毫秒级，错过的触发可能晚几分钟以上
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 3600.0)
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """只增不减的计数器，labels为标签名"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, labels, value) for labels, value in items]
+
+
+class Gauge:
+    """抓取时调用func()取值的指标，func返回{标签值元组: 数值}
+
+    kind 为 'counter' 时用来导出别处已经累加好的计数。
+    """
+
+    def __init__(self, name, help_text, func, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.kind = kind
+        self._func = func
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self._func().items()]
+
+
+class Histogram:
+    """累计分桶直方图"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # 标签值 -> [各桶计数..., 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        out = []
+        for labels, series in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                total += count
+                out.append((self.name + '_bucket', labels, total, f'le="{_number(bound)}"'))
+            out.append((self.name + '_sum', labels, series[-1]))
+            out.append((self.name + '_count', labels, total))
+        return out
+
+
+class MetricsRegistry:
+    """指标集合，按注册顺序输出"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, func, labels=(), kind='gauge'):
+        return self.register(Gauge(name, help_text, func, labels, kind))
+
+    def render(self):
+        """输出Prometheus文本格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample in metric.samples():
+                name, values, value = sample[:3]
+                extra = sample[3] if len(sample) > 3 else None
+                lines.append(f'{name}{_labels(metric.labels, values, extra)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class PipelineMetrics:
+    """推送流水线各环节的指标：调度延迟、排队、发送耗时、HTTP状态、重试和失败"""
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.fire_lag = r.histogram('timer_fire_lag_seconds', '实际触发时间比计划时间晚的秒数',
+                                    buckets=LAG_BUCKETS)
+        self.fired = r.counter('timer_fired_total', '触发的推送数', ('channel',))
+        self.dropped = r.counter('timer_dropped_total', '推送队列已满被丢弃的推送数', ('channel',))
+        self.coalesced = r.counter('timer_coalesced_total', '与其他推送合并发送而省下的推送数', ('channel',))
+        self.misfired = r.counter('timer_misfired_runs_total', '超过宽限期的触发数')
+        self.queue_wait = r.histogram('timer_queue_wait_seconds', '推送在分发队列里等待的秒数', ('channel',))
+        self.send_time = r.histogram('timer_send_seconds', '推送线程执行一次发送的秒数', ('channel',))
+        self.failures = r.counter('timer_delivery_failures_total', '发送失败次数（含之后重试成功的）', ('channel',))
+        self.smtp_time = r.histogram('timer_smtp_seconds', 'SMTP各阶段耗时', ('stage', 'server'))
+        self.http_time = r.histogram('timer_http_seconds', 'HTTP请求耗时', ('host',))
+        self.http_responses = r.counter('timer_http_responses_total', 'HTTP响应数，status=error表示请求异常',
+                                        ('host', 'status'))
+        # 异步发送不经过 Dispatcher，执行完的发送数在这里累加，输出时并进 timer_jobs_total
+        self.async_jobs = Counter('timer_async_jobs_total', '异步发送执行完的发送数', ('channel', 'result'))
+
+    def job_done(self, channel, waited, elapsed, ok):
+        """Dispatcher 的 on_done 回调"""
+        self.queue_wait.observe(waited, channel)
+        self.send_time.observe(elapsed, channel)
+
+    def async_job_done(self, channel, waited, elapsed, ok):
+        """异步发送执行完：除了耗时，还要记下执行完的发送数"""
+        self.job_done(channel, waited, elapsed, ok)
+        self.async_jobs.inc(channel, 'ok' if ok else 'failed')
+
+    def smtp_timing(self, stage, server, seconds):
+        """SMTPPool 的 timing 回调"""
+        self.smtp_time.observe(seconds, stage, server)
+
+    def watch(self, engine):
+        """把引擎各组件已有的统计数注册成抓取时读取的指标（抓取时才读取引擎当前的组件）"""
+        r = self.registry
+
+        def channel_stat(key):
+            return lambda: {(name,): stats[key] for name, stats in engine.dispatcher.stats().items()}
+
+        def jobs():
+            out = {labels: value for _, labels, value in self.async_jobs.samples()}
+            for name, stats in engine.dispatcher.stats().items():
+                out[(name, 'ok')] = out.get((name, 'ok'), 0) + stats['completed']
+                out[(name, 'failed')] = out.get((name, 'failed'), 0) + stats['failed']
+            return out
+
+        def breakers():
+            return {(endpoint,): int(breaker.state != BREAKER_CLOSED)
+                    for endpoint, breaker in list(engine.retry.breakers.items())}
+
+        r.gauge('timer_jobs_total', '执行完的发送数（含异步发送）', jobs, ('channel', 'result'), kind='counter')
+        r.gauge('timer_queue_depth', '分发队列中排队的推送数', channel_stat('queued'), ('channel',))
+        r.gauge('timer_active_sends', '正在发送的推送数', channel_stat('active'), ('channel',))
+        r.gauge('timer_retries_total', '安排的重试次数', lambda: {(): engine.retry.retried}, kind='counter')
+        r.gauge('timer_dead_letters_total', '进入死信库的推送数', lambda: {(): engine.retry.dead}, kind='counter')
+        r.gauge('timer_rate_limited_total', '因限速被延后的推送数',
+                lambda: {(): engine.limiter.delayed}, kind='counter')
+        r.gauge('timer_smtp_connections_total', 'SMTP连接数，kind=reused表示复用空闲连接',
+                lambda: {('new',): engine.smtp_pool.connects, ('reused',): engine.smtp_pool.reuses},
+                ('kind',), kind='counter')
+        r.gauge('timer_breaker_open', '熔断中的推送目标（1为熔断）', breakers, ('endpoint',))
+        r.gauge('timer_scheduled_tasks', '调度中的任务数', lambda: {(): len(engine.scheduler)})
+        r.gauge('timer_catchup_pending', '等待补执行的触发数', lambda: {(): engine.scheduler.catchup_pending})
+        r.gauge('timer_coalesce_pending', '在合并窗口里等待发送的推送数', lambda: {(): engine.coalescer.pending})
+        r.gauge('timer_owned_shards', '本实例持有租约的分片数',
+                lambda: {(): len(engine.cluster.owned)} if engine.cluster is not None else {})
+        r.gauge('timer_async_pending', '异步HTTP发送中排队和在途的推送数',
+                lambda: {(): engine.async_runner.pending} if engine.async_runner is not None else {})
+
+
+@lru_cache(maxsize=None)
+def _handler_class():
+    """http.server 在第一次提供指标时才导入"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    """在后台线程里提供 /metrics 的HTTP服务"""
+
+    def __init__(self, registry, host=METRICS_HOST, port=METRICS_PORT):
+        from http.server import ThreadingHTTPServer
+        self.registry = registry
+        self.httpd = ThreadingHTTPServer((host, port), _handler_class())
+        self.httpd.daemon_threads = True
+        self.httpd.registry = registry
+        self._thread = None
+
+    @property
+    def server_address(self):
+        return self.httpd.server_address
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/metrics'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread = None
+        self.httpd.server_close()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+错过触发的处理策略
+
+电脑休眠、进程停止或者调度线程被长时间阻塞后，任务的触发时间可能已经过去。
+晚于计划时间不超过宽限期（task['grace']秒）的触发照常执行，更晚的触发按任务的
+task['misfire'] 策略处理：
+
+    once  只补执行最近错过的一次（默认）
+    all   按时间顺序补执行所有错过的触发，最多最近的 CATCHUP_LIMIT 次
+    skip  不补执行，等待下一次触发
+"""
+
+from collections import deque
+
+MISFIRE_ONCE = 'once'
+MISFIRE_ALL = 'all'
+MISFIRE_SKIP = 'skip'
+MISFIRE_POLICIES = (MISFIRE_ONCE, MISFIRE_ALL, MISFIRE_SKIP)
+
+DEFAULT_MISFIRE = MISFIRE_ONCE
+# 默认宽限期（秒）
+DEFAULT_GRACE = 60.0
+# 每个任务一次最多统计（和补执行）的错过次数
+CATCHUP_LIMIT = 1000
+# 墙上时间比单调时间多走（或少走）超过这个秒数，认为发生了休眠或系统时间调整
+DRIFT_THRESHOLD = 5.0
+
+
+def misfire_policy(task):
+    """返回任务的(策略, 宽限期)，设置无效时抛出ValueError"""
+    policy = task.get('misfire') or DEFAULT_MISFIRE
+    if policy not in MISFIRE_POLICIES:
+        raise ValueError(f'未知的错过策略: {policy}')
+    grace = task.get('grace')
+    try:
+        grace = DEFAULT_GRACE if grace is None else float(grace)
+    except (TypeError, ValueError):
+        raise ValueError(f'宽限期必须是秒数: {grace}')
+    if grace < 0:
+        raise ValueError(f'宽限期不能为负数: {grace}')
+    return policy, grace
+
+
+def missed_runs(task, fire_ts, now, next_fire, limit=CATCHUP_LIMIT):
+    """从fire_ts开始列出now之前（含）的所有触发，返回(触发列表, 之后的下一次触发)
+
+    超过limit次时只保留最近的limit次。错过很多次时按已经列出的触发估算间隔，直接跳到
+    now之前约2*limit个间隔的位置继续列出，不逐个计算更早的触发。
+    """
+    runs = deque([fire_ts], maxlen=limit)
+    ts = next_fire(task, fire_ts)
+    jumped = False
+    while ts is not None and ts <= now:
+        if len(runs) == limit and limit > 1 and not jumped:
+            jumped = True
+            start = now - 2 * limit * (runs[-1] - runs[0]) / (limit - 1)
+            later = next_fire(task, start) if start > ts else None
+            # 间隔不均匀、跳过去之后到now之间没有触发时不跳
+            if later is not None and later <= now:
+                ts = later
+        runs.append(ts)
+        ts = next_fire(task, ts)
+    return list(runs), ts
+
+
+def resolve_misfire(task, runs, now):
+    """按任务的策略从错过的触发里选出要执行的，返回(要执行的触发, 超过宽限期的次数)
+
+    策略设置无效时按默认策略处理。
+    """
+    try:
+        policy, grace = misfire_policy(task)
+    except ValueError:
+        policy, grace = DEFAULT_MISFIRE, DEFAULT_GRACE
+    on_time = [ts for ts in runs if now - ts <= grace]
+    late = len(runs) - len(on_time)
+    if not late or policy == MISFIRE_ALL:
+        return runs, late
+    if policy == MISFIRE_SKIP or on_time:
+        return on_time, late
+    return runs[-1:], late
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+发送限速
+
+按SMTP服务器、邮箱账号和HTTP主机分别设置令牌桶，超出速率的推送不会被丢弃，
+而是算出需要等待的时间后延后发送，突发的推送被平滑成服务商能接受的持续速率。
+
+限速规则的键：
+    smtp:<服务器>    如 smtp:smtp.qq.com
+    account:<账号>   如 account:me@qq.com
+    http:<主机>      如 http:api.example.com
+前缀后写 * 表示该类目标的默认规则，如 http:*。
+"""
+
+import threading
+import time
+
+# 默认规则：QQ邮箱对发信频率比较敏感，保守地限制为每秒1封、最多连续10封
+DEFAULT_RATE_LIMITS = {
+    'smtp:smtp.qq.com': {'rate': 1.0, 'burst': 10},
+}
+
+
+def _is_number(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float))
+
+
+def check_rate_limits(limits):
+    """校验限速规则：rate必须大于0，burst不能小于1；无效时抛出ValueError"""
+    if not isinstance(limits, dict):
+        raise ValueError('rate_limits必须是 {键: 规则} 形式的对象')
+    for key, rule in limits.items():
+        if not isinstance(rule, dict):
+            raise ValueError(f'限速规则必须是对象: {key}')
+        rate, burst = rule.get('rate'), rule.get('burst', 1)
+        if not _is_number(rate) or rate <= 0:
+            raise ValueError(f'限速规则 {key} 的rate必须是大于0的数字')
+        if not _is_number(burst) or burst < 1:
+            raise ValueError(f'限速规则 {key} 的burst必须是不小于1的数字')
+
+
+class TokenBucket:
+    """令牌桶：rate为每秒补充的令牌数，burst为桶容量
+
+    reserve() 总是预定cost个令牌，令牌不足时返回需要等待的秒数（允许透支），
+    这样排队的推送按到达顺序依次错开，而不是同时醒来再抢。
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(max(burst, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, now=None, cost=1):
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= cost
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """按键管理令牌桶"""
+
+    def __init__(self, limits=None):
+        check_rate_limits(limits or {})
+        self.limits = dict(DEFAULT_RATE_LIMITS, **(limits or {}))
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.delayed = 0
+
+    def _bucket(self, key):
+        with self._lock:
+            if key in self._buckets:
+                return self._buckets[key]
+            rule = self.limits.get(key)
+            if rule is None:
+                rule = self.limits.get(key.split(':', 1)[0] + ':*')
+            bucket = TokenBucket(rule['rate'], rule.get('burst', 1)) if rule else None
+            self._buckets[key] = bucket
+            return bucket
+
+    def reserve(self, keys, cost=1, now=None):
+        """为一次发送在所有相关的令牌桶里各预定cost个令牌（群发时为收件人数），返回需要等待的秒数；now 用于模拟时的虚拟时间"""
+        delay = 0.0
+        now = time.monotonic() if now is None else now
+        for key in keys:
+            bucket = self._bucket(key)
+            if bucket is not None:
+                delay = max(delay, bucket.reserve(now, cost))
+        if delay > 0:
+            self.delayed += 1
+        return delay
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+重复规则
+
+把任务的重复设置（一次/每天/每周/每月/间隔）和cron表达式解析成规则对象，
+按需惰性生成下一次触发时间。时间可以精确到秒（HH:MM:SS）；间隔任务的时间写成
+"15s"、"5m"、"1h30m"，可以用 "5m@08:00" 指定从起始日期的几点开始。
+除间隔任务按经过的秒数计算外，所有规则都按本地墙上时间计算：
+- 每月的日期超过当月天数时取当月最后一天（如31号在2月为28/29号）
+- 夏令时跳过的时刻顺延到跳变之后，重复的时刻只在第一次出现时触发
+"""
+
+import calendar
+import math
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+REPEAT_ONCE = '一次'
+REPEAT_DAILY = '每天'
+REPEAT_WEEKLY = '每周'
+REPEAT_MONTHLY = '每月'
+REPEAT_INTERVAL = '间隔'
+REPEAT_CRON = 'Cron'
+REPEAT_MODES = [REPEAT_ONCE, REPEAT_DAILY, REPEAT_WEEKLY, REPEAT_MONTHLY, REPEAT_INTERVAL, REPEAT_CRON]
+
+_INTERVAL_UNITS = {'h': 3600, '小时': 3600, '时': 3600, 'm': 60, '分钟': 60, '分': 60, 's': 1, '秒': 1, '': 1}
+_INTERVAL_PART = re.compile(r'(\d+)\s*(小时|分钟|h|m|s|时|分|秒)?', re.IGNORECASE)
+
+# cron查找下一次时间的最大搜索范围（年），超出即认为表达式永远不会触发
+CRON_SEARCH_YEARS = 5
+
+
+def parse_hhmm(value):
+    """解析HH:MM或HH:MM:SS，返回(时, 分, 秒)"""
+    parts = value.split(':')
+    if len(parts) not in (2, 3) or not parts[0].isdigit() or \
+            not all(len(part) == 2 and part.isdigit() for part in parts[1:]):
+        raise ValueError(f'时间格式错误: {value}')
+    hour, minute, second = (int(part) for part in parts + ['0'] * (3 - len(parts)))
+    if hour > 23 or minute > 59 or second > 59:
+        raise ValueError(f'时间超出范围: {value}')
+    return hour, minute, second
+
+
+def parse_interval(value):
+    """解析间隔任务的时间 "15s"、"5m"、"1h30m"（可带 "@HH:MM[:SS]" 起点），返回(秒数, (时, 分, 秒))"""
+    text, _, start_text = value.strip().partition('@')
+    text = text.replace(' ', '')
+    pos, seconds = 0, 0
+    for match in _INTERVAL_PART.finditer(text):
+        if match.start() != pos:
+            break
+        seconds += int(match.group(1)) * _INTERVAL_UNITS[(match.group(2) or '').lower()]
+        pos = match.end()
+    if not text or pos != len(text):
+        raise ValueError(f'间隔格式错误: {value}（例如 15s、5m、1h30m）')
+    if seconds <= 0:
+        raise ValueError(f'间隔必须大于0秒: {value}')
+    return seconds, parse_hhmm(start_text.strip()) if start_text else (0, 0, 0)
+
+
+class Rule:
+    """重复规则基类，子类实现 next_after(naive_dt)
+
+    start 为起始日期（零点），规则不会在它之前触发。
+    """
+
+    start = None
+
+    def next_after(self, dt):
+        raise NotImplementedError
+
+    def next_ts(self, after):
+        """返回时间戳after之后的下一次触发时间戳，不再触发时返回None"""
+        dt = datetime.fromtimestamp(after)
+        if self.start is not None and dt < self.start:
+            dt = self.start - timedelta(microseconds=1)
+        while True:
+            dt = self.next_after(dt)
+            if dt is None:
+                return None
+            ts = dt.timestamp()
+            # 夏令时回拨的重复时段里，墙上时间更晚不代表时间戳更晚
+            if ts > after:
+                return ts
+
+    def iter_ts(self, after):
+        """惰性生成after之后的所有触发时间戳"""
+        ts = self.next_ts(after)
+        while ts is not None:
+            yield ts
+            ts = self.next_ts(ts)
+
+
+class OnceRule(Rule):
+    """只在指定日期时间触发一次"""
+
+    def __init__(self, day, hour, minute, second=0):
+        self.at = datetime(day.year, day.month, day.day, hour, minute, second)
+
+    def next_after(self, dt):
+        return self.at if self.at > dt else None
+
+
+class DailyRule(Rule):
+    """每天HH:MM:SS"""
+
+    def __init__(self, hour, minute, second=0):
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+
+    def next_after(self, dt):
+        fire = dt.replace(hour=self.hour, minute=self.minute, second=self.second, microsecond=0, fold=0)
+        if fire <= dt:
+            fire += timedelta(days=1)
+        return fire
+
+
+class WeeklyRule(Rule):
+    """每周指定星期（0=周一）的HH:MM:SS"""
+
+    def __init__(self, weekday, hour, minute, second=0):
+        self.weekday = weekday
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+
+    def next_after(self, dt):
+        fire = dt.replace(hour=self.hour, minute=self.minute, second=self.second, microsecond=0, fold=0)
+        fire += timedelta(days=(self.weekday - fire.weekday()) % 7)
+        if fire <= dt:
+            fire += timedelta(days=7)
+        return fire
+
+
+class MonthlyRule(Rule):
+    """每月指定日期的HH:MM:SS，日期超过当月天数时取月末"""
+
+    def __init__(self, day, hour, minute, second=0):
+        self.day = day
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+
+    def _in_month(self, year, month):
+        day = min(self.day, calendar.monthrange(year, month)[1])
+        return datetime(year, month, day, self.hour, self.minute, self.second)
+
+    def next_after(self, dt):
+        fire = self._in_month(dt.year, dt.month)
+        if fire <= dt:
+            year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+            fire = self._in_month(year, month)
+        return fire
+
+
+class IntervalRule(Rule):
+    """从起点开始每隔固定秒数触发，按经过的时间计算，不受夏令时影响"""
+
+    def __init__(self, seconds, anchor):
+        self.seconds = seconds
+        self.anchor = anchor
+
+    def next_ts(self, after):
+        anchor = self.anchor.timestamp()
+        if after < anchor:
+            return anchor
+        return anchor + (math.floor((after - anchor) / self.seconds) + 1) * self.seconds
+
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f'步长必须为正数: {field}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f'取值超出范围 {low}-{high}: {field}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronRule(Rule):
+    """标准5段cron表达式：分 时 日 月 星期（0和7都表示周日）"""
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f'cron表达式需要5段: {expr}')
+        self.expr = expr
+        self.minutes = sorted(_parse_cron_field(fields[0], 0, 59))
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        # 转成Python的weekday()：0=周一 ... 6=周日
+        self.weekdays = frozenset((d - 1) % 7 for d in _parse_cron_field(fields[4], 0, 7))
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        in_days = dt.day in self.days
+        in_weekdays = dt.weekday() in self.weekdays
+        # 与crontab一致：日和星期都被限定时，满足任意一个即可
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, dt):
+        dt = dt.replace(second=0, microsecond=0, fold=0) + timedelta(minutes=1)
+        limit = dt.year + CRON_SEARCH_YEARS
+        while dt.year <= limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = datetime(year, month, 1)
+                continue
+            if not self._day_matches(dt):
+                dt = datetime(dt.year, dt.month, dt.day) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            for minute in self.minutes:
+                if minute >= dt.minute:
+                    return dt.replace(minute=minute)
+            dt = dt.replace(minute=0) + timedelta(hours=1)
+        return None
+
+
+@lru_cache(maxsize=4096)
+def parse_rule(repeat, time_text, day_text=None):
+    """把重复设置解析成规则对象，相同参数共享同一个实例"""
+    if repeat == REPEAT_CRON:
+        return CronRule(time_text)
+    if repeat == REPEAT_INTERVAL:
+        seconds, (hour, minute, second) = parse_interval(time_text)
+        if day_text is None:
+            raise ValueError('间隔任务需要起始日期')
+        day = date.fromisoformat(day_text)
+        return IntervalRule(seconds, datetime(day.year, day.month, day.day, hour, minute, second))
+    hour, minute, second = parse_hhmm(time_text)
+    if repeat == REPEAT_DAILY:
+        return DailyRule(hour, minute, second)
+    if day_text is None:
+        raise ValueError(f'重复方式 {repeat} 需要起始日期')
+    day = date.fromisoformat(day_text)
+    if repeat == REPEAT_ONCE:
+        return OnceRule(day, hour, minute, second)
+    if repeat == REPEAT_WEEKLY:
+        rule = WeeklyRule(day.weekday(), hour, minute, second)
+    elif repeat == REPEAT_MONTHLY:
+        rule = MonthlyRule(day.day, hour, minute, second)
+    else:
+        raise ValueError(f'未知的重复方式: {repeat}')
+    rule.start = datetime(day.year, day.month, day.day)
+    return rule
+
+
+def first_date(time_text, now=None):
+    """HH:MM[:SS]第一次出现的日期：今天还没到就是今天，否则是明天"""
+    now = now or datetime.now()
+    hour, minute, second = parse_hhmm(time_text)
+    fire = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if fire <= now:
+        fire += timedelta(days=1)
+    return fire.date().isoformat()
+
+
+def rule_for_task(task):
+    """取得任务的规则对象；缺少起始日期的任务按第一次出现的日期补上"""
+    repeat = task.get('repeat', REPEAT_DAILY)
+    if repeat == REPEAT_INTERVAL and not task.get('date'):
+        # 间隔任务从添加的当天开始计算
+        task['date'] = date.today().isoformat()
+    elif repeat not in (REPEAT_DAILY, REPEAT_CRON) and not task.get('date'):
+        task['date'] = first_date(task['time'])
+    return parse_rule(repeat, task['time'], task.get('date'))
+
+
+@lru_cache(maxsize=8192)
+def _next_ts(rule, after):
+    return rule.next_ts(after)
+
+
+def next_fire_time(task, after):
+    """调度器使用的下一次触发时间计算函数
+
+    同一时刻批量计算（如启动加载、同一分钟触发的一批任务）时，相同规则只算一次。
+    """
+    return _next_ts(rule_for_task(task), after)
+
+
+def upcoming(tasks, hours, now=None):
+    """返回未来hours小时内的所有触发，按时间排序的[(时间戳, 任务)]
+
+    相同规则的任务共享一次计算，所以十万级任务也只需计算少量不同的规则。
+    """
+    start = now if now is not None else datetime.now().timestamp()
+    end = start + hours * 3600
+    by_rule = {}
+    for task in tasks:
+        by_rule.setdefault(rule_for_task(task), []).append(task)
+    firings = []
+    for rule, group in by_rule.items():
+        for ts in rule.iter_ts(start):
+            if ts > end:
+                break
+            firings.append((ts, group))
+    # 只对(时间, 任务组)排序，组内任务直接展开
+    firings.sort(key=lambda item: item[0])
+    return [(ts, task) for ts, group in firings for task in group]
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+失败重试
+
+推送失败后按带随机抖动的指数退避放进时间轮，到点重新投递到分发队列；
+每个推送目标（SMTP服务器、HTTP主机）有独立的熔断器，连续失败后暂停向它发送，
+不会拖慢其他通道。重试次数用完的推送进入死信库，可以批量重放。
+"""
+
+import random
+import threading
+import time
+
+# 最多尝试次数（包括第一次发送）
+MAX_ATTEMPTS = 5
+# 退避基数和上限（秒）
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 300.0
+# 连续失败多少次后熔断，以及熔断后多久放行一次试探
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 60.0
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动：第n次重试等待 [0, min(上限, 基数*2^n)) 之间的随机时间"""
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """单个推送目标的熔断器"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否允许发送；熔断期满后只放行一次试探"""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = BREAKER_HALF_OPEN
+                return True
+            return False
+
+    def remaining(self):
+        """距离下一次允许试探还有多少秒"""
+        with self._lock:
+            if self.state != BREAKER_OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == BREAKER_HALF_OPEN or self.failures >= self.threshold:
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+
+
+class Partial:
+    """发送函数的返回值：只有一部分失败，重试时改用新的参数（如只重发失败的收件人）"""
+
+    __slots__ = ('args',)
+
+    def __init__(self, args):
+        self.args = args
+
+
+class Delivery:
+    """一次待发送的推送；合并发送时 group 是组里每个任务的[(任务, 触发时间)]"""
+
+    __slots__ = ('task', 'fire_ts', 'channel', 'endpoint', 'send', 'args', 'attempt', 'error', 'limit_keys',
+                 'group', 'dead_letter')
+
+    def __init__(self, task, fire_ts, channel, endpoint, send, args, attempt=0, limit_keys=()):
+        self.task = task
+        self.fire_ts = fire_ts
+        self.channel = channel
+        self.endpoint = endpoint
+        self.send = send
+        self.args = args
+        self.attempt = attempt
+        self.error = None
+        self.limit_keys = limit_keys
+        self.group = None
+        self.dead_letter = None   # 重放死信时是死信的id，成功或重新进入死信库后才删除原来的那条
+
+    def runs(self):
+        """这个推送代表的[(任务, 触发时间)]"""
+        return self.group or [(self.task, self.fire_ts)]
+
+
+class MemoryDeadLetters:
+    """没有任务库时使用的内存死信列表"""
+
+    def __init__(self):
+        self._items = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add_dead_letter(self, task_id, fire_ts, channel, payload, error, attempts):
+        with self._lock:
+            self._items[self._next_id] = {
+                'id': self._next_id, 'task_id': task_id, 'fire_ts': fire_ts, 'channel': channel,
+                'payload': payload, 'error': error, 'attempts': attempts, 'created': time.time(),
+            }
+            self._next_id += 1
+
+    def list_dead_letters(self, limit=None):
+        with self._lock:
+            items = list(self._items.values())
+        return items[:limit] if limit else items
+
+    def delete_dead_letters(self, ids):
+        with self._lock:
+            for item_id in ids:
+                self._items.pop(item_id, None)
+
+
+class RetryQueue:
+    """失败推送的重试调度
+
+    submit(delivery) 把推送重新投递到分发队列；serialize(delivery) 把推送转换成可以
+    存入死信库的JSON数据。
+    """
+
+    def __init__(self, wheel, submit, dead_letters, serialize, policy=None,
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_reset=BREAKER_RESET, log=None):
+        self.wheel = wheel
+        self.submit = submit
+        self.dead_letters = dead_letters
+        self.serialize = serialize
+        self.policy = policy or RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.log = log
+        self.breakers = {}
+        self._replaying = set()
+        # 已经删除的死信，防止按重放前读到的旧列表再次重放
+        self._replayed = set()
+        self._lock = threading.Lock()
+        self.retried = 0
+        self.dead = 0
+
+    def breaker(self, endpoint):
+        with self._lock:
+            breaker = self.breakers.get(endpoint)
+            if breaker is None:
+                breaker = self.breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return breaker
+
+    def failed(self, delivery):
+        """推送失败：还有重试次数就放进时间轮，否则写入死信库；返回是否会重试"""
+        delivery.attempt += 1
+        if delivery.attempt >= self.policy.max_attempts:
+            self.dead += 1
+            self.dead_letters.add_dead_letter(delivery.task['id'], delivery.fire_ts, delivery.channel,
+                                              self.serialize(delivery), delivery.error, delivery.attempt)
+            self.end_replay(delivery)
+            if self.log is not None:
+                self.log(f'☠️ 重试{delivery.attempt}次仍失败，已放入死信库: {delivery.task["name"]}')
+            return False
+        # 熔断中的目标至少等到允许试探时再重试
+        delay = max(self.policy.delay(delivery.attempt), self.breaker(delivery.endpoint).remaining())
+        self.retried += 1
+        self.wheel.schedule(delay, self._resubmit, delivery)
+        if self.log is not None:
+            self.log(f'🔁 {delay:.1f}秒后第{delivery.attempt}次重试: {delivery.task["name"]}')
+        return True
+
+    def start_replay(self, delivery, item_id):
+        """标记推送是在重放死信item_id；这条死信已经在重放中或已经删除时返回False"""
+        with self._lock:
+            if item_id in self._replaying or item_id in self._replayed:
+                return False
+            self._replaying.add(item_id)
+        delivery.dead_letter = item_id
+        return True
+
+    def end_replay(self, delivery, delete=True):
+        """重放结束：成功或者已经作为新的死信保存时删除原来的死信，delete为False时保留"""
+        item_id, delivery.dead_letter = delivery.dead_letter, None
+        if item_id is None:
+            return
+        if delete:
+            self.dead_letters.delete_dead_letters([item_id])
+        with self._lock:
+            self._replaying.discard(item_id)
+            if delete:
+                self._replayed.add(item_id)
+
+    def _resubmit(self, delivery):
+        if not self.submit(delivery):
+            delivery.error = '推送队列已满'
+            self.failed(delivery)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+基于多层时间轮的定时调度器
+
+任务按下次触发时间（精确到毫秒）放进多层时间轮（见 timewheel.HierarchicalWheel），
+添加、删除和触发都是O(1)。调度线程在条件变量上睡眠到时间轮给出的下一个时刻，
+添加或删除任务时会被提前唤醒，空闲时几乎不占用CPU。
+
+醒来晚了（休眠、系统时间调整、线程被阻塞）或者停止期间错过的触发按任务的
+错过策略处理（见 misfire），需要补执行的触发分批投递，每批之间照常处理按时到期的任务。
+
+时钟可以替换：传入带 time() 和 monotonic() 的虚拟时钟，不启动调度线程，由调用方
+拨动时钟后调用 step()，就能比实际时间快得多地回放一段时间内的触发（见 simulate）。
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+
+from .misfire import DRIFT_THRESHOLD, missed_runs, resolve_misfire
+from .recurrence import next_fire_time
+from .timewheel import HierarchicalWheel
+
+# 单次等待上限（秒）：休眠期间单调时钟不走，醒来后最多晚这么久发现错过的任务
+MAX_WAIT = 5.0
+# 每批补执行的触发数，以及两批之间的间隔（秒）
+CATCHUP_BATCH = 100
+CATCHUP_PAUSE = 0.1
+
+
+class Scheduler:
+    """时间轮调度器：按下次触发时间排序，到点回调 on_fire(task, fire_ts)
+
+    next_fire(task, after) 返回None表示任务不再触发（如已执行的一次性任务），
+    此时任务被移出调度器并回调 on_retire(task)。
+    claim(due) 在触发前对同一批到期的[(task, fire_ts)]做一次过滤，
+    只有返回的触发会被执行（用于持久化的“最多执行一次”）。
+    有触发超过宽限期时回调 on_misfire(task, 错过次数, 补执行次数)，
+    检测到休眠或系统时间跳变时回调 on_drift(秒数)。
+    clock 提供 time() 和 monotonic()，默认是 time 模块。
+    """
+
+    def __init__(self, on_fire, next_fire=next_fire_time, on_error=None, on_retire=None, claim=None,
+                 on_misfire=None, on_drift=None, clock=time):
+        self._time = clock.time
+        self._monotonic = clock.monotonic
+        self._on_fire = on_fire
+        self._next_fire = next_fire
+        self._on_error = on_error
+        self._on_retire = on_retire
+        self._claim = claim
+        self._on_misfire = on_misfire
+        self._on_drift = on_drift
+        self._cond = threading.Condition()
+        self._wheel = HierarchicalWheel(self._time())   # 元素为 (fire_ts, seq, task_id)
+        self._entries = {}     # task_id -> (task, seq)，seq不一致的时间轮元素即为已失效
+        self._seq = itertools.count()
+        self._stale = 0
+        self._catchup = deque()    # 待补执行的 (task, fire_ts, retired)
+        self._catchup_at = 0.0     # 下一批补执行的单调时间
+        self._resume = {}          # task_id -> 最近一次触发时间，重新启动时从这里补
+        self._clock = None         # 上次醒来时的(墙上时间, 单调时间)
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def catchup_pending(self):
+        return len(self._catchup)
+
+    def add(self, task, after=None):
+        """添加（或替换）任务，如果它成为最早的任务则唤醒调度线程"""
+        with self._cond:
+            if task['id'] in self._entries:
+                self._stale += 1
+            self._push(task, self._time() if after is None else after)
+            self._cond.notify()
+
+    def add_many(self, tasks, after=None):
+        """批量添加任务，一次性重建堆，适合启动时加载大量任务"""
+        with self._cond:
+            for task in tasks:
+                if task['id'] in self._entries:
+                    self._stale += 1
+            self._load(tasks, self._time() if after is None else after)
+            self._cond.notify()
+
+    def remove(self, task_id):
+        """删除任务，堆中的旧元素延迟清理"""
+        with self._cond:
+            if self._entries.pop(task_id, None) is None:
+                return False
+            self._resume.pop(task_id, None)
+            self._stale += 1
+            self._maybe_compact()
+            self._cond.notify()
+            return True
+
+    def resume_from(self, last_runs):
+        """设置每个任务最近一次触发的时间{task_id: fire_ts}，start() 时从这之后补执行"""
+        with self._cond:
+            for task_id, fire_ts in last_runs.items():
+                if fire_ts is not None and fire_ts > self._resume.get(task_id, 0):
+                    self._resume[task_id] = fire_ts
+
+    def next_fire_time(self, task_id):
+        """返回任务的下一次触发时间戳，不存在时返回None"""
+        with self._cond:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return None
+            for fire_ts, seq, tid in self._wheel.items():
+                if tid == task_id and seq == entry[1]:
+                    return fire_ts
+            return None
+
+    def start(self):
+        """启动调度线程，从每个任务上次触发（或创建）之后重新计算下次触发时间，
+        停止期间错过的触发会立即按错过策略处理"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._catchup.clear()
+            self._clock = None
+            self._rebuild(self._time())
+        self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止调度线程"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _push(self, task, after):
+        return self._push_at(task, self._next_fire(task, after))
+
+    def _push_at(self, task, fire_ts):
+        if fire_ts is None:
+            self._entries.pop(task['id'], None)
+            return False
+        seq = next(self._seq)
+        self._entries[task['id']] = (task, seq)
+        self._wheel.add(fire_ts, (fire_ts, seq, task['id']))
+        return True
+
+    def _is_live(self, item):
+        entry = self._entries.get(item[2])
+        return entry is not None and entry[1] == item[1]
+
+    def _load(self, tasks, after, resume=False):
+        add = self._wheel.add
+        for task in tasks:
+            start = after
+            if resume:
+                last = max(self._resume.get(task['id']) or 0, task.get('created') or 0)
+                if 0 < last < after:
+                    start = last
+            fire_ts = self._next_fire(task, start)
+            if fire_ts is None:
+                self._entries.pop(task['id'], None)
+                continue
+            seq = next(self._seq)
+            self._entries[task['id']] = (task, seq)
+            add(fire_ts, (fire_ts, seq, task['id']))
+        self._maybe_compact()
+
+    def _rebuild(self, after):
+        tasks = [task for task, _ in self._entries.values()]
+        self._wheel = HierarchicalWheel(after)
+        self._entries = {}
+        self._stale = 0
+        self._load(tasks, after, resume=True)
+
+    def _maybe_compact(self):
+        # 失效元素超过一半时整体重建，避免时间轮无限膨胀
+        if self._stale > 64 and self._stale * 2 > len(self._wheel):
+            self._wheel.compact(self._is_live)
+            self._stale = 0
+
+    def _check_drift(self):
+        """比较两次醒来之间墙上时间和单调时间走过的长度，返回跳变的秒数"""
+        wall, mono = self._time(), self._monotonic()
+        last, self._clock = self._clock, (wall, mono)
+        if last is None:
+            return 0.0
+        drift = (wall - last[0]) - (mono - last[1])
+        return drift if abs(drift) > DRIFT_THRESHOLD else 0.0
+
+    def _pop_wheel(self, now, due, misfired):
+        """取出所有到期的任务，错过的触发按策略放进补执行队列"""
+        for item in self._wheel.advance(now):
+            if not self._is_live(item):
+                self._stale -= 1
+                continue
+            task = self._entries[item[2]][0]
+            # 列出到现在为止的所有触发，下一次从最后一次之后算起，不会重复触发
+            missed, next_ts = missed_runs(task, item[0], now, self._next_fire)
+            retired = not self._push_at(task, next_ts)
+            runs, late = resolve_misfire(task, missed, now)
+            if not runs:
+                self._resume[task['id']] = missed[-1]
+            if late:
+                misfired.append((task, late, len(runs), retired and not runs))
+                queue = self._catchup.append
+            else:
+                queue = due.append
+            for i, fire_ts in enumerate(runs, 1):
+                queue((task, fire_ts, retired and i == len(runs)))
+
+    def _pop_catchup(self, due):
+        """取出一批补执行的触发，已删除或被替换的任务跳过"""
+        for _ in range(min(CATCHUP_BATCH, len(self._catchup))):
+            task, fire_ts, retired = item = self._catchup.popleft()
+            entry = self._entries.get(task['id'])
+            if retired or (entry is not None and entry[0] is task):
+                due.append(item)
+        self._catchup_at = self._monotonic() + CATCHUP_PAUSE
+
+    def _pop_due(self):
+        """在锁内等待直到有任务到期，返回(到期列表, 错过记录, 时间跳变秒数)；停止时返回None"""
+        while self._running:
+            drift = self._check_drift()
+            now = self._time()
+            due, misfired = [], []
+            self._pop_wheel(now, due, misfired)
+            # 按时到期的先处理，补执行的每批之间留出间隔，不会挤占分发队列
+            catchup_delay = self._catchup_at - self._monotonic() if self._catchup else None
+            if catchup_delay is not None and catchup_delay <= 0:
+                self._pop_catchup(due)
+                catchup_delay = CATCHUP_PAUSE if self._catchup else None
+            if due or misfired or drift:
+                for task, fire_ts, _ in due:
+                    self._resume[task['id']] = fire_ts
+                return due, misfired, drift
+            delays = [MAX_WAIT]
+            next_time = self._wheel.next_time()
+            if next_time is not None:
+                delays.append(next_time - now)
+            if catchup_delay is not None:
+                delays.append(catchup_delay)
+            self._cond.wait(min(delays))
+        return None
+
+    def next_wakeup(self):
+        """下一次需要调用 step() 的时间戳（可能是已失效的元素），没有任务时返回None"""
+        with self._cond:
+            if self._catchup:
+                return self._time()
+            return self._wheel.next_time()
+
+    def step(self):
+        """不启动调度线程，在当前线程里处理按时钟当前时间已经到期的任务，返回触发的次数"""
+        with self._cond:
+            due, misfired = [], []
+            self._pop_wheel(self._time(), due, misfired)
+            if self._catchup:
+                self._pop_catchup(due)
+            for task, fire_ts, _ in due:
+                self._resume[task['id']] = fire_ts
+        self._fire(due, misfired, 0.0)
+        return len(due)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                popped = self._pop_due()
+            if popped is None:
+                return
+            self._fire(*popped)
+
+    def _fire(self, due, misfired, drift):
+        """在锁外回调：时间跳变、错过记录，然后登记并执行到期的触发"""
+        if drift and self._on_drift is not None:
+            self._on_drift(drift)
+        for task, late, count, retired in misfired:
+            if self._on_misfire is not None:
+                self._on_misfire(task, late, count)
+            if retired and self._on_retire is not None:
+                self._on_retire(task)
+        if not due:
+            return
+        claimed = None
+        if self._claim is not None:
+            try:
+                claimed = self._claim([(task, fire_ts) for task, fire_ts, _ in due])
+            except Exception as e:
+                # 无法确认是否已执行过时宁可跳过，保证不重复执行
+                claimed = set()
+                if self._on_error is not None:
+                    for task, _, _ in due:
+                        self._on_error(task, e)
+        for task, fire_ts, retired in due:
+            if claimed is None or (task['id'], fire_ts) in claimed:
+                try:
+                    self._on_fire(task, fire_ts)
+                except Exception as e:
+                    if self._on_error is not None:
+                        self._on_error(task, e)
+            if retired and self._on_retire is not None:
+                self._on_retire(task)
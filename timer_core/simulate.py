@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+模拟运行
+
+用虚拟时钟驱动调度器，不发送任何推送、不运行任何命令，几秒钟内回放一周或一个月里
+全部任务的触发，上线前检查任务表会不会挤在一起、会不会有任务错过：
+
+    simulation = Simulation(engine.tasks.values(), engine.push_config, days=30)
+    simulation.run()
+    for line in simulation.format():
+        print(line)
+
+每次触发按 TimerEngine 的分法找到通道和推送目标，再用简单的容量模型估算推送什么时候
+能发出：每个通道按 dispatch 配置的并发数处理，每次发送占用 SERVICE_TIMES 里的秒数，
+限速规则用同样的令牌桶按虚拟时间计算，排队超过队列上限的推送记为丢弃。相同推送的
+合并、失败重试和命令的后续推送不在模拟范围内，估算出的排队时间偏保守。
+
+结果包括每次触发的时间线（可以写成CSV或JSON Lines）、每天和每分钟的触发数、同一秒
+发往同一目标的撞车、超过宽限期才能发出或被丢弃的触发，以及窗口内一次都不触发的任务。
+"""
+
+import csv
+import heapq
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+from .commands import is_command_task
+from .dispatch import DEFAULT_LIMITS, DEFAULT_QUEUE_SIZE
+from .engine import TimerEngine, merge_push_config
+from .misfire import misfire_policy
+from .ratelimit import RateLimiter
+from .scheduler import Scheduler
+from .taskio import FORMAT_CSV
+
+# 各通道单次发送（或命令运行）的估计耗时（秒）
+SERVICE_TIMES = {'smtp': 1.0, 'http': 0.2, 'command': 30.0}
+# 默认模拟的天数
+SIMULATE_DAYS = 7
+# 报告里每类问题最多列出的条数
+REPORT_TOP = 10
+# 每分钟触发数分布的区间下限
+LOAD_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+TIMELINE_FIELDS = ('fire_time', 'task_id', 'name', 'channel', 'endpoint', 'send_time', 'wait', 'status')
+
+
+class VirtualClock:
+    """虚拟时钟：time() 和 monotonic() 都返回拨到的时间，只能向前拨"""
+
+    def __init__(self, start):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def set(self, ts):
+        if ts > self.now:
+            self.now = ts
+
+
+def push_route(task, push_config):
+    """触发后的(通道, 推送目标, 限速键)，和 TimerEngine._delivery 的分法一致"""
+    if is_command_task(task):
+        return 'command', 'command', ()
+    config = task.get('push') or push_config
+    if config['type'] == 'smtp':
+        endpoint = f'smtp:{config["smtp"]["server"]}'
+        return 'smtp', endpoint, (endpoint, f'account:{config["smtp"]["user"]}')
+    endpoint = f'http:{TimerEngine.http_template(config["http"]).host}'
+    return 'http', endpoint, (endpoint,)
+
+
+def _format_ts(ts, fmt='%Y-%m-%d %H:%M:%S'):
+    return datetime.fromtimestamp(ts).strftime(fmt)
+
+
+class ChannelModel:
+    """一个通道的容量模型：workers 个并发按到达顺序处理，每次占用 service 秒
+
+    限速延后的推送进入队列的时间可能晚于之后到达的推送，所以工作线程的空闲时间和
+    排队推送的开始时间都用小顶堆保存，不依赖进入队列的先后。
+    """
+
+    def __init__(self, workers, service, queue_size):
+        self.workers = workers
+        self.service = service
+        self.queue_size = queue_size
+        self.fires = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._finishes = []   # 每个忙碌的工作线程空闲下来的时间
+        self._waiting = []    # 还在排队的推送的开始时间
+
+    def admit(self, ready):
+        """ready 时刻进入队列的推送，返回开始发送的时间；队列已满时返回None"""
+        self.fires += 1
+        waiting = self._waiting
+        while waiting and waiting[0] <= ready:
+            heapq.heappop(waiting)
+        if len(waiting) >= self.queue_size:
+            self.dropped += 1
+            return None
+        finishes = self._finishes
+        if len(finishes) < self.workers:
+            start = ready
+            heapq.heappush(finishes, start + self.service)
+        else:
+            # 最早空闲的工作线程接手
+            start = max(ready, finishes[0])
+            heapq.heapreplace(finishes, start + self.service)
+        if start > ready:
+            heapq.heappush(waiting, start)
+        return start
+
+    def stats(self):
+        sent = self.fires - self.dropped
+        return {
+            'fires': self.fires,
+            'dropped': self.dropped,
+            'avg_wait': round(self.total_wait / sent, 3) if sent else 0.0,
+            'max_wait': round(self.max_wait, 3),
+        }
+
+
+class Simulation:
+    """在虚拟时钟上回放 [start, start + days天) 内的全部触发并统计"""
+
+    def __init__(self, tasks, push_config=None, start=None, days=SIMULATE_DAYS, dispatch_limits=None,
+                 rate_limits=None, http_backend='thread', service_times=None, timeline=None,
+                 timeline_format=FORMAT_CSV, top=REPORT_TOP):
+        """tasks 是 prepare_task 校验过的任务；timeline 是写入每次触发的文本文件对象"""
+        self.tasks = list(tasks)
+        self.start = time.time() if start is None else float(start)
+        self.end = self.start + days * 86400
+        self.days = days
+        self.top = top
+        push_config = merge_push_config(push_config)
+        self.limiter = RateLimiter(rate_limits)
+        service = dict(SERVICE_TIMES, **(service_times or {}))
+        limits = dict(DEFAULT_LIMITS, **(dispatch_limits or {}))
+        self.channels = {name: ChannelModel(workers, service.get(name, 0.0), DEFAULT_QUEUE_SIZE)
+                         for name, workers in limits.items()}
+        if http_backend == 'async':
+            from .async_http import CONNECTION_LIMIT, MAX_PENDING
+            self.channels['http'] = ChannelModel(CONNECTION_LIMIT, service['http'], MAX_PENDING)
+        routes = {}
+        self._index = {task['id']: i for i, task in enumerate(self.tasks)}
+        self._routes = [routes.setdefault(route, route) for route in
+                        (push_route(task, push_config) for task in self.tasks)]
+        self._graces = [misfire_policy(task)[1] for task in self.tasks]
+        self._fired = [0] * len(self.tasks)
+        self.fires = 0
+        self.elapsed = 0.0
+        self.errors = Counter()
+        self.misfired = 0
+        self.minutes = Counter()       # 分钟（时间戳 // 60）-> 触发数
+        self.collisions = 0            # 同一秒同一目标有多个触发的次数
+        self._worst = []               # 小顶堆，保留最严重的 top 次撞车
+        self._second = None
+        self._same_second = {}         # 推送目标 -> 这一秒触发的任务序号
+        self.late = Counter()          # 任务序号 -> 超过宽限期才发出的次数
+        self._max_late = {}
+        self.dropped = Counter()       # 任务序号 -> 被丢弃的次数
+        self._timeline = None
+        if timeline is not None:
+            if timeline_format == FORMAT_CSV:
+                writer = csv.writer(timeline)
+                writer.writerow(TIMELINE_FIELDS)
+                self._timeline = writer.writerow
+            else:
+                self._timeline = lambda row: timeline.write(
+                    json.dumps(dict(zip(TIMELINE_FIELDS, row)), ensure_ascii=False) + '\n')
+
+    def run(self):
+        """回放整个时间窗口，返回自身"""
+        started = time.perf_counter()
+        clock = VirtualClock(self.start)
+        scheduler = Scheduler(self._on_fire, on_error=self._on_error, on_misfire=self._on_misfire, clock=clock)
+        # 正好在 start 触发的也算在窗口内
+        scheduler.add_many(self.tasks, after=self.start - 0.001)
+        while True:
+            ts = scheduler.next_wakeup()
+            if ts is None or ts >= self.end:
+                break
+            clock.set(ts)
+            scheduler.step()
+        self._flush_second()
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    def _on_fire(self, task, fire_ts):
+        idx = self._index[task['id']]
+        channel, endpoint, keys = self._routes[idx]
+        self.fires += 1
+        self._fired[idx] += 1
+        self.minutes[int(fire_ts // 60)] += 1
+        second = int(fire_ts)
+        if second != self._second:
+            self._flush_second()
+            self._second = second
+        self._same_second.setdefault(endpoint, []).append(idx)
+        ready = fire_ts + self.limiter.reserve(keys, now=fire_ts) if keys else fire_ts
+        model = self.channels[channel]
+        send_ts = model.admit(ready)
+        if send_ts is None:
+            self.dropped[idx] += 1
+            status, wait = 'dropped', None
+        else:
+            wait = send_ts - fire_ts
+            model.total_wait += wait
+            if wait > model.max_wait:
+                model.max_wait = wait
+            status = 'ok'
+            if wait > self._graces[idx]:
+                status = 'late'
+                self.late[idx] += 1
+                if wait > self._max_late.get(idx, 0.0):
+                    self._max_late[idx] = wait
+        if self._timeline is not None:
+            self._timeline((_format_ts(fire_ts), task['id'], task['name'], channel, endpoint,
+                            '' if send_ts is None else _format_ts(send_ts),
+                            '' if wait is None else round(wait, 3), status))
+
+    def _flush_second(self):
+        for endpoint, indexes in self._same_second.items():
+            if len(indexes) < 2:
+                continue
+            self.collisions += 1
+            item = (len(indexes), -self._second, endpoint, indexes[:3])
+            if len(self._worst) < self.top:
+                heapq.heappush(self._worst, item)
+            else:
+                heapq.heappushpop(self._worst, item)
+        self._same_second = {}
+
+    def _on_error(self, task, error):
+        self.errors[f'{task.get("name")}: {error}'] += 1
+
+    def _on_misfire(self, task, missed, count):
+        self.misfired += missed
+
+    def _name(self, idx):
+        return self.tasks[idx]['name']
+
+    def _task_counts(self, counter, extra=None):
+        rows = []
+        for idx, times in counter.most_common(self.top):
+            row = {'name': self._name(idx), 'times': times}
+            if extra is not None:
+                row['max_wait'] = round(extra[idx], 1)
+            rows.append(row)
+        return rows
+
+    def daily(self):
+        """{日期: 触发数}"""
+        days = Counter()
+        for minute, count in self.minutes.items():
+            days[_format_ts(minute * 60, '%Y-%m-%d')] += count
+        return dict(sorted(days.items()))
+
+    def load_histogram(self):
+        """每分钟触发数的分布：{区间: 分钟数}，0 表示窗口里没有触发的分钟"""
+        bounds = LOAD_BUCKETS[1:] + (None,)
+        labels = []
+        for low, high in zip(LOAD_BUCKETS, bounds):
+            if high is None:
+                labels.append(f'{low}+')
+            elif high - low == 1:
+                labels.append(str(low))
+            else:
+                labels.append(f'{low}-{high - 1}')
+        histogram = dict.fromkeys(labels, 0)
+        histogram[labels[0]] = int((self.end - self.start) // 60) - len(self.minutes)
+        for count in self.minutes.values():
+            for label, high in zip(labels, bounds):
+                if high is None or count < high:
+                    histogram[label] += 1
+                    break
+        return histogram
+
+    def to_dict(self):
+        """模拟结果，可以直接写成JSON"""
+        never = [task['name'] for task, fired in zip(self.tasks, self._fired) if not fired]
+        return {
+            'start': _format_ts(self.start),
+            'end': _format_ts(self.end),
+            'days': self.days,
+            'tasks': len(self.tasks),
+            'fires': self.fires,
+            'elapsed': round(self.elapsed, 2),
+            'channels': {name: model.stats() for name, model in self.channels.items() if model.fires},
+            'daily': self.daily(),
+            'busiest_minutes': [{'minute': _format_ts(minute * 60, '%Y-%m-%d %H:%M'), 'fires': count}
+                                for minute, count in self.minutes.most_common(self.top)],
+            'load_histogram': self.load_histogram(),
+            'collisions': {
+                'count': self.collisions,
+                'worst': [{'time': _format_ts(-second), 'endpoint': endpoint, 'tasks': count,
+                           'names': [self._name(idx) for idx in indexes]}
+                          for count, second, endpoint, indexes in sorted(self._worst, reverse=True)],
+            },
+            'late': {'count': sum(self.late.values()), 'tasks': self._task_counts(self.late, self._max_late)},
+            'dropped': {'count': sum(self.dropped.values()), 'tasks': self._task_counts(self.dropped)},
+            'never_fired': {'count': len(never), 'names': never[:self.top]},
+            'misfired': self.misfired,
+            'errors': dict(self.errors.most_common(self.top)),
+        }
+
+    def format(self):
+        """文字报告，每行一条"""
+        report = self.to_dict()
+        lines = [f'🧪 模拟 {report["start"]} ~ {report["end"]}（{self.days:g}天，{report["tasks"]}个任务）',
+                 f'✅ 共触发 {report["fires"]} 次，模拟用时 {report["elapsed"]}秒']
+        for name, stats in report['channels'].items():
+            lines.append(f'   {name}: {stats["fires"]}次，平均排队 {stats["avg_wait"]}秒，'
+                         f'最长排队 {stats["max_wait"]}秒，丢弃 {stats["dropped"]}次')
+        daily = report['daily']
+        if daily:
+            lines.append('📅 每天触发数:')
+            peak = max(daily.values())
+            for day, count in daily.items():
+                lines.append(f'   {day}  {count:>8}  {"█" * max(1, round(count / peak * 30))}')
+            lines.append('⏱️ 最忙的分钟:')
+            for item in report['busiest_minutes']:
+                lines.append(f'   {item["minute"]}  {item["fires"]}次')
+        lines.append('📊 每分钟触发数分布:')
+        for label, minutes in report['load_histogram'].items():
+            lines.append(f'   {label:>10}次/分钟  {minutes}分钟')
+        collisions = report['collisions']
+        if collisions['count']:
+            lines.append(f'💥 同一秒发往同一目标: {collisions["count"]} 次，最多的几次:')
+            for item in collisions['worst']:
+                names = '、'.join(item['names'])
+                more = '等' if item['tasks'] > len(item['names']) else ''
+                lines.append(f'   {item["time"]}  {item["endpoint"]}  {item["tasks"]}个任务（{names}{more}）')
+        if report['late']['count']:
+            lines.append(f'⚠️ 超过宽限期才能发出: {report["late"]["count"]} 次')
+            for item in report['late']['tasks']:
+                lines.append(f'   {item["name"]}  {item["times"]}次，最长排队 {item["max_wait"]}秒')
+        if report['dropped']['count']:
+            lines.append(f'❌ 队列已满被丢弃: {report["dropped"]["count"]} 次')
+            for item in report['dropped']['tasks']:
+                lines.append(f'   {item["name"]}  {item["times"]}次')
+        never = report['never_fired']
+        if never['count']:
+            more = f' 等{never["count"]}个' if never['count'] > len(never['names']) else ''
+            lines.append(f'💤 窗口内不会触发的任务: {"、".join(never["names"])}{more}')
+        for message, count in report['errors'].items():
+            lines.append(f'❌ 任务出错 {count}次: {message}')
+        return lines
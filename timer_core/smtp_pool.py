@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+SMTP连接池
+
+按(服务器, 账号)复用已经完成STARTTLS和登录的连接，取用前用NOOP检查连接是否
+还活着，断开时自动重连，空闲超时的连接由后台线程关闭。smtplib（连带ssl）在第一次连接时才导入。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+SMTP_PORT = 587
+# 空闲连接保留时间（秒），大多数邮箱服务器几分钟无操作就会断开
+IDLE_TIMEOUT = 60
+# 每个账号最多保留的空闲连接数
+MAX_IDLE = 4
+
+
+class SMTPPool:
+    """按(服务器, 账号)分组的已登录SMTP连接池"""
+
+    def __init__(self, port=SMTP_PORT, idle_timeout=IDLE_TIMEOUT, max_idle=MAX_IDLE, timeout=30, timing=None):
+        self.port = port
+        # timing(阶段, 服务器, 秒数) 记录 connect/login/send 各阶段耗时
+        self.timing = timing
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = {}   # (server, user) -> [(conn, last_used)]
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._closed = threading.Event()
+        self.connects = 0
+        self.reuses = 0
+
+    def _connect(self, server, user, password, timeout):
+        import smtplib
+
+        started = time.monotonic()
+        conn = smtplib.SMTP(server, self.port, timeout=timeout)
+        started = self.observe('connect', server, started)
+        try:
+            conn.starttls()
+            conn.login(user, password)
+        except Exception:
+            self._close(conn)
+            raise
+        self.observe('login', server, started)
+        self.connects += 1
+        return conn
+
+    def observe(self, stage, server, started):
+        """记录从started到现在的耗时，返回现在的时间"""
+        now = time.monotonic()
+        if self.timing is not None:
+            self.timing(stage, server, now - started)
+        return now
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            return conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _take_idle(self, key):
+        """取出一个可用的空闲连接，过期或已断开的直接关闭"""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                conn, last_used = idle.pop()
+            if now - last_used < self.idle_timeout and self._is_alive(conn):
+                self.reuses += 1
+                return conn
+            self._close(conn)
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle and not self._closed.is_set():
+                idle.append((conn, time.monotonic()))
+                conn = None
+        if conn is not None:
+            self._close(conn)
+        self._start_reaper()
+
+    @contextmanager
+    def connection(self, server, user, password, timeout=None, reuse=True):
+        """取得一个已登录的连接，可以在同一个会话里连续发送多封邮件
+
+        代码块内出现异常或reuse为False时，用完后关闭连接而不是放回连接池。
+        """
+        key = (server, user)
+        conn = self._take_idle(key)
+        if conn is None:
+            conn = self._connect(server, user, password, timeout or self.timeout)
+        elif timeout is not None and conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        try:
+            yield conn
+        except Exception:
+            self._close(conn)
+            raise
+        if reuse:
+            self._release(key, conn)
+        else:
+            self._close(conn)
+
+    def send(self, server, user, password, msg, timeout=None):
+        """发送一封邮件；复用的连接已被服务器断开时换新连接重试一次"""
+        import smtplib
+
+        try:
+            with self.connection(server, user, password, timeout) as conn:
+                started = time.monotonic()
+                conn.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection(server, user, password, timeout) as conn:
+                started = time.monotonic()
+                conn.send_message(msg)
+        self.observe('send', server, started)
+
+    def close_idle(self, max_age=None):
+        """关闭空闲超过max_age秒的连接，默认使用idle_timeout"""
+        max_age = self.idle_timeout if max_age is None else max_age
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = []
+                for conn, last_used in idle:
+                    (expired if now - last_used >= max_age else keep).append((conn, last_used))
+                self._idle[key] = keep
+        for conn, _ in expired:
+            self._close(conn)
+        return len(expired)
+
+    def close(self):
+        """关闭所有空闲连接并停止清理线程"""
+        self._closed.set()
+        self.close_idle(0)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None or self._closed.is_set():
+                return
+            self._reaper = threading.Thread(target=self._reap, name='smtp-reaper', daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        while not self._closed.wait(self.idle_timeout / 2):
+            self.close_idle()
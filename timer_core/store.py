@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+任务持久化
+
+使用WAL模式的SQLite保存任务定义和每次触发的执行记录：
+- 触发前先把同一批到期的触发写入 runs 表并提交（一次fsync），已经存在的
+  触发不会再执行，进程崩溃重启后也不会重复推送（最多执行一次）
+- 推送结果先放入内存缓冲，由后台线程定时批量写入
+- 超过保留期的执行记录由后台线程定时清理，每个任务的触发次数和最近一次触发时间
+  合并进 run_totals 表，{count} 和补算错过的触发不受清理影响
+- 重试用完仍失败的推送保存在 dead_letters 表，可以批量重放
+- 每次修改任务定义时 meta 表里的 tasks_version 加一，供多个实例发现彼此的修改
+"""
+
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# 执行结果批量写入的间隔（秒）
+FLUSH_INTERVAL = 0.5
+# 执行记录保留的时间和清理间隔（秒）
+RUN_RETENTION = 30 * 86400
+PRUNE_INTERVAL = 3600
+
+RUN_CLAIMED = 'claimed'
+RUN_OK = 'ok'
+RUN_FAILED = 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    fire_ts REAL,
+    channel TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    task_id TEXT NOT NULL,
+    fire_ts REAL NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (task_id, fire_ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_totals (
+    task_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    last_fire REAL NOT NULL
+);
+'''
+
+
+class TaskStore:
+    """SQLite任务库，可在多个线程中共用；run_retention 为 None 时不清理执行记录
+
+    后台线程定时写入缓冲的推送结果，写入失败时结果留在缓冲里下次重试，错误交给 log 记录。
+    readonly 为True时以只读方式打开已有的任务库（模拟运行用），不写入任何数据，
+    旧版本任务库里没有的表用空的临时表代替。
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, run_retention=RUN_RETENTION,
+                 prune_interval=PRUNE_INTERVAL, readonly=False, log=None):
+        self.path = path
+        self.readonly = readonly
+        self.log = log
+        self.run_retention = run_retention
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._results = deque()
+        self._closed = threading.Event()
+        self._flusher = None
+        if readonly:
+            self._conn = sqlite3.connect(f'{pathlib.Path(os.path.abspath(path)).as_uri()}?mode=ro', uri=True,
+                                         check_same_thread=False, isolation_level=None)
+            tables = {name for name, in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for statement in _SCHEMA.split(';'):
+                name = statement.split('EXISTS', 1)[-1].split('(', 1)[0].strip()
+                if name and name not in tables:
+                    self._conn.execute(statement.replace('CREATE TABLE', 'CREATE TEMP TABLE'))
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # WAL + FULL：每次提交都落盘，靠合并提交来减少fsync次数
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.executescript(_SCHEMA)
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                         name='store-flush', daemon=True)
+        self._flusher.start()
+
+    def _transaction(self, sql, rows, bump=None):
+        """在一个事务里执行批量写入，bump为计数器名时同时把它加一"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(sql, rows)
+                if bump is not None:
+                    self._conn.execute('INSERT INTO meta (key, value) VALUES (?, 1) '
+                                       'ON CONFLICT(key) DO UPDATE SET value = value + 1', (bump,))
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def save_task(self, task):
+        self.save_tasks([task])
+
+    def save_tasks(self, tasks):
+        """批量写入（或更新）任务定义，在一个事务里提交"""
+        self._transaction('INSERT OR REPLACE INTO tasks (id, data) VALUES (?, ?)',
+                          ((task['id'], json.dumps(dict(task), ensure_ascii=False)) for task in tasks), 'tasks_version')
+
+    def delete_task(self, task_id):
+        self.delete_tasks([task_id])
+
+    def delete_tasks(self, task_ids):
+        self._transaction('DELETE FROM tasks WHERE id = ?', ((task_id,) for task_id in task_ids), 'tasks_version')
+
+    def tasks_version(self):
+        """任务定义的修改次数，多个实例共用任务库时用来发现其他实例的修改"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'tasks_version'").fetchone()
+        return row[0] if row else 0
+
+    def load_tasks(self):
+        """读取全部任务"""
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM tasks ORDER BY rowid').fetchall()
+        loads = json.loads
+        return [loads(data) for data, in rows]
+
+    def iter_tasks(self, batch_size=1000):
+        """按批读取全部任务，不会一次把所有任务读进内存"""
+        loads = json.loads
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute('SELECT rowid, data FROM tasks WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                                          (last, batch_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for _, data in rows:
+                yield loads(data)
+
+    def claim_runs(self, runs):
+        """登记一批即将执行的触发[(task_id, fire_ts)]，返回本次新登记成功的集合
+
+        已登记过的触发（例如崩溃前已经执行）不会出现在返回值里。
+        """
+        claimed = set()
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for task_id, fire_ts in runs:
+                    cursor = self._conn.execute(
+                        'INSERT OR IGNORE INTO runs (task_id, fire_ts, status, updated) VALUES (?, ?, ?, ?)',
+                        (task_id, fire_ts, RUN_CLAIMED, now))
+                    if cursor.rowcount:
+                        claimed.add((task_id, fire_ts))
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return claimed
+
+    def record_result(self, task_id, fire_ts, ok):
+        """记录推送结果，由后台线程批量写入"""
+        self._results.append((RUN_OK if ok else RUN_FAILED, time.time(), task_id, fire_ts))
+
+    def last_runs(self):
+        """每个任务最近一次触发的时间戳（包括已经清理的执行记录）"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT task_id, MAX(fire_ts) FROM (SELECT task_id, fire_ts FROM runs '
+                'UNION ALL SELECT task_id, last_fire FROM run_totals) GROUP BY task_id').fetchall()
+        return dict(rows)
+
+    def run_counts(self):
+        """每个任务已触发的次数（包括已经清理的执行记录）"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT task_id, SUM(n) FROM (SELECT task_id, COUNT(*) AS n FROM runs GROUP BY task_id '
+                'UNION ALL SELECT task_id, count FROM run_totals) GROUP BY task_id').fetchall()
+        return dict(rows)
+
+    def run_status(self, task_id, fire_ts):
+        with self._lock:
+            row = self._conn.execute('SELECT status FROM runs WHERE task_id = ? AND fire_ts = ?',
+                                     (task_id, fire_ts)).fetchone()
+        return row[0] if row else None
+
+    def prune_runs(self, before):
+        """删除before之前的执行记录，次数和最近一次触发时间合并进 run_totals，返回删除的条数"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    'INSERT INTO run_totals (task_id, count, last_fire) '
+                    'SELECT task_id, COUNT(*), MAX(fire_ts) FROM runs WHERE fire_ts < ? GROUP BY task_id '
+                    'ON CONFLICT(task_id) DO UPDATE SET count = count + excluded.count, '
+                    'last_fire = MAX(last_fire, excluded.last_fire)', (before,))
+                deleted = self._conn.execute('DELETE FROM runs WHERE fire_ts < ?', (before,)).rowcount
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return deleted
+
+    def add_dead_letter(self, task_id, fire_ts, channel, payload, error, attempts):
+        self._transaction(
+            'INSERT INTO dead_letters (task_id, fire_ts, channel, payload, error, attempts, created) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(task_id, fire_ts, channel, json.dumps(payload, ensure_ascii=False), error, attempts, time.time())])
+
+    def list_dead_letters(self, limit=None):
+        sql = 'SELECT id, task_id, fire_ts, channel, payload, error, attempts, created FROM dead_letters ORDER BY id'
+        with self._lock:
+            if limit:
+                rows = self._conn.execute(sql + ' LIMIT ?', (limit,)).fetchall()
+            else:
+                rows = self._conn.execute(sql).fetchall()
+        keys = ('id', 'task_id', 'fire_ts', 'channel', 'payload', 'error', 'attempts', 'created')
+        items = [dict(zip(keys, row)) for row in rows]
+        for item in items:
+            item['payload'] = json.loads(item['payload'])
+        return items
+
+    def delete_dead_letters(self, ids):
+        self._transaction('DELETE FROM dead_letters WHERE id = ?', ((item_id,) for item_id in ids))
+
+    def flush(self):
+        """把缓冲的推送结果写入数据库"""
+        results = []
+        while self._results:
+            results.append(self._results.popleft())
+        if results:
+            try:
+                self._transaction('UPDATE runs SET status = ?, updated = ? WHERE task_id = ? AND fire_ts = ?',
+                                  results)
+            except sqlite3.Error:
+                # 写入失败时放回队列，下次重试，不丢掉结果
+                self._results.extendleft(reversed(results))
+                raise
+
+    def _flush_loop(self, interval):
+        pruned = time.monotonic()
+        while not self._closed.wait(interval):
+            try:
+                self.flush()
+                if self.run_retention is not None and time.monotonic() - pruned >= self.prune_interval:
+                    pruned = time.monotonic()
+                    self.prune_runs(time.time() - self.run_retention)
+            except sqlite3.Error as e:
+                if self.log is not None:
+                    self.log(f'❌ 任务库写入失败: {e}')
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+任务批量导入导出
+
+支持 JSON Lines（每行一个任务对象）和 CSV（表头为 TASK_FIELDS 中的字段，
+push 列和参数列表形式的 command 列是JSON字符串）。读取时逐行解析，不会把整个文件读进内存；
+格式有误的行作为错误返回，不影响其他行。校验通过的任务分批写入任务库，
+全部读完后一次性放入调度器。运行命令的任务只有调用方传入 allow_commands=True
+（命令行导入）时才会导入，窗口里导入别人发来的文件不会带进可以执行的命令。
+"""
+
+import csv
+import json
+
+from .commands import is_command_task
+from .config import stable_task_id
+from .engine import strip_password
+
+FORMAT_JSONL = 'jsonl'
+FORMAT_CSV = 'csv'
+FORMATS = (FORMAT_JSONL, FORMAT_CSV)
+# CSV的列，也是导入时保留的字段
+TASK_FIELDS = ('id', 'name', 'time', 'repeat', 'date', 'misfire', 'grace', 'digest', 'created', 'push',
+               'command', 'callable', 'cwd', 'timeout', 'cpu_limit', 'memory_limit', 'notify')
+_NUMBER_FIELDS = ('grace', 'created', 'timeout', 'cpu_limit', 'memory_limit')
+_TRUE_VALUES = ('1', 'true', 'yes', '是')
+# 导入结果里最多保留的错误明细条数
+MAX_ERRORS = 100
+# 每批写入任务库的任务数
+IMPORT_BATCH = 1000
+
+
+def detect_format(path):
+    """按扩展名判断文件格式"""
+    lower = path.lower()
+    if lower.endswith('.csv'):
+        return FORMAT_CSV
+    if lower.endswith(('.jsonl', '.ndjson', '.json')):
+        return FORMAT_JSONL
+    raise ValueError(f'无法识别的文件格式: {path}（支持 .jsonl 和 .csv）')
+
+
+def _normalize(task):
+    """只保留已知字段，没有id时按内容生成固定id，重复导入不会产生重复任务"""
+    if not isinstance(task, dict):
+        raise ValueError('每一行必须是一个任务对象')
+    task = {field: task[field] for field in TASK_FIELDS if task.get(field) not in (None, '')}
+    task.setdefault('id', stable_task_id(task))
+    return task
+
+
+def iter_jsonl(lines):
+    """逐行解析JSON Lines，产出(行号, 任务)；格式有误的行产出(行号, ValueError)"""
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, _normalize(json.loads(line))
+        except ValueError as e:
+            yield line_no, ValueError(str(e))
+
+
+def iter_csv(lines):
+    """逐行解析CSV，产出(行号, 任务)；格式有误的行产出(行号, ValueError)"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        line_no = reader.line_num
+        try:
+            for field in _NUMBER_FIELDS:
+                if row.get(field):
+                    row[field] = float(row[field])
+            if row.get('digest'):
+                row['digest'] = row['digest'].strip().lower() in _TRUE_VALUES
+            if row.get('push'):
+                row['push'] = json.loads(row['push'])
+            if (row.get('command') or '').startswith('["'):
+                # 参数列表形式的命令按JSON数组保存
+                row['command'] = json.loads(row['command'])
+            yield line_no, _normalize(row)
+        except ValueError as e:
+            yield line_no, ValueError(str(e))
+
+
+def iter_tasks(f, fmt):
+    return iter_csv(f) if fmt == FORMAT_CSV else iter_jsonl(f)
+
+
+def _exportable(task):
+    row = dict(task)
+    if row.get('push'):
+        row['push'] = strip_password(row['push'])
+    return row
+
+
+def write_tasks(tasks, f, fmt):
+    """把任务逐个写入文件，返回写入的数量；SMTP密码不会导出"""
+    count = 0
+    if fmt == FORMAT_CSV:
+        writer = csv.DictWriter(f, TASK_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for task in tasks:
+            row = _exportable(task)
+            for field in ('push', 'command'):
+                if row.get(field) and not isinstance(row[field], str):
+                    row[field] = json.dumps(row[field], ensure_ascii=False)
+            writer.writerow(row)
+            count += 1
+    else:
+        dumps = json.dumps
+        for task in tasks:
+            f.write(dumps(_exportable(task), ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+class ImportResult:
+    """导入结果：成功数量和出错的行"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []   # [(行号, 错误信息)]，最多 MAX_ERRORS 条
+
+    def error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line_no, str(message)))
+
+
+def import_tasks(engine, rows, batch_size=IMPORT_BATCH, allow_commands=False):
+    """把(行号, 任务)逐个校验后批量加入引擎，返回 ImportResult；allow_commands 为False时运行命令的任务记为错误"""
+    result = ImportResult()
+    lines = {}   # 任务id -> 第一次出现的行号
+
+    def valid():
+        for line_no, task in rows:
+            if isinstance(task, Exception):
+                result.error(line_no, task)
+                continue
+            first = lines.setdefault(task['id'], line_no)
+            if first != line_no:
+                # 没有id的行按名称、时间、重复方式和日期生成id，这几项相同时后面的行会覆盖前面的
+                result.error(line_no, f'和第{first}行的任务id相同: {task["id"]}')
+                continue
+            if not allow_commands and is_command_task(task):
+                result.error(line_no, '不允许导入运行命令的任务')
+                continue
+            try:
+                yield engine.prepare_task(task)
+            except (KeyError, TypeError, ValueError) as e:
+                result.error(line_no, e)
+
+    result.imported = engine.add_tasks(valid(), batch_size)
+    return result
+
+
+def import_file(engine, path, fmt=None, allow_commands=False):
+    """从JSON Lines或CSV文件导入任务"""
+    fmt = fmt or detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return import_tasks(engine, iter_tasks(f, fmt), allow_commands=allow_commands)
+
+
+def export_file(tasks, path, fmt=None):
+    """把任务导出到JSON Lines或CSV文件，返回导出的数量"""
+    fmt = fmt or detect_format(path)
+    # CSV带BOM，Excel打开时中文不会乱码
+    with open(path, 'w', encoding='utf-8-sig' if fmt == FORMAT_CSV else 'utf-8', newline='') as f:
+        return write_tasks(tasks, f, fmt)
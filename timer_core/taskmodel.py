@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的任务对象
+
+任务原来是普通dict，几十万个任务时每个任务要占约2KB：dict本身、从JSON解析出来的
+重复字符串（时间、日期、重复方式）以及每个任务各自一份的推送配置。Task 用
+__slots__ 保存固定字段，重复方式存成整数编码，时间和日期字符串驻留共用，
+内容相同的推送配置只保留一份，创建时间存成整数秒。
+
+Task 支持 task['name']、task.get('push')、dict(task) 等只读dict用法，
+原来按dict处理任务的代码不需要修改；写入任务库或导出时用 dict(task) 转回dict。
+"""
+
+import json
+import sys
+
+from .recurrence import REPEAT_MODES
+
+# 重复方式 <-> 整数编码
+REPEAT_CODES = {mode: code for code, mode in enumerate(REPEAT_MODES)}
+# 任务的固定字段，按这个顺序输出；其他字段放在 extra 里
+FIELDS = ('id', 'name', 'time', 'repeat', 'date', 'misfire', 'grace', 'digest', 'created', 'push')
+# 共用的推送配置最多缓存多少份，超过后清空重新开始
+PUSH_CACHE_SIZE = 4096
+
+_MISSING = object()
+_pushes = {}
+
+
+def shared_push(push):
+    """内容相同的推送配置返回同一个dict（调用方不能再修改它）"""
+    if not push:
+        return push
+    key = json.dumps(push, sort_keys=True, ensure_ascii=False)
+    shared = _pushes.get(key)
+    if shared is None:
+        if len(_pushes) >= PUSH_CACHE_SIZE:
+            _pushes.clear()
+        shared = _pushes[key] = push
+    return shared
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Task:
+    """用 __slots__ 保存的任务，按dict的方式读取字段，缺少的字段和dict一样抛出KeyError"""
+
+    __slots__ = ('id', 'name', 'time', 'code', 'date', 'misfire', 'grace', 'digest', 'created', 'push', 'extra')
+
+    def __init__(self, fields=(), **kwargs):
+        for slot in self.__slots__:
+            setattr(self, slot, None)
+        for key, value in dict(fields, **kwargs).items():
+            self[key] = value
+
+    @classmethod
+    def from_mapping(cls, task):
+        """dict（或Task）转换成Task，已经是Task时原样返回"""
+        return task if isinstance(task, cls) else cls(task)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key == 'repeat':
+            return default if self.code is None else REPEAT_MODES[self.code]
+        if key in FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default if self.extra is None else self.extra.get(key, default)
+
+    def __setitem__(self, key, value):
+        if key == 'repeat':
+            if value not in REPEAT_CODES:
+                raise ValueError(f'未知的重复方式: {value}')
+            self.code = REPEAT_CODES[value]
+        elif key in ('time', 'date', 'misfire'):
+            setattr(self, key, _intern(value))
+        elif key == 'created':
+            self.created = None if value is None else int(value)
+        elif key == 'push':
+            self.push = shared_push(value)
+        elif key in FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        keys = [key for key in FIELDS if key in self]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def __eq__(self, other):
+        if isinstance(other, (Task, dict)):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'Task({dict(self)!r})'
+
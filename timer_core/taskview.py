@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+任务列表的视图模型
+
+界面上的任务列表只显示当前可见的几十行，这里按下次触发时间维护全部任务的
+有序索引，界面按位置取出要显示的行。增删一个任务只调整一个分块（二分查找
+定位），不重建整个列表；过滤条件变化时才重新筛选一遍。
+"""
+
+import bisect
+import time
+
+from .recurrence import next_fire_time
+
+# 有序索引每个分块的最大长度
+CHUNK_SIZE = 512
+# 不再触发的任务排在最后
+NEVER = float('inf')
+
+
+class SortedKeys:
+    """分块的有序列表：插入删除先二分找到分块，再在分块内二分，按位置取值时跳过前面的分块"""
+
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self._chunks = [keys[i:i + CHUNK_SIZE] for i in range(0, len(keys), CHUNK_SIZE)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(keys)
+
+    def __len__(self):
+        return self._len
+
+    def _locate(self, key):
+        return min(bisect.bisect_left(self._maxes, key), len(self._chunks) - 1)
+
+    def add(self, key):
+        if not self._chunks:
+            self._chunks.append([key])
+            self._maxes.append(key)
+        else:
+            i = self._locate(key)
+            chunk = self._chunks[i]
+            bisect.insort(chunk, key)
+            self._maxes[i] = chunk[-1]
+            if len(chunk) > CHUNK_SIZE * 2:
+                half = len(chunk) // 2
+                self._chunks[i:i + 1] = [chunk[:half], chunk[half:]]
+                self._maxes[i:i + 1] = [chunk[half - 1], chunk[-1]]
+        self._len += 1
+
+    def discard(self, key):
+        """删除key，不存在时返回False"""
+        if not self._chunks:
+            return False
+        i = self._locate(key)
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        if j == len(chunk) or chunk[j] != key:
+            return False
+        del chunk[j]
+        self._len -= 1
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i], self._maxes[i]
+        return True
+
+    def first(self):
+        return self._chunks[0][0] if self._chunks else None
+
+    def index(self, key):
+        """key所在的位置，不存在时返回None"""
+        if not self._chunks:
+            return None
+        i = self._locate(key)
+        chunk = self._chunks[i]
+        j = bisect.bisect_left(chunk, key)
+        if j == len(chunk) or chunk[j] != key:
+            return None
+        return sum(len(c) for c in self._chunks[:i]) + j
+
+    def slice(self, start, count):
+        """从位置start开始取count个key"""
+        out = []
+        for chunk in self._chunks:
+            if start >= len(chunk):
+                start -= len(chunk)
+                continue
+            out.extend(chunk[start:start + count - len(out)])
+            start = 0
+            if len(out) >= count:
+                break
+        return out
+
+
+class TaskView:
+    """按下次触发时间排序、可过滤的任务列表，按 task_id 增删
+
+    行是(任务, 下次触发时间戳或None)。下次触发时间在加入时计算，
+    refresh() 把已经过了触发时间的任务重新计算后放回正确的位置。
+    """
+
+    def __init__(self, next_fire=next_fire_time, clock=time.time):
+        self._next_fire = next_fire
+        self._clock = clock
+        self._tasks = {}    # task_id -> task
+        self._keys = {}     # task_id -> (下次触发时间, task_id)
+        self._all = SortedKeys()
+        self._shown = self._all
+        self._text = ''
+        self._repeat = None
+
+    def __len__(self):
+        """过滤后的行数"""
+        return len(self._shown)
+
+    @property
+    def total(self):
+        return len(self._all)
+
+    @property
+    def filtered(self):
+        return self._shown is not self._all
+
+    def _key(self, task, now):
+        try:
+            fire_ts = self._next_fire(task, now)
+        except (KeyError, ValueError):
+            fire_ts = None
+        return (NEVER if fire_ts is None else fire_ts, task['id'])
+
+    def _matches(self, task):
+        if self._repeat and task.get('repeat') != self._repeat:
+            return False
+        text = self._text
+        return not text or text in task.get('name', '').lower() or text in str(task.get('time', '')).lower()
+
+    def set_tasks(self, tasks):
+        """用一批任务重建列表"""
+        now = self._clock()
+        self._tasks = {task['id']: task for task in tasks}
+        self._keys = {task_id: self._key(task, now) for task_id, task in self._tasks.items()}
+        self._all = SortedKeys(self._keys.values())
+        self._apply_filter()
+
+    def upsert(self, task, now=None):
+        """加入或更新一个任务"""
+        self.remove(task['id'])
+        key = self._key(task, self._clock() if now is None else now)
+        self._tasks[task['id']] = task
+        self._keys[task['id']] = key
+        self._all.add(key)
+        if self.filtered and self._matches(task):
+            self._shown.add(key)
+
+    def remove(self, task_id):
+        """删除任务，返回被删除的任务，不存在时返回None"""
+        task = self._tasks.pop(task_id, None)
+        if task is not None:
+            key = self._keys.pop(task_id)
+            self._all.discard(key)
+            if self.filtered:
+                self._shown.discard(key)
+        return task
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def set_filter(self, text='', repeat=None):
+        """按名称或时间里包含的文字、重复方式过滤，都为空时显示全部"""
+        self._text = (text or '').strip().lower()
+        self._repeat = repeat or None
+        self._apply_filter()
+
+    def _apply_filter(self):
+        if not self._text and not self._repeat:
+            self._shown = self._all
+        else:
+            self._shown = SortedKeys(self._keys[task_id] for task_id, task in self._tasks.items()
+                                     if self._matches(task))
+
+    def refresh(self, now=None):
+        """把下次触发时间已过的任务重新排序，返回是否有变化"""
+        now = self._clock() if now is None else now
+        changed = False
+        while True:
+            key = self._all.first()
+            if key is None or key[0] > now:
+                return changed
+            self.upsert(self._tasks[key[1]], now)
+            changed = True
+            if self._keys[key[1]] == key:
+                return changed
+
+    def rows(self, start, count):
+        """从过滤后的第start行开始取count行[(任务, 下次触发时间戳或None)]"""
+        return [(self._tasks[task_id], None if fire_ts == NEVER else fire_ts)
+                for fire_ts, task_id in self._shown.slice(start, count)]
+
+    def index(self, task_id):
+        """任务在过滤后列表里的位置，不在列表里时返回None"""
+        key = self._keys.get(task_id)
+        return None if key is None else self._shown.index(key)
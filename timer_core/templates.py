@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+推送内容模板
+
+邮件主题、正文、收件人以及HTTP地址、请求头和请求体中的字符串都可以使用占位符：
+
+    {now}        实际触发时间，可带格式 {now:%H:%M}
+    {fire_time}  计划触发时间
+    {date}       触发日期 YYYY-MM-DD
+    {time}       触发时间 HH:MM
+    {task_name}  任务名称
+    {count}      该任务第几次执行，可带格式 {count:03d}
+    {exit_code}  命令任务的退出码（命令任务运行后的推送里才有值）
+    {output}     命令任务最后几行输出
+
+模板只在第一次使用时解析，解析结果按文本缓存（LRU淘汰），渲染只是拼接字符串。
+未知的占位符原样保留，所以JSON里的花括号不受影响。
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+
+PLACEHOLDERS = frozenset(['now', 'fire_time', 'date', 'time', 'task_name', 'count', 'exit_code', 'output'])
+# 缓存的模板数量
+TEMPLATE_CACHE_SIZE = 4096
+
+_FIELD_RE = re.compile(r'\{(\w+)(?::([^{}]*))?\}')
+
+
+class Template:
+    """已解析的模板：parts 为字面量字符串和(占位符, 格式)交替组成的列表"""
+
+    __slots__ = ('text', 'parts', 'static')
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = []
+        pos = 0
+        for match in _FIELD_RE.finditer(text):
+            name, spec = match.group(1), match.group(2)
+            if name not in PLACEHOLDERS:
+                continue
+            if match.start() > pos:
+                self.parts.append(text[pos:match.start()])
+            self.parts.append((name, spec))
+            pos = match.end()
+        if pos < len(text):
+            self.parts.append(text[pos:])
+        self.static = all(isinstance(part, str) for part in self.parts)
+
+    def render(self, context):
+        if self.static:
+            return self.text
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                name, spec = part
+                value = context[name]
+                out.append(format(value, spec) if spec else str(value))
+        return ''.join(out)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text):
+    """解析模板，相同文本共享同一个解析结果"""
+    return Template(text)
+
+
+def render(text, context):
+    return compile_template(text).render(context)
+
+
+def render_context(task, fire_ts=None, count=0, now=None, extra=None):
+    """构造渲染模板用的变量，时间类变量用到时才计算；extra 是额外的变量（如命令的退出码）"""
+    return RenderContext(task, fire_ts, count, now, extra)
+
+
+class RenderContext(dict):
+    """按需计算的模板变量"""
+
+    def __init__(self, task, fire_ts=None, count=0, now=None, extra=None):
+        super().__init__(task_name=task.get('name', ''), count=count, **(extra or {}))
+        self._fire_ts = fire_ts
+        self._now = now
+
+    def __missing__(self, key):
+        if key == 'now':
+            value = _Timestamp(self._now or datetime.now())
+        elif key == 'fire_time':
+            value = _Timestamp(datetime.fromtimestamp(self._fire_ts) if self._fire_ts is not None
+                               else self['now'])
+        elif key == 'date':
+            value = self['fire_time'].strftime('%Y-%m-%d')
+        elif key == 'time':
+            value = self['fire_time'].strftime('%H:%M')
+        elif key in ('exit_code', 'output'):
+            value = ''
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+
+class _Timestamp(datetime):
+    """不带格式时输出到秒的时间"""
+
+    def __new__(cls, value):
+        return datetime.__new__(cls, value.year, value.month, value.day,
+                                value.hour, value.minute, value.second)
+
+    def __str__(self):
+        return self.strftime('%Y-%m-%d %H:%M:%S')
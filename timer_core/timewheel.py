@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+时间轮
+
+- TimingWheel：用一个线程驱动的哈希时间轮管理大量短期定时器（如重试退避），插入和
+  取消都是O(1)，不需要为每个定时器开线程或睡眠。没有定时器时线程在条件变量上等待，不会空转。
+- HierarchicalWheel：按墙上时间毫秒计的多层时间轮，不带线程，供调度器存放任务的下一次
+  触发。插入O(1)，到期时按层逐级下沉，每个元素最多下沉 LEVELS 次；next_tick() 给出
+  下一个需要醒来的时刻，中间没有到期元素的格子直接跳过，不需要逐格轮询。
+"""
+
+import threading
+import time
+from operator import itemgetter
+
+# 每格的时长（秒）和格数，一圈覆盖 TICK * SLOTS 秒，更长的延迟按圈数计
+TICK = 0.1
+SLOTS = 512
+# 多层时间轮：每层256格，第0层每格1毫秒，第k层每格256^k毫秒，5层覆盖约34年
+WHEEL_BITS = 8
+WHEEL_SLOTS = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SLOTS - 1
+LEVELS = 5
+# 系统时间回拨超过这么多毫秒时重新分配所有元素，更小的回拨只是暂停推进
+REWIND_THRESHOLD = 1000
+_FULL = (1 << WHEEL_SLOTS) - 1
+
+
+def _next_slot(bitmap, pos):
+    """位图里从pos之后（循环）第一个有元素的格子离pos的格数，1..WHEEL_SLOTS，转一圈回到pos本身是WHEEL_SLOTS"""
+    rotated = ((bitmap >> (pos + 1)) | (bitmap << (WHEEL_SLOTS - pos - 1))) & _FULL
+    return (rotated & -rotated).bit_length()
+
+
+class WheelTimer:
+    """时间轮中的一个定时器"""
+
+    __slots__ = ('deadline', 'rounds', 'func', 'args', 'cancelled')
+
+    def __init__(self, deadline, rounds, func, args):
+        self.deadline = deadline
+        self.rounds = rounds
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimingWheel:
+    """单层哈希时间轮"""
+
+    def __init__(self, tick=TICK, slots=SLOTS, on_error=None):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.on_error = on_error
+        self._cond = threading.Condition()
+        self._count = 0
+        self._firing = 0    # 已取出、正在回调的定时器
+        self._tick_no = 0
+        self._origin = time.monotonic()
+        self._running = False
+        self._thread = None
+
+    def __len__(self):
+        """还没有执行完的定时器数量（包括正在回调的）"""
+        return self._count + self._firing
+
+    def schedule(self, delay, func, *args):
+        """delay秒后在时间轮线程里调用func(*args)，返回可取消的定时器"""
+        self.start()
+        with self._cond:
+            now = time.monotonic()
+            if self._count == 0:
+                # 空闲后重新对齐起点，避免补走空闲期间的格子
+                self._origin = now
+                self._tick_no = 0
+            ticks = max(1, int((now + delay - self._origin) / self.tick + 0.999999) - self._tick_no)
+            rounds, offset = divmod(ticks - 1, len(self.slots))
+            timer = WheelTimer(now + delay, rounds, func, args)
+            self.slots[(self._tick_no + offset + 1) % len(self.slots)].append(timer)
+            self._count += 1
+            self._cond.notify()
+        return timer
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='timing-wheel', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _advance(self):
+        """等到下一格并取出到期的定时器，停止时返回None"""
+        while self._running:
+            if self._count == 0:
+                self._cond.wait()
+                continue
+            deadline = self._origin + (self._tick_no + 1) * self.tick
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            self._tick_no += 1
+            slot = self.slots[self._tick_no % len(self.slots)]
+            due, keep = [], []
+            for timer in slot:
+                if timer.cancelled:
+                    self._count -= 1
+                elif timer.rounds > 0:
+                    timer.rounds -= 1
+                    keep.append(timer)
+                else:
+                    self._count -= 1
+                    due.append(timer)
+            slot[:] = keep
+            if due:
+                self._firing = len(due)
+                return due
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._advance()
+            if due is None:
+                return
+            for timer in due:
+                try:
+                    timer.func(*timer.args)
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(e)
+            with self._cond:
+                self._firing = 0
+
+
+class HierarchicalWheel:
+    """多层时间轮：add(到期时间戳, 元素)，advance(当前时间戳) 取出所有已到期的元素
+
+    时间按毫秒取整（到期时间向上取整，不会提前）。第k层的格子按到期时间的第k段位
+    （每段8位）分配，当前时间越过第k层一格的起点时把这一格的元素重新放到更低的层。
+    元素本身不能单独删除，调用方按惰性删除处理（取出时判断是否还有效）。
+    不是线程安全的，由调用方加锁。
+    """
+
+    def __init__(self, now=None):
+        self._levels = [[[] for _ in range(WHEEL_SLOTS)] for _ in range(LEVELS)]
+        self._counts = [0] * LEVELS
+        self._occupied = [0] * LEVELS   # 每层有元素的格子的位图，next_tick() 不用逐格查找
+        self._expired = []      # 放入时已经到期的元素
+        self._tick = int((time.time() if now is None else now) * 1000)  # 已处理到的毫秒
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, fire_ts, item):
+        self._place(-int(-fire_ts * 1000 // 1), item)
+        self._len += 1
+
+    def _place(self, expiry, item):
+        delta = expiry - self._tick
+        if delta <= 0:
+            self._expired.append((expiry, item))
+            return
+        level = (delta.bit_length() - 1) // WHEEL_BITS
+        if level >= LEVELS:
+            # 超出最高层的范围：先放在最高层最远的一格，到时再重新分配
+            level = LEVELS - 1
+            index = ((self._tick >> (WHEEL_BITS * level)) + WHEEL_MASK) & WHEEL_MASK
+        else:
+            index = (expiry >> (WHEEL_BITS * level)) & WHEEL_MASK
+        self._levels[level][index].append((expiry, item))
+        self._counts[level] += 1
+        self._occupied[level] |= 1 << index
+
+    def items(self):
+        """所有元素（无序）"""
+        out = [item for _, item in self._expired]
+        for level in self._levels:
+            for slot in level:
+                out.extend(item for _, item in slot)
+        return out
+
+    def compact(self, keep):
+        """只保留 keep(元素) 为真的元素，用于清理惰性删除留下的失效元素"""
+        self._expired = [entry for entry in self._expired if keep(entry[1])]
+        total = len(self._expired)
+        for level, slots in enumerate(self._levels):
+            count = 0
+            for index, slot in enumerate(slots):
+                if slot:
+                    slot[:] = [entry for entry in slot if keep(entry[1])]
+                    count += len(slot)
+                    if not slot:
+                        self._occupied[level] &= ~(1 << index)
+            self._counts[level] = count
+            total += count
+        self._len = total
+
+    def next_tick(self):
+        """下一个需要处理的毫秒（有元素到期或需要下沉），没有元素时返回None"""
+        if self._expired:
+            return self._tick
+        tick = self._tick
+        best = None
+        occupied = self._occupied
+        if occupied[0]:
+            # 第0层当前这一格已经处理过，转一圈回到它不算
+            i = _next_slot(occupied[0], tick & WHEEL_MASK)
+            if i < WHEEL_SLOTS:
+                best = tick + i
+        for level in range(1, LEVELS):
+            shift = WHEEL_BITS * level
+            block = tick >> shift
+            # 这一层最早也要到下一格的起点
+            if not occupied[level] or (best is not None and (block + 1) << shift >= best):
+                continue
+            start = (block + _next_slot(occupied[level], block & WHEEL_MASK)) << shift
+            if best is None or start < best:
+                best = start
+        return best
+
+    def next_time(self):
+        """下一个需要处理的时间戳，没有元素时返回None"""
+        tick = self.next_tick()
+        return None if tick is None else tick / 1000
+
+    def advance(self, now):
+        """把时间推进到now，返回所有到期的元素（按到期时间的先后）"""
+        target = int(now * 1000)
+        if target < self._tick - REWIND_THRESHOLD:
+            self._rewind(target)
+        target = max(target, self._tick)
+        # 放入时已经到期的元素按放入的先后保存，取出时按到期时间排序
+        due = [item for _, item in sorted(self._expired, key=itemgetter(0))]
+        self._expired = []
+        while True:
+            tick = self.next_tick()
+            if tick is None or tick > target:
+                self._tick = target
+                break
+            self._tick = tick
+            # 先从高层往低层下沉，下沉到这一毫秒的元素会进入 _expired
+            for level in range(LEVELS - 1, 0, -1):
+                shift = WHEEL_BITS * level
+                if self._counts[level] and not tick & ((1 << shift) - 1):
+                    index = (tick >> shift) & WHEEL_MASK
+                    slot = self._levels[level][index]
+                    self._counts[level] -= len(slot)
+                    self._occupied[level] &= ~(1 << index)
+                    moved, slot[:] = list(slot), []
+                    for expiry, item in moved:
+                        self._place(expiry, item)
+            slot = self._levels[0][tick & WHEEL_MASK]
+            if slot:
+                self._counts[0] -= len(slot)
+                self._occupied[0] &= ~(1 << (tick & WHEEL_MASK))
+                due.extend(item for _, item in slot)
+                slot.clear()
+            if self._expired:
+                due.extend(item for _, item in self._expired)
+                self._expired = []
+        self._len -= len(due)
+        return due
+
+    def _rewind(self, target):
+        """系统时间回拨：按新的时间重新分配所有元素，避免提前触发"""
+        entries = list(self._expired)
+        for level in self._levels:
+            for slot in level:
+                entries.extend(slot)
+                slot.clear()
+        self._expired = []
+        self._counts = [0] * LEVELS
+        self._occupied = [0] * LEVELS
+        self._tick = target
+        for expiry, item in entries:
+            self._place(expiry, item)